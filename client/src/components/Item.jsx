@@ -1,13 +1,24 @@
 import React, { useContext, useState } from "react";
 import { Link } from "react-router-dom";
 import { ShopContext } from "../context/ShopContext";
-import { TbShoppingBagPlus } from "react-icons/tb";
+import { TbShoppingBagPlus, TbHeart, TbHeartFilled } from "react-icons/tb";
 
 // Hiển thị hình ảnh, tên, mô tả, danh mục và nút "Thêm vào giỏ hàng" cho một sản phẩm duy nhất.
 const Item = ({ product }) => {
   // Truy cập addToCart (hàm thêm sản phẩm vào giỏ hàng) và Maps (hàm điều hướng trang) từ ShopContext.
-  const { addToCart, navigate, formatCurrency, currency } = useContext(ShopContext);
+  const { addToCart, navigate, formatCurrency, currency, wishlistFlags, addToWishlist, removeFromWishlist } = useContext(ShopContext);
   const [hovered, setHovered] = useState(false);
+  // Trạng thái yêu thích do lưới sản phẩm nạp sẵn (checkManyInWishlist: 1 request cho cả trang)
+  const inWishlist = wishlistFlags[product._id] || false;
+
+  const toggleWishlist = (e) => {
+    e.stopPropagation(); // Không mở trang chi tiết sản phẩm
+    if (inWishlist) {
+      removeFromWishlist(product._id);
+    } else {
+      addToWishlist(product._id);
+    }
+  };
 
   // Get discount info from product (from backend discount system)
   const hasDiscount = product.hasDiscount || false;
@@ -51,6 +62,20 @@ const Item = ({ product }) => {
             -{discountPercent}%
           </div>
         )}
+
+        {/* Wishlist Button */}
+        <button
+          onClick={toggleWishlist}
+          aria-label={inWishlist ? "Xóa khỏi yêu thích" : "Thêm vào yêu thích"}
+          className="absolute top-3 right-3 w-9 h-9 rounded-full bg-white/90 shadow-md
+                     flex items-center justify-center hover:scale-110 transition-transform duration-200"
+        >
+          {inWishlist ? (
+            <TbHeartFilled className="text-lg text-red-500" />
+          ) : (
+            <TbHeart className="text-lg text-gray-700" />
+          )}
+        </button>
       </div>
 
       {/* Hiển thị chi tiết sản phẩm và tương tác - INFO */}
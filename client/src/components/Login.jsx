@@ -158,6 +158,9 @@ const Login = () => {
               console.log('⚠️ No token in response!'); // Debug log
             }
             
+            // Giỏ hàng khách đã được gộp vào tài khoản → bỏ cart token
+            localStorage.removeItem('cart_token');
+            
             // Gọi handleLoginSuccess và nhận về role để navigate đúng
             const userRole = await handleLoginSuccess();
             setShowUserLogin(false); // ẩn/đóng modal đăng nhập
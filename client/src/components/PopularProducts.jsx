@@ -11,13 +11,18 @@ import "swiper/css/pagination";
 
 const PopularProducts = () => {
   const [popularProducts, setPopularProducts] = useState([]);
-  const { products } = useContext(ShopContext);
+  const { products, user, checkManyInWishlist } = useContext(ShopContext);
 
   useEffect(() => {
     const data = products.filter((item) => item.popular);
     setPopularProducts(data.slice(0, 10)); // Tăng lên 10 sản phẩm
   }, [products]);
 
+  // Trạng thái yêu thích của cả carousel: 1 request
+  useEffect(() => {
+    checkManyInWishlist(popularProducts.map((product) => product._id));
+  }, [popularProducts, user]);
+
   return (
     <section className="max-padd-container py-20 bg-gradient-to-b from-gray-50 to-white">
       {/* Title Section - Luxury Typography */}
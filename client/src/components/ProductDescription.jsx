@@ -9,6 +9,8 @@ const ProductDescription = ({ product }) => {
   const [reviews, setReviews] = useState([]);
   const [reviewStats, setReviewStats] = useState(null);
   const [isLoadingReviews, setIsLoadingReviews] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null); // Cursor của trang đánh giá tiếp theo (null = hết)
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [sortBy, setSortBy] = useState("newest");
   const [isWriteModalOpen, setIsWriteModalOpen] = useState(false);
 
@@ -31,6 +33,7 @@ const ProductDescription = ({ product }) => {
       );
       if (response.data.success) {
         setReviews(response.data.reviews);
+        setNextCursor(response.data.nextCursor);
       }
     } catch (error) {
       console.error("Error fetching reviews:", error);
@@ -39,6 +42,28 @@ const ProductDescription = ({ product }) => {
     }
   };
 
+  // Tải thêm đánh giá theo cursor của trang trước
+  const fetchMoreReviews = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const response = await axios.get(
+        `${import.meta.env.VITE_BACKEND_URL}/api/review/product/${product._id}`,
+        {
+          params: { sort_by: sortBy, limit: 10, cursor: nextCursor }
+        }
+      );
+      if (response.data.success) {
+        setReviews(prev => [...prev, ...response.data.reviews]);
+        setNextCursor(response.data.nextCursor);
+      }
+    } catch (error) {
+      console.error("Error fetching more reviews:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const fetchReviewStats = async () => {
     try {
       const response = await axios.get(
@@ -337,6 +362,19 @@ const ProductDescription = ({ product }) => {
                     </div>
                   </div>
                 ))}
+
+                {/* Load more */}
+                {nextCursor && (
+                  <div className="text-center pt-2">
+                    <button
+                      onClick={fetchMoreReviews}
+                      disabled={isLoadingMore}
+                      className="px-6 py-2 border border-gray-300 rounded-lg text-sm font-medium text-gray-700 hover:bg-gray-50 transition-colors disabled:opacity-50"
+                    >
+                      {isLoadingMore ? "Đang tải..." : "Xem thêm đánh giá"}
+                    </button>
+                  </div>
+                )}
               </div>
             ) : (
               <div className="text-center py-12 bg-gray-50 rounded-lg">
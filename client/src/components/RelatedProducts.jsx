@@ -13,7 +13,7 @@ import { ShopContext } from "../context/ShopContext";
 
 // Logic tìm kiếm và hiển thị sản phẩm liên quan
 const RelatedProducts = ({ product, id }) => {
-  const { products } = useContext(ShopContext);
+  const { products, user, checkManyInWishlist } = useContext(ShopContext);
   const [related, setRelated] = useState([]);
 
   useEffect(() => {
@@ -26,6 +26,11 @@ const RelatedProducts = ({ product, id }) => {
     }
   }, [products]);
 
+  // Trạng thái yêu thích của các sản phẩm liên quan: 1 request
+  useEffect(() => {
+    checkManyInWishlist(related.map((product) => product._id));
+  }, [related, user]);
+
   return (
     <section className="pt-16">
       {/* Hiển thị giao diện người dùng */}
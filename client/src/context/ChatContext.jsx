@@ -8,6 +8,8 @@ export const ChatProvider = ({ children }) => {
   const [messages, setMessages] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
+  // Server-side chat session (history is kept by the backend)
+  const [sessionId, setSessionId] = useState(null);
 
   const API_BASE_URL = import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000';
 
@@ -22,6 +24,7 @@ export const ChatProvider = ({ children }) => {
   const clearMessages = useCallback(() => {
     setMessages([]);
     setError(null);
+    setSessionId(null);
   }, []);
 
   // Send message to backend
@@ -40,17 +43,11 @@ export const ChatProvider = ({ children }) => {
     setError(null);
 
     try {
-      // Get conversation history (last 5 messages, excluding the current one)
-      const conversationHistory = messages.slice(-5).map(msg => ({
-        role: msg.role,
-        content: msg.content
-      }));
-
       const response = await axios.post(
         `${API_BASE_URL}/api/chat`,
         {
           message: userMessage,
-          conversation_history: conversationHistory,
+          session_id: sessionId,
           include_context: true
         },
         {
@@ -62,6 +59,10 @@ export const ChatProvider = ({ children }) => {
       );
 
       if (response.data.success) {
+        if (response.data.session_id) {
+          setSessionId(response.data.session_id);
+        }
+
         const assistantMsg = {
           role: 'assistant',
           content: response.data.message,
@@ -102,7 +103,7 @@ export const ChatProvider = ({ children }) => {
     } finally {
       setIsLoading(false);
     }
-  }, [messages, API_BASE_URL]);
+  }, [sessionId, API_BASE_URL]);
 
   // Send message with streaming (for future implementation)
   const sendMessageStream = useCallback(async (userMessage) => {
@@ -58,6 +58,12 @@ axios.interceptors.request.use(
       console.log('⚠️ No token sent - no user logged in');
     }
     
+    // Token giỏ hàng khách: backend dùng khi chưa đăng nhập và gộp vào giỏ hàng user khi đăng nhập
+    const cartToken = localStorage.getItem('cart_token');
+    if (cartToken) {
+      config.headers['X-Cart-Token'] = cartToken;
+    }
+    
     // Debug: Log headers sau khi set
     console.log('🔧 Headers after:', JSON.stringify(config.headers));
     
@@ -70,7 +76,14 @@ axios.interceptors.request.use(
 
 // Cấu hình response interceptor để xử lý lỗi 401 (token hết hạn)
 axios.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    // Lưu token giỏ hàng khách do backend cấp (chỉ có khi chưa đăng nhập)
+    const cartToken = response.headers?.['x-cart-token'];
+    if (cartToken) {
+      localStorage.setItem('cart_token', cartToken);
+    }
+    return response;
+  },
   (error) => {
     // Xử lý lỗi 401 Unauthorized (token hết hạn hoặc invalid)
     if (error.response?.status === 401) {
@@ -129,6 +142,7 @@ const ShopContextProvider = ({ children }) => {
   // ============================================================================
   const [wishlistCount, setWishlistCount] = useState(0); // Số lượng sản phẩm trong wishlist (hiển thị badge)
   const [wishlistProducts, setWishlistProducts] = useState([]); // Danh sách sản phẩm trong wishlist (dùng trong Wishlist page)
+  const [wishlistFlags, setWishlistFlags] = useState({}); // {productId: true/false} của các sản phẩm đang hiển thị trên lưới (Item)
 
   // Hàm fetch settings từ backend
   const fetchSettings = async () => {
@@ -213,8 +227,14 @@ const ShopContextProvider = ({ children }) => {
       } else {
         console.log("❌ User not logged in - data.success is:", data.success); // Debug log
         setUser(null); // xử lý khi ko đăng nhập
-        setCartItems({});
         setIsAdmin(false); // Clear admin state
+        // Khách chưa đăng nhập: tải giỏ hàng khách từ server (nếu có)
+        if (localStorage.getItem('cart_token')) {
+          const { data: cart } = await axios.get("/api/cart/get");
+          setCartItems(cart.success ? cart.cartData : {});
+        } else {
+          setCartItems({});
+        }
       }
     } catch (error) {
       console.log("⚠️ fetchUser error:", error); // Debug log
@@ -299,6 +319,7 @@ const ShopContextProvider = ({ children }) => {
       const { data } = await axios.post('/api/wishlist/add', { productId });
       if (data.success) {
         setWishlistCount(data.count);
+        setWishlistFlags(prev => ({ ...prev, [productId]: true }));
         toast.success(data.message || 'Đã thêm vào danh sách yêu thích!');
         return true;
       } else {
@@ -321,6 +342,7 @@ const ShopContextProvider = ({ children }) => {
       if (data.success) {
         setWishlistCount(data.count);
         setWishlistProducts(prev => prev.filter(p => p._id !== productId));
+        setWishlistFlags(prev => ({ ...prev, [productId]: false }));
         toast.success(data.message || 'Đã xóa khỏi danh sách yêu thích');
         return true;
       } else {
@@ -348,6 +370,23 @@ const ShopContextProvider = ({ children }) => {
     }
   };
 
+  // Check many products in wishlist - Kiểm tra cả 1 trang sản phẩm trong 1 request
+  // Dùng cho lưới sản phẩm thay vì gọi checkInWishlist cho từng sản phẩm
+  // Kết quả được lưu vào wishlistFlags (Item đọc từ đó), đồng thời trả về map {productId: true/false}
+  const checkManyInWishlist = async (productIds) => {
+    if (!user || productIds.length === 0) return {};
+
+    try {
+      const { data } = await axios.post('/api/wishlist/check-many', { productIds: productIds.slice(0, 100) });
+      const flags = data.inWishlist || {};
+      setWishlistFlags(prev => ({ ...prev, ...flags }));
+      return flags;
+    } catch (error) {
+      console.log('Error checking wishlist:', error);
+      return {};
+    }
+  };
+
   // Clear wishlist - Xóa toàn bộ wishlist
   const clearWishlist = async () => {
     try {
@@ -355,6 +394,7 @@ const ShopContextProvider = ({ children }) => {
       if (data.success) {
         setWishlistCount(0);
         setWishlistProducts([]);
+        setWishlistFlags({});
         toast.success('Đã xóa toàn bộ danh sách yêu thích');
       }
     } catch (error) {
@@ -390,12 +430,8 @@ const ShopContextProvider = ({ children }) => {
       return toast.error("Vui lòng chọn kích cỡ trước");
     }
 
-    // BƯỚC 2: Kiểm tra đăng nhập TRƯỚC KHI thêm vào giỏ hàng
-    if (!user) {
-      toast.error("Vui lòng đăng nhập để thêm sản phẩm vào giỏ hàng");
-      setShowUserLogin(true); // Hiển thị modal login
-      return;
-    }
+    // BƯỚC 2: Khách chưa đăng nhập vẫn có giỏ hàng trên server (qua cart token),
+    // giỏ hàng này được gộp vào tài khoản khi đăng nhập
 
     // BƯỚC 3: Thêm vào giỏ hàng local
     let cartData = structuredClone(cartItems);
@@ -427,14 +463,12 @@ const ShopContextProvider = ({ children }) => {
     setCartItems(cartData); // Cập nhật state cartItems với dữ liệu giỏ hàng mới
 
 
-    // Nếu người dùng đã đăng nhập, gửi yêu cầu đến backend để cập nhật giỏ hàng trên server  
-    if (user) {
-      try {
-        const { data } = await axios.post("/api/cart/update", { itemId, size, quantity });
-        data.success ? toast.success(data.message) : toast.error(data.message);
-      } catch (err) {
-        toast.error(err.message);
-      }
+    // Gửi yêu cầu đến backend để cập nhật giỏ hàng trên server (user hoặc khách)
+    try {
+      const { data } = await axios.post("/api/cart/update", { itemId, size, quantity });
+      data.success ? toast.success(data.message) : toast.error(data.message);
+    } catch (err) {
+      toast.error(err.message);
     }
   };
 
@@ -478,6 +512,7 @@ const ShopContextProvider = ({ children }) => {
     } else {
       setWishlistCount(0); // Reset wishlist count khi logout
       setWishlistProducts([]); // Clear wishlist products
+      setWishlistFlags({}); // Bỏ trạng thái yêu thích trên lưới sản phẩm
     }
   }, [user]); // Chạy lại khi user state thay đổi
 
@@ -533,11 +568,13 @@ const ShopContextProvider = ({ children }) => {
     // Wishlist functions & state
     wishlistCount,
     wishlistProducts,
+    wishlistFlags,
     fetchWishlist,
     fetchWishlistCount,
     addToWishlist,
     removeFromWishlist,
     checkInWishlist,
+    checkManyInWishlist,
     clearWishlist,
     // Order status translation
     translateStatus,
@@ -8,7 +8,7 @@ import { useParams } from "react-router-dom";
 
 // Quản lý State
 const CategoryCollection = () => {
-  const { products, searchQuery, axios } = useContext(ShopContext); // Lấy danh sách sản phẩm và từ khóa tìm kiếm từ context.
+  const { products, searchQuery, axios, user, checkManyInWishlist } = useContext(ShopContext); // Lấy danh sách sản phẩm và từ khóa tìm kiếm từ context.
   const [filteredProducts, setFilteredProducts] = useState([]); // Mảng sản phẩm sau khi đã được lọc theo danh mục và từ khóa tìm kiếm.
   const [currentPage, setCurrentPage] = useState(1); //Số trang hiện tại mà người dùng đang xem (dùng cho phân trang).
   const itemsPerPage = 10; // Số lượng sản phẩm hiển thị trên mỗi trang.
@@ -72,6 +72,14 @@ const CategoryCollection = () => {
   const startProduct = (currentPage - 1) * itemsPerPage + 1;
   const endProduct = Math.min(currentPage * itemsPerPage, inStockProducts.length);
 
+  // Trạng thái yêu thích của các sản phẩm trên trang hiện tại: 1 request cho cả trang
+  const pageProductIds = inStockProducts
+    .slice((currentPage - 1) * itemsPerPage, currentPage * itemsPerPage)
+    .map((product) => product._id);
+  useEffect(() => {
+    checkManyInWishlist(pageProductIds);
+  }, [pageProductIds.join(","), user]);
+
   // 
   return (
     <div className="min-h-screen bg-gradient-to-br from-gray-50 via-white to-gray-50 py-16 pt-28">
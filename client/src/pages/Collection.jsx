@@ -4,7 +4,7 @@ import Item from "../components/Item";
 import Title from "../components/Title";
 
 const Collection = () => {
-  const { products, searchQuery } = useContext(ShopContext);
+  const { products, searchQuery, user, checkManyInWishlist } = useContext(ShopContext);
   const [filteredProducts, setFilteredProducts] = useState([]);
   const [currentPage, setCurrentPage] = useState(1)
    const itemsPerPage = 10;
@@ -34,6 +34,14 @@ useEffect(() => {
   const startProduct = (currentPage - 1) * itemsPerPage + 1;
   const endProduct = Math.min(currentPage * itemsPerPage, inStockProducts.length);
 
+  // Trạng thái yêu thích của các sản phẩm trên trang hiện tại: 1 request cho cả trang
+  const pageProductIds = inStockProducts
+    .slice((currentPage - 1) * itemsPerPage, currentPage * itemsPerPage)
+    .map((product) => product._id);
+  useEffect(() => {
+    checkManyInWishlist(pageProductIds);
+  }, [pageProductIds.join(","), user]);
+
   return (
     <div className="min-h-screen bg-gradient-to-br from-gray-50 via-white to-gray-50 py-16 pt-28">
       <div className="max-padd-container">
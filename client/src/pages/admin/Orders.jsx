@@ -9,6 +9,11 @@ const Orders = () => {
   const [orders, setOrders] = useState([]) // state chứa mảng đơn hàng
   const [loading, setLoading] = useState(true) // state để hiển thị trạng thái đang tải
   const [error, setError] = useState(null) // state lưu lỗi nếu có
+  const [statusFilter, setStatusFilter] = useState("") // lọc theo trạng thái ("" = tất cả)
+  const [statusCounts, setStatusCounts] = useState(null) // số đơn theo từng trạng thái
+  const [totalCount, setTotalCount] = useState(0) // tổng số đơn (không tính bộ lọc trạng thái)
+  const [nextCursor, setNextCursor] = useState(null) // cursor trang tiếp theo (null = hết)
+  const [loadingMore, setLoadingMore] = useState(false)
   
   // States cho Edit Order Modal
   const [showEditModal, setShowEditModal] = useState(false)
@@ -28,16 +33,24 @@ const Orders = () => {
     status: ""
   })
 
-  // Hàm fetchAllOrders: lấy danh sách đơn hàng từ server
+  // Tham số lọc gửi lên /api/order/queue
+  const queueParams = () => (statusFilter ? { status: statusFilter } : {})
+
+  // Hàm fetchAllOrders: lấy trang đầu của hàng đợi đơn hàng (kèm số đơn theo trạng thái)
   const fetchAllOrders = async () => {
     try {
       setLoading(true) // bắt đầu loading
       setError(null) // reset error
       console.log("🔄 Fetching orders...")
-      const { data } = await axios.post("/api/order/list") // gọi API /api/order/list
+      const { data } = await axios.get("/api/order/queue", { params: queueParams() }) // gọi API /api/order/queue
       console.log("📦 Response:", data)
       if (data.success) {
         setOrders(data.orders) // lưu orders vào state
+        setNextCursor(data.nextCursor)
+        if (data.counts) {
+          setStatusCounts(data.counts.status)
+          setTotalCount(data.counts.total)
+        }
         console.log("✅ Loaded orders:", data.orders.length) // log số lượng orders
       } else {
         const errorMsg = data.message || "Unknown error"
@@ -56,6 +69,26 @@ const Orders = () => {
     }
   }
 
+  // Hàm fetchMoreOrders: tải trang tiếp theo theo cursor
+  const fetchMoreOrders = async () => {
+    if (!nextCursor) return
+    try {
+      setLoadingMore(true)
+      const { data } = await axios.get("/api/order/queue", {
+        params: { ...queueParams(), cursor: nextCursor }
+      })
+      if (data.success) {
+        setOrders(prev => [...prev, ...data.orders])
+        setNextCursor(data.nextCursor)
+      }
+    } catch (error) {
+      console.log("❌ Fetch more error:", error)
+      toast.error(error.message)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   // Hàm statusHandler: thay đổi trạng thái đơn hàng (Processing, Shipped, Delivered...)
   const statusHandler = async (e, orderId) => {
     try {
@@ -69,7 +102,9 @@ const Orders = () => {
       }
     } catch (error) {
       console.log(error)
-      toast.error(error.message) // thông báo lỗi
+      // Chuyển trạng thái không hợp lệ (400) / đơn vừa bị đổi (409): hiện lý do và tải lại
+      toast.error(error.response?.data?.detail || error.message) // thông báo lỗi
+      await fetchAllOrders()
     }
   }
 
@@ -132,8 +167,8 @@ const Orders = () => {
   }
 
   useEffect(() => {
-    fetchAllOrders() // gọi khi component mount để load đơn hàng
-  }, [])
+    fetchAllOrders() // gọi khi component mount hoặc đổi bộ lọc trạng thái
+  }, [statusFilter])
 
   // Hiển thị loading spinner khi đang tải
   if (loading) {
@@ -155,7 +190,7 @@ const Orders = () => {
   }
 
   // Hiển thị thông báo khi chưa có đơn hàng
-  if (!loading && orders.length === 0) {
+  if (!loading && orders.length === 0 && !statusFilter) {
     return (
       <div className="px-2 sm:px-6 py-12 m-2 h-[97vh] bg-primary overflow-y-scroll lg:w-4/5 rounded-xl">
         {/* Header */}
@@ -180,6 +215,25 @@ const Orders = () => {
         <h2 className="text-2xl font-bold text-gray-800">Quản Lý Đơn Hàng</h2>
       </div>
 
+      {/* Bộ lọc trạng thái (kèm số đơn) */}
+      <div className="flex flex-wrap gap-2 mb-4">
+        {["", "Pending Payment", "Order Placed", "Processing", "Shipped", "Delivered", "Cancelled"].map((s) => (
+          <button
+            key={s || "all"}
+            onClick={() => setStatusFilter(s)}
+            className={`px-3 py-1.5 rounded-lg text-xs font-medium transition-colors ${
+              statusFilter === s ? "bg-gray-900 text-white" : "bg-white text-gray-700 hover:bg-gray-100"
+            }`}
+          >
+            {s || "Tất cả"} ({s ? statusCounts?.[s] ?? 0 : totalCount})
+          </button>
+        ))}
+      </div>
+
+      {orders.length === 0 && (
+        <p className="text-center text-gray-500 py-8">Không có đơn hàng nào ở trạng thái này</p>
+      )}
+
       {/* Lặp qua từng đơn hàng và hiển thị */}
       {orders.map((order) => (
         <div key={order._id} className="bg-white p-3 mb-4 rounded">
@@ -324,6 +378,19 @@ const Orders = () => {
         </div>
       ))}
 
+      {/* Tải thêm đơn hàng */}
+      {nextCursor && (
+        <div className="text-center mb-4">
+          <button
+            onClick={fetchMoreOrders}
+            disabled={loadingMore}
+            className="px-6 py-2 bg-white border border-gray-300 rounded-lg text-sm font-medium text-gray-700 hover:bg-gray-50 transition-colors disabled:opacity-50"
+          >
+            {loadingMore ? "Đang tải..." : "Tải thêm đơn hàng"}
+          </button>
+        </div>
+      )}
+
       {/* Edit Order Modal */}
       {showEditModal && editingOrder && (
         <div className="fixed inset-0 bg-black/50 flex items-center justify-center z-50 p-4">
@@ -1,3 +1,8 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, BinaryIO, Dict, Union
+
 import cloudinary
 import cloudinary.uploader
 from app.config.settings import settings
@@ -10,18 +15,28 @@ cloudinary.config(
     secure=True
 )
 
-async def upload_image(file_content: bytes, folder: str = "veloura") -> str:
+# The Cloudinary SDK is synchronous: every call runs in this bounded pool
+# so an upload never blocks the event loop for the whole HTTP transfer
+_executor = ThreadPoolExecutor(
+    max_workers=settings.UPLOAD_MAX_WORKERS,
+    thread_name_prefix="cloudinary"
+)
+
+async def run_in_upload_pool(func, *args, **kwargs) -> Any:
+    """Run a blocking Cloudinary SDK call in the upload thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+def _upload_sync(file: Union[bytes, BinaryIO], folder: str) -> Dict[str, Any]:
+    return cloudinary.uploader.upload(file, folder=folder, resource_type="image")
+
+async def upload_to_cloudinary(file: Union[bytes, BinaryIO], folder: str = "veloura") -> Dict[str, Any]:
     """
-    Upload image to Cloudinary
-    Returns the secure URL of uploaded image
+    Upload bytes or a file-like object to Cloudinary without blocking the event loop
+    Returns the full Cloudinary upload result
     """
     try:
-        result = cloudinary.uploader.upload(
-            file_content,
-            folder=folder,
-            resource_type="image"
-        )
-        return result.get("secure_url")
+        return await run_in_upload_pool(_upload_sync, file, folder)
     except Exception as e:
         raise Exception(f"Failed to upload image: {str(e)}")
 
@@ -30,7 +45,7 @@ async def delete_image(public_id: str) -> bool:
     Delete image from Cloudinary
     """
     try:
-        result = cloudinary.uploader.destroy(public_id)
+        result = await run_in_upload_pool(cloudinary.uploader.destroy, public_id)
         return result.get("result") == "ok"
     except Exception as e:
         raise Exception(f"Failed to delete image: {str(e)}")
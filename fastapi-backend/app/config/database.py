@@ -25,18 +25,75 @@ async def connect_to_mongo():
     # Create indexes
     await create_indexes()
 
+# (collection, keys, options, description) of every index the app relies on
+INDEXES = [
+    # One review per user (testimonials)
+    ("testimonials", "userId", {"unique": True}, "unique testimonials.userId"),
+    # Idle chat sessions expire automatically
+    ("chat_sessions", "updatedAt", {"expireAfterSeconds": settings.CHAT_SESSION_TTL_DAYS * 24 * 60 * 60}, "TTL chat_sessions.updatedAt"),
+    # Only guest carts have expiresAt, user carts never expire
+    ("carts", "expiresAt", {"expireAfterSeconds": 0}, "TTL carts.expiresAt"),
+    # Wishlist: one document per (userId, productId)
+    ("wishlist_items", [("userId", 1), ("productId", 1)], {"unique": True}, "unique wishlist_items (userId, productId)"),
+    ("wishlist_items", [("userId", 1), ("addedAt", -1)], {}, "wishlist_items (userId, addedAt)"),
+    # One review per user per product (rating stats in product_stats rely on it)
+    ("reviews", [("productId", 1), ("userId", 1)], {"unique": True}, "unique reviews (productId, userId)"),
+    # Keyset pagination of product reviews, one index per sort mode (newest/oldest share one)
+    ("reviews", [("productId", 1), ("createdAt", -1), ("_id", -1)], {}, "reviews (productId, createdAt, _id)"),
+    ("reviews", [("productId", 1), ("rating", -1), ("createdAt", -1), ("_id", -1)], {}, "reviews (productId, rating desc, createdAt, _id)"),
+    ("reviews", [("productId", 1), ("rating", 1), ("createdAt", -1), ("_id", -1)], {}, "reviews (productId, rating asc, createdAt, _id)"),
+    # Purchases projection (delivered order lines): review eligibility and "buy again"
+    ("purchases", [("userId", 1), ("productId", 1), ("orderId", 1)], {"unique": True}, "unique purchases (userId, productId, orderId)"),
+    ("purchases", [("userId", 1), ("deliveredAt", -1)], {}, "purchases (userId, deliveredAt)"),
+    ("purchases", "orderId", {}, "purchases.orderId"),
+    # Order history of a user, newest first (keyset pagination)
+    ("orders", [("userId", 1), ("createdAt", -1), ("_id", -1)], {}, "orders (userId, createdAt, _id)"),
+    # Admin order queue: newest first, optionally by status or customer email
+    ("orders", [("createdAt", -1), ("_id", -1)], {}, "orders (createdAt, _id)"),
+    ("orders", [("status", 1), ("createdAt", -1), ("_id", -1)], {}, "orders (status, createdAt, _id)"),
+    ("orders", [("address.email", 1), ("createdAt", -1)], {}, "orders (address.email, createdAt)"),
+    # Stripe payment verification looks orders up by checkout session
+    ("orders", "stripeSessionId", {"sparse": True}, "orders.stripeSessionId"),
+    # Idempotency keys of handled payment callbacks
+    ("payment_events", "createdAt", {"expireAfterSeconds": settings.PAYMENT_EVENT_TTL_DAYS * 24 * 60 * 60}, "TTL payment_events.createdAt"),
+    # Inventory: one document per (product, size), low-stock lookups by onHand
+    ("inventory", [("productId", 1), ("size", 1)], {"unique": True}, "unique inventory (productId, size)"),
+    ("inventory", [("onHand", 1), ("productId", 1)], {}, "inventory (onHand, productId)"),
+    ("inventory_movements", [("productId", 1), ("createdAt", -1), ("_id", -1)], {}, "inventory_movements (productId, createdAt, _id)"),
+    ("inventory_movements", "orderId", {}, "inventory_movements.orderId"),
+    # Stripe webhook inbox: workers claim the oldest available event, done events expire
+    ("stripe_events", [("status", 1), ("availableAt", 1)], {}, "stripe_events (status, availableAt)"),
+    ("stripe_events", "processedAt", {"expireAfterSeconds": settings.PAYMENT_EVENT_TTL_DAYS * 24 * 60 * 60}, "TTL stripe_events.processedAt"),
+    # Promotion schedule: the scheduler reads due transitions by runAt, apply/remove replace them by product
+    ("promotion_schedule", [("runAt", 1), ("_id", 1)], {}, "promotion_schedule (runAt, _id)"),
+    ("promotion_schedule", "productId", {}, "promotion_schedule.productId"),
+]
+
 async def create_indexes():
-    """Create database indexes for better performance and constraints"""
-    try:
-        database = await get_database()
-        
-        # Create unique index on testimonials.userId to ensure one review per user
-        testimonials_collection = database["testimonials"]
-        await testimonials_collection.create_index("userId", unique=True)
-        print("✅ Created unique index on testimonials.userId")
-        
-    except Exception as e:
-        print(f"⚠️ Index creation info: {str(e)}")
+    """
+    Create database indexes for better performance and constraints.
+
+    Each index is created on its own, so one failure does not skip the others.
+    A unique index that cannot be built (e.g. duplicate documents from before it
+    existed) stops startup: the code relies on those constraints.
+    """
+    database = await get_database()
+    failed_unique = []
+    
+    for collection_name, keys, options, description in INDEXES:
+        try:
+            await database[collection_name].create_index(keys, **options)
+            print(f"✅ Created index {description}")
+        except Exception as e:
+            print(f"⚠️ Could not create index {description}: {str(e)}")
+            if options.get("unique"):
+                failed_unique.append(f"{description}: {str(e)}")
+    
+    if failed_unique:
+        raise RuntimeError(
+            "Unique indexes could not be created, remove the duplicate documents and restart: "
+            + "; ".join(failed_unique)
+        )
 
 async def close_mongo_connection():
     """Close MongoDB connection"""
@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -11,14 +12,73 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
     
-    # Cloudinary
-    CLOUDINARY_CLOUD_NAME: str
-    CLOUDINARY_API_KEY: str
-    CLOUDINARY_API_SECRET: str
+    # Cloudinary (only required when MEDIA_STORAGE_BACKEND=cloudinary)
+    CLOUDINARY_CLOUD_NAME: Optional[str] = None
+    CLOUDINARY_API_KEY: Optional[str] = None
+    CLOUDINARY_API_SECRET: Optional[str] = None
+    UPLOAD_MAX_WORKERS: int = 4  # Concurrent uploads (thread pool size)
+    
+    # Image preprocessing (Pillow, before upload)
+    IMAGE_OUTPUT_FORMAT: str = "WEBP"  # WEBP or AVIF (AVIF needs a Pillow build with AVIF support)
+    IMAGE_PROCESS_WORKERS: int = 2  # Worker processes for resize/re-encode
+    IMAGE_MAX_UPLOAD_BYTES: int = 15 * 1024 * 1024
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    
+    # Media storage backend: cloudinary | local | s3
+    MEDIA_STORAGE_BACKEND: str = "cloudinary"
+    MEDIA_LOCAL_ROOT: str = "media"  # Directory for the local backend
+    MEDIA_PUBLIC_URL: Optional[str] = None  # Defaults to {BACKEND_URL}/media
+    MEDIA_CACHE_CONTROL: str = "public, max-age=31536000, immutable"  # Content-addressed, never changes
+    S3_BUCKET: Optional[str] = None
+    S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://localhost:9000 for MinIO
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_PUBLIC_URL: Optional[str] = None  # Public base URL (CDN) for stored objects
+    
+    # Cart
+    CART_CACHE_SIZE: int = 1024  # Users whose priced cart is cached in memory
+    CART_CACHE_TTL_SECONDS: float = 30.0  # Max age of a cached priced cart
+    CART_GUEST_TTL_DAYS: int = 30  # Guest carts expire after this long without writes (TTL index)
+    
+    # Wishlist membership cache (product grids)
+    WISHLIST_CACHE_SIZE: int = 2048  # Users whose wishlisted product ids are cached
+    WISHLIST_CACHE_TTL_SECONDS: float = 300.0  # Per worker: other workers may show stale flags this long after a change
+    
+    # Inventory (per-size stock)
+    LOW_STOCK_THRESHOLD: int = 5  # Sizes with this many or fewer items are reported as low stock
+
+    # Promotion scheduler (activates / expires discounts at discountStartDate / discountEndDate)
+    SHOP_TIMEZONE: str = "Asia/Ho_Chi_Minh"  # Promotion dates from the admin UI are local dates in this timezone
+    PROMOTION_SCHEDULER_ENABLED: bool = True
+    PROMOTION_POLL_SECONDS: float = 60.0  # Max sleep between two runs (the next due promotion wakes it earlier)
+    PROMOTION_BATCH_SIZE: int = 500  # Queued transitions applied per bulk_write
+    
+    # Pending payment order reaper (Stripe / VNPay orders that were never paid)
+    ORDER_REAPER_ENABLED: bool = True
+    # Unpaid orders expire after this long (also the payment page expiry); Stripe sessions live at least 30 minutes
+    PENDING_ORDER_TTL_MINUTES: int = Field(60, ge=30)
+    ORDER_REAPER_GRACE_MINUTES: int = 15  # Extra wait after the TTL for payments completed at the last moment
+    ORDER_REAPER_INTERVAL_SECONDS: float = 300.0  # Time between two reaper runs
+    ORDER_REAPER_BATCH_SIZE: int = 200  # Orders expired per batch
+    ORDER_REAPER_BATCH_PAUSE_SECONDS: float = 1.0  # Pause between batches of one run
+    
+    # Payment confirmation idempotency keys (payment_events)
+    PAYMENT_EVENT_TTL_DAYS: int = 90  # Handled callbacks are remembered this long (TTL index)
     
     # Stripe
     STRIPE_SECRET_KEY: str
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
+    STRIPE_EVENT_POLL_SECONDS: float = 5.0  # Webhook inbox poll interval (new events wake the worker at once)
+    STRIPE_EVENT_LOCK_SECONDS: float = 60.0  # A claimed event is retried after this if its worker died
+    STRIPE_EVENT_MAX_ATTEMPTS: int = 5  # Then the event is left as "failed"
+    STRIPE_GATEWAY: str = "stripe"  # "fake": in-memory gateway for load tests (no network)
+    STRIPE_MAX_WORKERS: int = 8  # Threads running Stripe SDK calls off the event loop
+    STRIPE_TIMEOUT_SECONDS: float = 10.0  # Per HTTP request to Stripe
+    STRIPE_MAX_NETWORK_RETRIES: int = 1
+    STRIPE_CIRCUIT_FAILURES: int = 5  # Consecutive failures that open the circuit
+    STRIPE_CIRCUIT_RESET_SECONDS: float = 30.0  # Open circuit rejects calls this long, then tries again
+    STRIPE_FAKE_LATENCY_MS: float = 150.0  # Simulated Stripe latency of the fake gateway
     
     # Email Configuration (SMTP)
     SMTP_HOST: str = "smtp.gmail.com"
@@ -65,6 +125,12 @@ class Settings(BaseSettings):
     GEMINI_MODEL: str = "gemini-1.5-flash"
     GEMINI_EMBEDDING_MODEL: str = "models/text-embedding-004"
     
+    # Chat session memory (server-side conversation history)
+    CHAT_SESSION_CACHE_SIZE: int = 512  # Hot sessions kept in memory (LRU)
+    CHAT_SESSION_TTL_DAYS: int = 30  # Idle sessions are removed by a TTL index
+    CHAT_RECENT_MESSAGES: int = 6  # Messages kept verbatim, older ones are summarized
+    CHAT_SUMMARY_MAX_CHARS: int = 1500  # Upper bound for the rolling summary
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,52 @@
+from fastapi import Request, Response, HTTPException, status
+from bson import ObjectId
+from app.utils.auth import verify_token
+from app.config.database import get_collection
+from app.services.cart_service import CartOwner, is_valid_guest_token, new_guest_token
+
+# Header/cookie carrying the guest cart token
+CART_TOKEN_HEADER = "X-Cart-Token"
+CART_TOKEN_COOKIE = "cart_token"
+
+def get_bearer_token(request: Request):
+    """JWT from Authorization: Bearer, the custom auth-token header, or the user_token cookie"""
+    auth_header = request.headers.get("authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header[len("Bearer "):]
+    return request.headers.get("auth-token") or request.cookies.get("user_token")
+
+def get_guest_token(request: Request):
+    token = request.headers.get(CART_TOKEN_HEADER) or request.cookies.get(CART_TOKEN_COOKIE)
+    return token if is_valid_guest_token(token) else None
+
+async def cart_owner(request: Request, response: Response) -> CartOwner:
+    """
+    Resolve whose cart a request works on, without loading the full user document:
+    - Logged in: the user id from the verified JWT; the account must still exist and be
+      active (same rule as auth_user), checked with an _id lookup projected to isActive
+    - Anonymous: the guest token from X-Cart-Token (a new one is issued if missing)
+    Guests always get their token back in the X-Cart-Token response header.
+    """
+    token = get_bearer_token(request)
+    if token:
+        try:
+            token_data = verify_token(token)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Invalid token: {str(e)}"
+            )
+        users_collection = await get_collection("users")
+        user = await users_collection.find_one(
+            {"_id": ObjectId(token_data.user_id)}, {"isActive": 1}
+        )
+        if not user or not user.get("isActive", True):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or inactive"
+            )
+        return CartOwner(user_id=token_data.user_id)
+
+    guest_token = get_guest_token(request) or new_guest_token()
+    response.headers[CART_TOKEN_HEADER] = guest_token
+    return CartOwner(guest_token=guest_token)
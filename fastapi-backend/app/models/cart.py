@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Dict, List
 
 class CartAdd(BaseModel):
     itemId: str
@@ -10,6 +10,15 @@ class CartUpdate(BaseModel):
     size: str
     quantity: int = Field(..., ge=0)
 
+class CartMergeItem(BaseModel):
+    itemId: str
+    size: str
+    quantity: int = Field(..., gt=0)
+
+class CartMerge(BaseModel):
+    """Lines to add to the cart in one write (e.g. a cart kept while logged out)"""
+    items: List[CartMergeItem] = Field(..., min_length=1, max_length=200)
+
 class CartResponse(BaseModel):
     cartData: Dict[str, Dict[str, int]]
     message: str
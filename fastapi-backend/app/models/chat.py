@@ -26,9 +26,14 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Request body for chat endpoint."""
     message: str = Field(..., min_length=1, max_length=2000, description="User's message")
+    session_id: Optional[str] = Field(
+        default=None,
+        pattern=r"^[A-Za-z0-9_-]{8,64}$",
+        description="Server-side chat session id (returned by the first response); history is kept on the server"
+    )
     conversation_history: Optional[List[ChatMessage]] = Field(
         default=[],
-        description="Previous messages in conversation (optional, max 10)"
+        description="Previous messages in conversation (legacy, ignored when session_id is used)"
     )
     include_context: bool = Field(
         default=True,
@@ -39,7 +44,7 @@ class ChatRequest(BaseModel):
         json_schema_extra = {
             "example": {
                 "message": "Cho tôi xem áo khoác nam",
-                "conversation_history": [],
+                "session_id": "3f2b6c1e9a8d4e7f8b0c1d2e3f4a5b6c",
                 "include_context": True
             }
         }
@@ -67,6 +72,7 @@ class ChatResponse(BaseModel):
     """Response from chat endpoint."""
     success: bool = Field(default=True)
     message: str = Field(..., description="AI assistant's response")
+    session_id: Optional[str] = Field(None, description="Chat session id to send with the next message")
     sources: List[ContextSource] = Field(
         default=[],
         description="Documents used to generate the response"
@@ -78,6 +84,7 @@ class ChatResponse(BaseModel):
             "example": {
                 "success": True,
                 "message": "Chúng tôi có nhiều mẫu áo thun nam cotton...",
+                "session_id": "3f2b6c1e9a8d4e7f8b0c1d2e3f4a5b6c",
                 "sources": [
                     {
                         "collection": "products",
@@ -95,6 +102,7 @@ class StreamChunk(BaseModel):
     """Single chunk of streamed response."""
     content: str = Field(..., description="Chunk of text content")
     done: bool = Field(default=False, description="Whether streaming is complete")
+    session_id: Optional[str] = Field(None, description="Chat session id (sent with the final chunk)")
     
     class Config:
         json_schema_extra = {
@@ -72,6 +72,10 @@ class OrderStatusUpdate(BaseModel):
     orderId: str
     status: str
 
+class OrderBulkStatusUpdate(BaseModel):
+    orderIds: List[str] = Field(..., min_length=1, max_length=500)
+    status: str
+
 class OrderUpdate(BaseModel):
     orderId: str
     status: Optional[str] = None
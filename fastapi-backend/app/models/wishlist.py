@@ -1,7 +1,8 @@
 """
 Wishlist Model
-- Mỗi user có 1 wishlist document duy nhất
-- Chứa array các productId mà user yêu thích
+- Mỗi sản phẩm yêu thích là 1 document (userId, productId) trong `wishlist_items`
+- Wishlist/WishlistProduct mô tả định dạng cũ (1 document/user với array products),
+  được chuyển sang `wishlist_items` khi user truy cập wishlist lần đầu
 """
 
 from pydantic import BaseModel, Field
@@ -14,6 +15,12 @@ class WishlistProduct(BaseModel):
     productId: str = Field(..., description="ID của sản phẩm")
     addedAt: datetime = Field(default_factory=datetime.utcnow, description="Thời gian thêm vào wishlist")
 
+class WishlistItem(BaseModel):
+    """Model cho document trong collection wishlist_items"""
+    userId: str = Field(..., description="ID của user")
+    productId: str = Field(..., description="ID của sản phẩm")
+    addedAt: datetime = Field(default_factory=datetime.utcnow, description="Thời gian thêm vào wishlist")
+
 class Wishlist(BaseModel):
     """Model cho wishlist document trong MongoDB"""
     userId: str = Field(..., description="ID của user sở hữu wishlist")
@@ -43,3 +50,7 @@ class AddToWishlistRequest(BaseModel):
 class RemoveFromWishlistRequest(BaseModel):
     """Request model cho xóa sản phẩm khỏi wishlist"""
     productId: str = Field(..., description="ID của sản phẩm cần xóa")
+
+class CheckWishlistManyRequest(BaseModel):
+    """Request model cho kiểm tra nhiều sản phẩm cùng lúc (1 trang sản phẩm)"""
+    productIds: List[str] = Field(..., max_length=100, description="Danh sách ID sản phẩm cần kiểm tra")
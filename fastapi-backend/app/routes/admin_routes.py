@@ -28,6 +28,9 @@ from app.middleware.auth_admin import auth_admin, auth_admin_only, auth_staff
 # - auth_admin_only: Chỉ cho phép admin truy cập (không cho staff)
 # - auth_staff: Cho phép cả admin và staff truy cập (giống auth_admin)
 
+# Import cache giỏ hàng đã tính giá (xóa khi phí vận chuyển/thuế thay đổi) và giỏ hàng của khách
+from app.services.cart_service import CartOwner, delete_cart, priced_carts
+
 # Import ObjectId để chuyển đổi string ID thành MongoDB ObjectId
 from bson import ObjectId
 
@@ -301,6 +304,9 @@ async def delete_customer(customer_id: str, admin: dict = Depends(auth_admin_onl
             detail="Không tìm thấy khách hàng"
         )
     
+    # Xóa giỏ hàng của khách (lưu riêng trong collection `carts`)
+    await delete_cart(CartOwner(user_id=customer_id))
+    
     # Bước 4: Trả về thông báo xóa thành công
     return {
         "success": True,
@@ -412,6 +418,9 @@ async def create_settings(settings: SettingsCreate):
         result = await settings_collection.insert_one(new_settings)
         new_settings["_id"] = str(result.inserted_id)
         
+        # Phí thay đổi: xóa cache giỏ hàng đã tính giá
+        priced_carts.clear()
+        
         return {
             "success": True,
             "message": f"Cài đặt cho năm {settings.year} đã được tạo thành công",
@@ -458,6 +467,7 @@ async def update_settings(year: int, settings: SettingsUpdate):
             {"year": year},
             {"$set": update_data}
         )
+        priced_carts.clear()
         
         # Lấy settings đã update
         updated_settings = await settings_collection.find_one({"year": year})
@@ -504,6 +514,7 @@ async def delete_settings(year: int):
                 "updatedAt": datetime.utcnow()
             }}
         )
+        priced_carts.clear()
         
         return {
             "success": True,
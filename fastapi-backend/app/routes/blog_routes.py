@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File,
 from app.models.blog import BlogCreate, BlogUpdate
 from app.config.database import get_collection
 from app.middleware.auth_admin import auth_staff
-from app.config.cloudinary import upload_image
+from app.services.upload_service import upload_image_variant
+from app.services.image_pipeline import LIST_PROJECTION, use_list_variant
 from bson import ObjectId
 from datetime import datetime
 from typing import Optional
@@ -15,10 +16,11 @@ async def get_all_blogs(published_only: bool = True):
     blogs_collection = await get_collection("blogs")
     
     query = {"isPublished": True} if published_only else {}
-    blogs = await blogs_collection.find(query).sort("createdAt", -1).to_list(length=None)
+    blogs = await blogs_collection.find(query, LIST_PROJECTION).sort("createdAt", -1).to_list(length=None)
     
     for blog in blogs:
         blog["_id"] = str(blog["_id"])
+        use_list_variant(blog)
     
     return {
         "success": True,
@@ -57,11 +59,12 @@ async def add_blog(
     """Add new blog (Staff/Admin only)"""
     blogs_collection = await get_collection("blogs")
     
-    # Upload image if provided
+    # Preprocess and upload image if provided
     image_url = None
+    image_variants = None
     if image:
-        img_content = await image.read()
-        image_url = await upload_image(img_content, folder="veloura/blogs")
+        image_variants = await upload_image_variant(image, folder="veloura/blogs")
+        image_url = image_variants["full"]["url"]
     
     # Create blog
     blog_doc = {
@@ -70,6 +73,7 @@ async def add_blog(
         "content": content,
         "author": author,
         "image": image_url,
+        "imageVariants": image_variants,
         "isPublished": True,
         "createdAt": datetime.utcnow(),
         "updatedAt": datetime.utcnow()
@@ -115,11 +119,11 @@ async def update_blog(
     if author:
         update_data["author"] = author
     
-    # Upload new image if provided
+    # Preprocess and upload new image if provided
     if image:
-        img_content = await image.read()
-        image_url = await upload_image(img_content, folder="veloura/blogs")
-        update_data["image"] = image_url
+        image_variants = await upload_image_variant(image, folder="veloura/blogs")
+        update_data["image"] = image_variants["full"]["url"]
+        update_data["imageVariants"] = image_variants
     
     update_data["updatedAt"] = datetime.utcnow()
     
@@ -1,37 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from app.models.cart import CartAdd, CartUpdate
+from app.models.cart import CartAdd, CartUpdate, CartMerge
 from app.config.database import get_collection
-from app.middleware.auth_user import auth_user
+from app.middleware.cart_owner import cart_owner
+from app.services.cart_service import (
+    CartOwner, line_path, read_cart, add_line, set_line, merge_lines, clear_cart as clear_cart_items,
+    get_priced_cart
+)
 from bson import ObjectId
-from datetime import datetime
 
 router = APIRouter()
 
+# Carts are stored in the `carts` collection (see cart_service), keyed by the user id from the JWT
+# or by a guest token (X-Cart-Token), so these routes work without login and never touch `users`.
+
 @router.post("/add")
-async def add_to_cart(cart_item: CartAdd, request: Request, user: dict = Depends(auth_user)):
+async def add_to_cart(cart_item: CartAdd, request: Request, owner: CartOwner = Depends(cart_owner)):
     """Add item to cart"""
     try:
         print("="*80)
         print("🎯 ADD_TO_CART FUNCTION CALLED!")
         print(f"📦 cart_item: itemId={cart_item.itemId}, size={cart_item.size}")
-        print(f"👤 user: {user.get('email')}")
+        print(f"👤 cart: {owner.key}")
         print("="*80)
-        
-        users_collection = await get_collection("users")
+
         products_collection = await get_collection("products")
-        
+
+        path = line_path(cart_item.itemId, cart_item.size)
+
         print(f"🔍 Looking for product: {cart_item.itemId}")
         # Check if product exists
-        product = await products_collection.find_one({"_id": ObjectId(cart_item.itemId), "isActive": True})
+        product = await products_collection.find_one(
+            {"_id": ObjectId(cart_item.itemId), "isActive": True},
+            {"sizes": 1}
+        )
         print(f"🔍 Product found: {product is not None}")
-        
+
         if not product:
             print("❌ Product not found!")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Không tìm thấy sản phẩm"
             )
-        
+
         print(f"🔍 Product sizes: {product.get('sizes', [])}")
         # Check if size is valid
         if cart_item.size not in product.get("sizes", []):
@@ -40,31 +50,15 @@ async def add_to_cart(cart_item: CartAdd, request: Request, user: dict = Depends
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Kích cỡ không hợp lệ"
             )
-        
-        # Get current cart
-        cart_data = user.get("cartData", {})
-        print(f"🔍 Current cart: {cart_data}")
-        
-        # Add/update item in cart
-        if cart_item.itemId not in cart_data:
-            cart_data[cart_item.itemId] = {}
-        
-        if cart_item.size not in cart_data[cart_item.itemId]:
-            cart_data[cart_item.itemId][cart_item.size] = 0
-        
-        cart_data[cart_item.itemId][cart_item.size] += 1
-        print(f"🔍 Updated cart: {cart_data}")
-        
-        # Update user's cart in database
-        result = await users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"cartData": cart_data, "updatedAt": datetime.utcnow()}}
-        )
-        print(f"✅ DB update result: modified_count={result.modified_count}")
-        
+
+        # Atomic increment of this line only (creates it if missing)
+        quantity = await add_line(owner, cart_item.itemId, cart_item.size)
+        print(f"✅ Cart line {path} = {quantity}")
+
         return {
             "success": True,
-            "message": "Đã thêm sản phẩm vào giỏ hàng"
+            "message": "Đã thêm sản phẩm vào giỏ hàng",
+            "quantity": quantity
         }
     except HTTPException:
         raise
@@ -78,55 +72,82 @@ async def add_to_cart(cart_item: CartAdd, request: Request, user: dict = Depends
         )
 
 @router.post("/update")
-async def update_cart(cart_item: CartUpdate, request: Request, user: dict = Depends(auth_user)):
-    """Update cart item quantity"""
-    users_collection = await get_collection("users")
-    
-    # Get current cart
-    cart_data = user.get("cartData", {})
-    
-    # Update quantity
-    if cart_item.quantity == 0:
-        # Remove item if quantity is 0
-        if cart_item.itemId in cart_data and cart_item.size in cart_data[cart_item.itemId]:
-            del cart_data[cart_item.itemId][cart_item.size]
-            if not cart_data[cart_item.itemId]:
-                del cart_data[cart_item.itemId]
-    else:
-        # Update quantity
-        if cart_item.itemId not in cart_data:
-            cart_data[cart_item.itemId] = {}
-        cart_data[cart_item.itemId][cart_item.size] = cart_item.quantity
-    
-    # Update user's cart in database
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"cartData": cart_data, "updatedAt": datetime.utcnow()}}
-    )
-    
+async def update_cart(cart_item: CartUpdate, request: Request, owner: CartOwner = Depends(cart_owner)):
+    """Update cart item quantity (0 removes the line)"""
+    await set_line(owner, cart_item.itemId, cart_item.size, cart_item.quantity)
+
     return {
         "success": True,
         "message": "Cập nhật giỏ hàng thành công"
     }
 
+@router.post("/merge")
+async def merge_cart(cart: CartMerge, request: Request, owner: CartOwner = Depends(cart_owner)):
+    """
+    Add many lines to the cart in a single atomic write.
+    Quantities are added to existing lines; unknown products and invalid sizes are skipped.
+    """
+    products_collection = await get_collection("products")
+
+    # Bước 1: Gộp các dòng trùng nhau ($inc không cho phép cùng một path hai lần)
+    increments = {}
+    for item in cart.items:
+        path = line_path(item.itemId, item.size)
+        increments[path] = increments.get(path, 0) + item.quantity
+
+    # Bước 2: Kiểm tra sản phẩm và size bằng một truy vấn $in
+    product_ids = list({ObjectId(item.itemId) for item in cart.items})
+    sizes_by_product = {
+        str(p["_id"]): set(p.get("sizes", []))
+        async for p in products_collection.find(
+            {"_id": {"$in": product_ids}, "isActive": True},
+            {"sizes": 1}
+        )
+    }
+
+    accepted = {}
+    skipped = []
+    for path, quantity in increments.items():
+        _, item_id, size = path.split(".", 2)
+        if size in sizes_by_product.get(item_id, ()):
+            accepted[path] = quantity
+        else:
+            skipped.append({"itemId": item_id, "size": size})
+
+    # Bước 3: Một lệnh update duy nhất cho tất cả các dòng
+    await merge_lines(owner, accepted)
+
+    return {
+        "success": True,
+        "message": "Đã gộp giỏ hàng thành công",
+        "cartData": await read_cart(owner),
+        "skipped": skipped
+    }
+
 @router.get("/get")
-async def get_cart(request: Request, user: dict = Depends(auth_user)):
-    """Get user's cart"""
+async def get_cart(request: Request, owner: CartOwner = Depends(cart_owner)):
+    """Get user's (or guest's) cart"""
+    return {
+        "success": True,
+        "cartData": await read_cart(owner)
+    }
+
+@router.get("/view")
+async def view_cart(request: Request, owner: CartOwner = Depends(cart_owner)):
+    """
+    Get the hydrated cart: product card data, line totals, current fees and stock warnings.
+    Products are loaded with one $in query; the result is cached briefly per cart.
+    """
     return {
         "success": True,
-        "cartData": user.get("cartData", {})
+        "cart": await get_priced_cart(owner)
     }
 
 @router.delete("/clear")
-async def clear_cart(request: Request, user: dict = Depends(auth_user)):
-    """Clear user's cart"""
-    users_collection = await get_collection("users")
-    
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"cartData": {}, "updatedAt": datetime.utcnow()}}
-    )
-    
+async def clear_cart(request: Request, owner: CartOwner = Depends(cart_owner)):
+    """Clear user's (or guest's) cart"""
+    await clear_cart_items(owner)
+
     return {
         "success": True,
         "message": "Đã xóa giỏ hàng thành công"
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File,
 from app.models.category import CategoryCreate, CategoryUpdate
 from app.config.database import get_collection
 from app.middleware.auth_admin import auth_staff
-from app.config.cloudinary import upload_image
+from app.services.upload_service import upload_image_variant
+from app.services.image_pipeline import LIST_PROJECTION, use_list_variant
 from bson import ObjectId
 from datetime import datetime
 from typing import Optional
@@ -15,10 +16,11 @@ async def get_all_categories():
     categories_collection = await get_collection("categories")
     
     # Query categories có inStock=True (database dùng inStock thay vì isActive)
-    categories = await categories_collection.find({"inStock": True}).sort("order", 1).to_list(length=None)
+    categories = await categories_collection.find({"inStock": True}, LIST_PROJECTION).sort("order", 1).to_list(length=None)
     
     for category in categories:
         category["_id"] = str(category["_id"])
+        use_list_variant(category)
     
     return {
         "success": True,
@@ -85,11 +87,12 @@ async def add_category(
             detail="Danh mục đã tồn tại"
         )
     
-    # Upload image if provided
+    # Preprocess and upload image if provided
     image_url = None
+    image_variants = None
     if image:
-        content = await image.read()
-        image_url = await upload_image(content, folder="veloura/categories")
+        image_variants = await upload_image_variant(image, folder="veloura/categories")
+        image_url = image_variants["full"]["url"]
     
     # Tự động tạo slug từ name
     slug = name.lower().replace(" & ", "-").replace(" ", "-").replace("&", "and")
@@ -104,6 +107,7 @@ async def add_category(
         "slug": slug,
         "description": description,
         "image": image_url,
+        "imageVariants": image_variants,
         "inStock": True,
         "order": next_order,
         "createdAt": datetime.utcnow(),
@@ -146,11 +150,11 @@ async def update_category(
     if description:
         update_data["description"] = description
     
-    # Upload new image if provided
+    # Preprocess and upload new image if provided
     if image:
-        content = await image.read()
-        image_url = await upload_image(content, folder="veloura/categories")
-        update_data["image"] = image_url
+        image_variants = await upload_image_variant(image, folder="veloura/categories")
+        update_data["image"] = image_variants["full"]["url"]
+        update_data["imageVariants"] = image_variants
     
     update_data["updatedAt"] = datetime.utcnow()
     
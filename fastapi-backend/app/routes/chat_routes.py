@@ -11,8 +11,9 @@ import logging
 from typing import AsyncGenerator
 
 from app.config.settings import settings
-from app.models.chat import ChatRequest, ChatResponse, ContextSource, ErrorResponse, StreamChunk
+from app.models.chat import ChatRequest, ChatResponse, ChatMessage, ContextSource, ErrorResponse, StreamChunk
 from app.services.rag_service import retrieve_context, search_all_collections
+from app.services.chat_memory import chat_sessions
 
 logger = logging.getLogger(__name__)
 
@@ -22,9 +23,9 @@ router = APIRouter(prefix="/chat", tags=["Chat"])
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
 
-def build_prompt(user_message: str, context: str, conversation_history: list = None) -> str:
+def build_prompt(user_message: str, context: str, conversation_history: list = None, summary: str = None) -> str:
     """
-    Build prompt for Gemini with RAG context and conversation history.
+    Build prompt for Gemini with RAG context, conversation summary and recent history.
     """
     system_prompt = """Bạn là trợ lý AI thông minh cho cửa hàng thời trang Veloura. 
 Nhiệm vụ của bạn là giúp khách hàng tìm sản phẩm, trả lời câu hỏi về thời trang, và tư vấn mua sắm.
@@ -58,10 +59,14 @@ Dạ, em tìm thấy các sản phẩm áo thun nam sau:
 
 """
     
+    # Add summary of older turns if available
+    if summary:
+        system_prompt += f"\n\nTÓM TẮT HỘI THOẠI TRƯỚC ĐÓ:\n{summary}\n"
+    
     # Add conversation history if available
     if conversation_history:
         history_text = "\n\nLỊCH SỬ HỘI THOẠI:\n"
-        for msg in conversation_history[-5:]:  # Last 5 messages
+        for msg in conversation_history[-settings.CHAT_RECENT_MESSAGES:]:  # Recent messages only
             role = "Người dùng" if msg.role == "user" else "Trợ lý"
             history_text += f"{role}: {msg.content}\n"
         system_prompt += history_text
@@ -81,6 +86,23 @@ Trả lời (bằng tiếng Việt):"""
     return prompt
 
 
+async def load_history(request: ChatRequest) -> tuple:
+    """
+    Resolve the chat session for a request.
+    
+    Returns:
+        (session, conversation_history, summary) - server-side history when the session
+        has any, otherwise the legacy client-sent conversation_history
+    """
+    session = await chat_sessions.get(request.session_id)
+    
+    if request.session_id or session["messages"]:
+        history = [ChatMessage(**msg) for msg in session["messages"]]
+        return session, history, session["summary"]
+    
+    return session, request.conversation_history, None
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -115,11 +137,13 @@ async def chat(request: ChatRequest):
             # Format context
             context = await retrieve_context(request.message, top_k=5)
         
-        # Step 2: Build prompt
+        # Step 2: Build prompt (history comes from the server-side session)
+        session, history, summary = await load_history(request)
         prompt = build_prompt(
             user_message=request.message,
             context=context,
-            conversation_history=request.conversation_history
+            conversation_history=history,
+            summary=summary
         )
         
         # Step 3: Call Gemini API
@@ -134,9 +158,13 @@ async def chat(request: ChatRequest):
         
         logger.info(f"Generated response ({len(assistant_message)} chars)")
         
+        # Step 4: Remember this turn
+        await chat_sessions.append_turn(session["_id"], request.message, assistant_message)
+        
         return ChatResponse(
             success=True,
             message=assistant_message,
+            session_id=session["_id"],
             sources=sources[:5]  # Return top 5 sources
         )
         
@@ -148,11 +176,13 @@ async def chat(request: ChatRequest):
         )
 
 
-async def generate_stream(prompt: str) -> AsyncGenerator[str, None]:
+async def generate_stream(prompt: str, session_id: str = None, user_message: str = None) -> AsyncGenerator[str, None]:
     """
     Generate streaming response from Gemini.
+    When session_id is given, the full answer is recorded in the chat session once streaming completes.
     """
     try:
+        answer_parts = []
         model = genai.GenerativeModel(settings.GEMINI_MODEL)
         
         response = await asyncio.to_thread(
@@ -163,13 +193,17 @@ async def generate_stream(prompt: str) -> AsyncGenerator[str, None]:
         
         for chunk in response:
             if chunk.text:
+                answer_parts.append(chunk.text)
                 # Send as Server-Sent Events format
                 data = StreamChunk(content=chunk.text, done=False)
                 yield f"data: {data.model_dump_json()}\n\n"
                 await asyncio.sleep(0.01)  # Small delay for smooth streaming
         
+        if session_id:
+            await chat_sessions.append_turn(session_id, user_message, "".join(answer_parts))
+        
         # Send final chunk
-        final_chunk = StreamChunk(content="", done=True)
+        final_chunk = StreamChunk(content="", done=True, session_id=session_id)
         yield f"data: {final_chunk.model_dump_json()}\n\n"
         
     except Exception as e:
@@ -196,20 +230,23 @@ async def chat_stream(request: ChatRequest):
             context = await retrieve_context(request.message, top_k=3)
         
         # Build prompt
+        session, history, summary = await load_history(request)
         prompt = build_prompt(
             user_message=request.message,
             context=context,
-            conversation_history=request.conversation_history
+            conversation_history=history,
+            summary=summary
         )
         
         # Return streaming response
         return StreamingResponse(
-            generate_stream(prompt),
+            generate_stream(prompt, session_id=session["_id"], user_message=request.message),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"  # Disable nginx buffering
+                "X-Accel-Buffering": "no",  # Disable nginx buffering
+                "X-Chat-Session-Id": session["_id"]
             }
         )
         
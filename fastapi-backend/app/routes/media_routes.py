@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from app.config.settings import settings
+from app.services.media_storage import LocalStorage, CONTENT_TYPES, get_storage
+
+router = APIRouter()
+
+# GET /media/{key} - Phục vụ ảnh đã lưu bởi local storage backend (public)
+@router.get("/{key}")
+async def get_media(key: str, request: Request):
+    """
+    Serve a content-addressed file stored by the local media backend.
+    Keys never change content, so responses carry a long-lived immutable Cache-Control
+    and the content hash as ETag.
+    """
+    storage = get_storage()
+
+    # Chỉ dùng khi MEDIA_STORAGE_BACKEND=local
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy file"
+        )
+
+    # Bước 1: Kiểm tra key hợp lệ (chặn path traversal)
+    try:
+        path = storage.path_for(key)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy file"
+        )
+
+    # Bước 2: Trả 304 nếu client đã có bản này
+    etag = f'"{key.split(".")[0]}"'
+    headers = {"Cache-Control": settings.MEDIA_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy file"
+        )
+
+    # Bước 3: Stream file từ đĩa
+    extension = key.rsplit(".", 1)[-1]
+    return FileResponse(
+        path,
+        media_type=CONTENT_TYPES.get(extension, "application/octet-stream"),
+        headers=headers
+    )
@@ -1,47 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from fastapi.responses import RedirectResponse
-from app.models.order import OrderCreate, OrderStatusUpdate, OrderUpdate
+from app.models.order import OrderCreate, OrderStatusUpdate, OrderUpdate, OrderBulkStatusUpdate
 from app.config.database import get_collection
 from app.middleware.auth_user import auth_user
-from app.middleware.auth_admin import auth_staff
+from app.middleware.auth_admin import auth_staff, auth_admin_only
 from app.config.settings import settings
+from app.services.cart_service import CartOwner, clear_cart
+from app.services.hydration import DocumentLoader, product_loader
+from app.services.order_service import (
+    list_order_summaries, get_user_order, build_order_filter, list_order_queue, count_order_facets,
+    ORDER_STATUSES
+)
+from app.services.order_transitions import bulk_transition, restore_stock
+from app.services.inventory_service import InsufficientStock, check_available, reserve_order_items
+from app.services.payment_service import confirm_payment, cancel_unpaid_order, find_payment_order, CONFIRMED, ALREADY_PAID, REFUND_REQUIRED, NOT_FOUND
+from app.services.stripe_gateway import GatewayUnavailable, get_gateway as get_stripe_gateway
+from app.services.stripe_webhook import enqueue_event as enqueue_stripe_event
+from app.services.purchase_service import sync_order_purchases, remove_order_purchases, recent_purchased_product_ids
+from app.services.image_pipeline import use_list_variant
+from app.services.vnpay_gateway import is_successful_payment
 from app.utils.vnpay_helper import create_payment_url, verify_payment_signature, get_client_ip
 from bson import ObjectId
 from datetime import datetime
+from typing import List, Optional
 import stripe
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+import json
+import time
 
 router = APIRouter()
 
-# Helper function to update product quantity
-async def update_product_quantity(product_id: str, quantity_change: int):
-    """
-    Update product quantity in database.
-    
-    Args:
-        product_id: Product ID to update
-        quantity_change: Amount to change (negative for decrease, positive for increase)
-    
-    Returns:
-        Updated product document or None if not found
-    """
-    products_collection = await get_collection("products")
-    
-    # Use atomic $inc operation to safely update quantity
-    result = await products_collection.find_one_and_update(
-        {"_id": ObjectId(product_id)},
-        {
-            "$inc": {"quantity": quantity_change},
-            "$set": {"updatedAt": datetime.utcnow()}
-        },
-        return_document=True
+def _insufficient_stock_error(e: InsufficientStock, products_by_id: dict) -> HTTPException:
+    """Lỗi 400 khi một size không đủ hàng (dùng chung cho COD/Stripe/VNPay)"""
+    product = products_by_id.get(e.product_id) or {}
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Sản phẩm '{product.get('name', e.product_id)}' size {e.size} chỉ còn {e.available} sản phẩm trong kho"
     )
-    
-    return result
 
 @router.post("/cod", response_model=dict)
-async def place_cod_order(order_data: OrderCreate, request: Request, user: dict = Depends(auth_user)):
+async def place_cod_order(order_data: OrderCreate, request: Request, user: dict = Depends(auth_user), products: DocumentLoader = Depends(product_loader)):
     """Place order with Cash on Delivery"""
     # Validate items không rỗng
     if not order_data.items or len(order_data.items) == 0:
@@ -50,29 +47,23 @@ async def place_cod_order(order_data: OrderCreate, request: Request, user: dict
             detail="Giỏ hàng trống! Không thể đặt hàng."
         )
     
-    products_collection = await get_collection("products")
     orders_collection = await get_collection("orders")
-    users_collection = await get_collection("users")
     
     # Get product details and calculate total
     order_items = []
     total_amount = 0
     
+    # Load all products of the order with one $in query
+    products_by_id = await products.load_many(item.product for item in order_data.items)
+    
     for item in order_data.items:
-        product = await products_collection.find_one({"_id": ObjectId(item.product), "isActive": True})
-        if not product:
+        product = products_by_id.get(item.product)
+        if not product or not product.get("isActive"):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Sản phẩm {item.product} không tồn tại"
             )
         
-        # Kiểm tra số lượng tồn kho
-        if product.get("quantity", 0) < item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Sản phẩm '{product['name']}' chỉ còn {product.get('quantity', 0)} sản phẩm trong kho"
-            )
-        
         item_total = product["offerPrice"] * item.quantity
         total_amount += item_total
         
@@ -90,8 +81,16 @@ async def place_cod_order(order_data: OrderCreate, request: Request, user: dict
     # Add delivery charges
     total_amount += settings.DELIVERY_CHARGES
     
+    # Trừ kho theo từng size (trừ có điều kiện: thiếu hàng ở một dòng thì không trừ dòng nào)
+    order_id = ObjectId()
+    try:
+        await reserve_order_items(str(order_id), order_items)
+    except InsufficientStock as e:
+        raise _insufficient_stock_error(e, products_by_id)
+    
     # Create order
     order_doc = {
+        "_id": order_id,
         "userId": str(user["_id"]),
         "items": order_items,
         "amount": total_amount,
@@ -104,17 +103,15 @@ async def place_cod_order(order_data: OrderCreate, request: Request, user: dict
         "updatedAt": datetime.utcnow()
     }
     
-    result = await orders_collection.insert_one(order_doc)
-    
-    # Trừ số lượng sản phẩm trong kho
-    for item in order_data.items:
-        await update_product_quantity(item.product, -item.quantity)
+    try:
+        result = await orders_collection.insert_one(order_doc)
+    except Exception:
+        # Không tạo được đơn: trả lại hàng đã trừ
+        await restore_stock([order_doc])
+        raise
     
     # Clear user's cart
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"cartData": {}, "updatedAt": datetime.utcnow()}}
-    )
+    await clear_cart(CartOwner(user_id=user["_id"]))
     
     return {
         "success": True,
@@ -123,7 +120,7 @@ async def place_cod_order(order_data: OrderCreate, request: Request, user: dict
     }
 
 @router.post("/stripe", response_model=dict)
-async def place_stripe_order(order_data: OrderCreate, request: Request, user: dict = Depends(auth_user)):
+async def place_stripe_order(order_data: OrderCreate, request: Request, user: dict = Depends(auth_user), products: DocumentLoader = Depends(product_loader)):
     """Place order with Stripe payment"""
     # Validate items không rỗng
     if not order_data.items or len(order_data.items) == 0:
@@ -132,7 +129,6 @@ async def place_stripe_order(order_data: OrderCreate, request: Request, user: di
             detail="Giỏ hàng trống! Không thể đặt hàng."
         )
     
-    products_collection = await get_collection("products")
     orders_collection = await get_collection("orders")
     
     # Get product details and calculate total
@@ -140,21 +136,17 @@ async def place_stripe_order(order_data: OrderCreate, request: Request, user: di
     total_amount = 0
     line_items = []
     
+    # Load all products of the order with one $in query
+    products_by_id = await products.load_many(item.product for item in order_data.items)
+    
     for item in order_data.items:
-        product = await products_collection.find_one({"_id": ObjectId(item.product), "isActive": True})
-        if not product:
+        product = products_by_id.get(item.product)
+        if not product or not product.get("isActive"):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Product {item.product} not found"
             )
         
-        # Kiểm tra số lượng tồn kho
-        if product.get("quantity", 0) < item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Sản phẩm '{product['name']}' chỉ còn {product.get('quantity', 0)} sản phẩm trong kho"
-            )
-        
         item_total = product["offerPrice"] * item.quantity
         total_amount += item_total
         
@@ -181,6 +173,12 @@ async def place_stripe_order(order_data: OrderCreate, request: Request, user: di
             "quantity": item.quantity,
         })
     
+    # Kiểm tra tồn kho theo từng size (chưa trừ kho: trừ khi đơn đã thanh toán)
+    try:
+        await check_available(order_items)
+    except InsufficientStock as e:
+        raise _insufficient_stock_error(e, products_by_id)
+    
     # Add delivery charges
     total_amount += settings.DELIVERY_CHARGES
     line_items.append({
@@ -211,14 +209,16 @@ async def place_stripe_order(order_data: OrderCreate, request: Request, user: di
     result = await orders_collection.insert_one(order_doc)
     order_id = str(result.inserted_id)
     
-    # Create Stripe checkout session
+    # Create Stripe checkout session (qua gateway: chạy ngoài event loop, có timeout/circuit breaker)
     try:
-        session = stripe.checkout.Session.create(
+        session = await get_stripe_gateway().create_checkout_session(
             payment_method_types=["card"],
             line_items=line_items,
             mode="payment",
             success_url=f"{settings.FRONTEND_URL}/my-orders?success=true&orderId={order_id}",
             cancel_url=f"{settings.FRONTEND_URL}/cart?cancelled=true",
+            # Phiên thanh toán hết hạn cùng lúc đơn bị hủy (Stripe chỉ cho phép 30 phút - 24 giờ)
+            expires_at=int(time.time()) + min(max(settings.PENDING_ORDER_TTL_MINUTES, 30), 24 * 60) * 60,
             metadata={
                 "orderId": order_id,
                 "userId": str(user["_id"])
@@ -236,6 +236,13 @@ async def place_stripe_order(order_data: OrderCreate, request: Request, user: di
             "url": session.url,
             "sessionId": session.id
         }
+    except GatewayUnavailable as e:
+        print(f"Stripe unavailable: {str(e)}")
+        await orders_collection.delete_one({"_id": ObjectId(order_id)})
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cổng thanh toán Stripe tạm thời không khả dụng, vui lòng thử lại sau"
+        )
     except Exception as e:
         # Delete order if Stripe session creation fails
         await orders_collection.delete_one({"_id": ObjectId(order_id)})
@@ -245,7 +252,7 @@ async def place_stripe_order(order_data: OrderCreate, request: Request, user: di
         )
 
 @router.post("/vnpay", response_model=dict)
-async def place_vnpay_order(order_data: OrderCreate, request: Request, user: dict = Depends(auth_user)):
+async def place_vnpay_order(order_data: OrderCreate, request: Request, user: dict = Depends(auth_user), products: DocumentLoader = Depends(product_loader)):
     """Place order with VNPay payment"""
     print("=" * 60)
     print("🔍 VNPAY ORDER ENDPOINT CALLED")
@@ -260,7 +267,6 @@ async def place_vnpay_order(order_data: OrderCreate, request: Request, user: dic
             detail="Giỏ hàng trống! Không thể đặt hàng."
         )
     
-    products_collection = await get_collection("products")
     orders_collection = await get_collection("orders")
     
     try:
@@ -268,21 +274,17 @@ async def place_vnpay_order(order_data: OrderCreate, request: Request, user: dic
         order_items = []
         total_amount = 0
         
+        # Load all products of the order with one $in query
+        products_by_id = await products.load_many(item.product for item in order_data.items)
+        
         for item in order_data.items:
-            product = await products_collection.find_one({"_id": ObjectId(item.product), "isActive": True})
-            if not product:
+            product = products_by_id.get(item.product)
+            if not product or not product.get("isActive"):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Product {item.product} not found"
                 )
             
-            # Kiểm tra số lượng tồn kho
-            if product.get("quantity", 0) < item.quantity:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Sản phẩm '{product['name']}' chỉ còn {product.get('quantity', 0)} sản phẩm trong kho"
-                )
-            
             item_total = product["offerPrice"] * item.quantity
             total_amount += item_total
             
@@ -297,6 +299,12 @@ async def place_vnpay_order(order_data: OrderCreate, request: Request, user: dic
                 "size": item.size
             })
         
+        # Kiểm tra tồn kho theo từng size (chưa trừ kho: trừ khi đơn đã thanh toán)
+        try:
+            await check_available(order_items)
+        except InsufficientStock as e:
+            raise _insufficient_stock_error(e, products_by_id)
+        
         # Add fees from snapshot
         total_amount += order_data.fees.shippingFee
         total_amount += total_amount * order_data.fees.taxRate
@@ -365,7 +373,10 @@ async def place_vnpay_order(order_data: OrderCreate, request: Request, user: dic
 
 @router.post("/userorders", response_model=dict)
 async def get_user_orders(request: Request, user: dict = Depends(auth_user)):
-    """Get all orders for logged-in user"""
+    """
+    Get all orders for logged-in user (full documents).
+    For long histories prefer GET /history (paginated summaries) + GET /detail/{order_id}.
+    """
     orders_collection = await get_collection("orders")
     
     orders = await orders_collection.find({"userId": str(user["_id"])}).sort("createdAt", -1).to_list(length=None)
@@ -378,9 +389,122 @@ async def get_user_orders(request: Request, user: dict = Depends(auth_user)):
         "orders": orders
     }
 
+@router.get("/history", response_model=dict)
+async def get_order_history(
+    request: Request,
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    user: dict = Depends(auth_user)
+):
+    """
+    Paginated order history of the logged-in user, newest first.
+    Each order is a summary (id, date, status, total, item count, first thumbnail);
+    the full order is served by GET /detail/{order_id}.
+    """
+    try:
+        page = await list_order_summaries(str(user["_id"]), limit, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor phân trang không hợp lệ"
+        )
+    
+    return {
+        "success": True,
+        **page
+    }
+
+@router.get("/detail/{order_id}", response_model=dict)
+async def get_order_detail(order_id: str, request: Request, user: dict = Depends(auth_user)):
+    """Full order (items, address, fees) of the logged-in user"""
+    order = await get_user_order(str(user["_id"]), order_id)
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy đơn hàng"
+        )
+    
+    return {
+        "success": True,
+        "order": order
+    }
+
+@router.get("/buy-again", response_model=dict)
+async def get_buy_again_products(
+    request: Request,
+    limit: int = 12,
+    user: dict = Depends(auth_user),
+    products: DocumentLoader = Depends(product_loader)
+):
+    """Products the user has received, most recently delivered first (still active only)"""
+    limit = max(1, min(limit, 50))
+    product_ids = await recent_purchased_product_ids(str(user["_id"]), limit)
+    products_by_id = await products.load_many(product_ids)
+    
+    result = []
+    for product_id in product_ids:
+        product = products_by_id.get(product_id)
+        if not product or not product.get("isActive"):
+            continue
+        product["_id"] = product_id
+        result.append(use_list_variant(product))
+    
+    return {
+        "success": True,
+        "products": result
+    }
+
+@router.get("/queue", response_model=dict)
+async def get_order_queue(
+    status_filter: Optional[List[str]] = Query(None, alias="status", description="Một hoặc nhiều trạng thái"),
+    paymentMethod: Optional[str] = Query(None),
+    isPaid: Optional[bool] = Query(None),
+    dateFrom: Optional[datetime] = Query(None, description="createdAt >= dateFrom"),
+    dateTo: Optional[datetime] = Query(None, description="createdAt < dateTo"),
+    userId: Optional[str] = Query(None),
+    email: Optional[str] = Query(None, description="Email trong địa chỉ giao hàng"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    includeCounts: Optional[bool] = Query(None, description="Mặc định: chỉ ở trang đầu"),
+    staff: dict = Depends(auth_staff)
+):
+    """
+    Admin order queue (Staff/Admin only): filtered, paginated by cursor, newest first.
+    Counts per status are computed for the other filters (so every status tab shows its count).
+    """
+    # Bước 1: Kiểm tra trạng thái
+    if status_filter:
+        invalid = [s for s in status_filter if s not in ORDER_STATUSES]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Trạng thái không hợp lệ"
+            )
+    
+    # Bước 2: Lấy 1 trang đơn hàng
+    filters = dict(payment_method=paymentMethod, is_paid=isPaid, date_from=dateFrom, date_to=dateTo, user_id=userId, email=email)
+    try:
+        page = await list_order_queue(build_order_filter(statuses=status_filter, **filters), limit, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor phân trang không hợp lệ"
+        )
+    
+    # Bước 3: Đếm theo trạng thái / phương thức thanh toán ($facet, bỏ qua bộ lọc trạng thái)
+    if includeCounts is None:
+        includeCounts = cursor is None
+    counts = await count_order_facets(build_order_filter(**filters)) if includeCounts else None
+    
+    return {
+        "success": True,
+        **page,
+        "counts": counts
+    }
+
 @router.post("/list", response_model=dict)
 async def get_all_orders(staff: dict = Depends(auth_staff)):
-    """Get all orders (Staff/Admin only)"""
+    """Get all orders (Staff/Admin only). Used by reports; the Orders page uses GET /queue."""
     orders_collection = await get_collection("orders")
     
     orders = await orders_collection.find({}).sort("createdAt", -1).to_list(length=None)
@@ -395,31 +519,62 @@ async def get_all_orders(staff: dict = Depends(auth_staff)):
 
 @router.post("/status", response_model=dict)
 async def update_order_status(status_update: OrderStatusUpdate, staff: dict = Depends(auth_staff)):
-    """Update order status (Staff/Admin only)"""
-    orders_collection = await get_collection("orders")
-    
-    # Validate status
-    valid_statuses = ["Order Placed", "Processing", "Shipped", "Delivered", "Cancelled"]
-    if status_update.status not in valid_statuses:
+    """
+    Update order status (Staff/Admin only).
+    Same rules as /bulk-status: transitions follow ORDER_TRANSITIONS and cancelling restores stock.
+    """
+    if status_update.status not in ORDER_STATUSES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Trạng thái không hợp lệ"
         )
     
-    result = await orders_collection.update_one(
-        {"_id": ObjectId(status_update.orderId)},
-        {"$set": {"status": status_update.status, "updatedAt": datetime.utcnow()}}
-    )
+    result = await bulk_transition([status_update.orderId], status_update.status)
     
-    if result.matched_count == 0:
+    if result["rejected"]:
+        rejected = result["rejected"][0]
+        if rejected["reason"] == "not_found":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy đơn hàng"
+            )
+        if rejected["reason"] == "invalid_transition":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Không thể chuyển đơn hàng từ '{rejected['status']}' sang '{status_update.status}'"
+            )
+        # Đơn vừa bị thay đổi bởi request khác
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Không tìm thấy đơn hàng"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Đơn hàng vừa được cập nhật, vui lòng tải lại và thử lại"
         )
     
     return {
         "success": True,
-        "message": "Cập nhật trạng thái đơn hàng thành công"
+        "message": "Cập nhật trạng thái đơn hàng thành công",
+        "stockRestored": result["stockRestored"]
+    }
+
+@router.post("/bulk-status", response_model=dict)
+async def bulk_update_order_status(bulk_update: OrderBulkStatusUpdate, staff: dict = Depends(auth_staff)):
+    """
+    Move many orders to one status (Staff/Admin only).
+    Transitions follow Order Placed → Processing → Shipped → Delivered (or → Cancelled);
+    orders that cannot make the transition are returned in `rejected`, the rest are updated.
+    Cancelling restores stock once per product for the whole batch.
+    """
+    if bulk_update.status not in ORDER_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Trạng thái không hợp lệ"
+        )
+    
+    result = await bulk_transition(bulk_update.orderIds, bulk_update.status)
+    
+    return {
+        "success": True,
+        "message": f"Đã cập nhật {len(result['updated'])}/{len(set(bulk_update.orderIds))} đơn hàng",
+        **result
     }
 
 @router.post("/update", response_model=dict)
@@ -448,12 +603,11 @@ async def update_order(order_update: OrderUpdate, staff: dict = Depends(auth_sta
             )
         
         # Hoàn lại quantity nếu đổi sang Cancelled từ trạng thái khác
+        # (đơn "Pending Payment" chưa trừ kho nên không hoàn)
         old_status = current_order.get("status")
-        if order_update.status == "Cancelled" and old_status != "Cancelled":
-            # Hoàn lại số lượng sản phẩm vào kho
-            for item in current_order["items"]:
-                product_id = item["product"]["_id"]
-                await update_product_quantity(product_id, item["quantity"])
+        if order_update.status == "Cancelled" and old_status not in ("Cancelled", "Pending Payment"):
+            # Hoàn lại số lượng sản phẩm vào kho (theo từng size, ghi vào sổ kho)
+            await restore_stock([current_order])
         
         update_data["status"] = order_update.status
     
@@ -471,6 +625,10 @@ async def update_order(order_update: OrderUpdate, staff: dict = Depends(auth_sta
             detail="Không tìm thấy đơn hàng"
         )
     
+    # Cập nhật purchases (quyền viết đánh giá) theo trạng thái mới
+    if order_update.status:
+        await sync_order_purchases({**current_order, "status": order_update.status})
+    
     return {
         "success": True,
         "message": "Cập nhật đơn hàng thành công"
@@ -480,7 +638,6 @@ async def update_order(order_update: OrderUpdate, staff: dict = Depends(auth_sta
 async def delete_order(request: dict, staff: dict = Depends(auth_staff)):
     """Delete order - Admin/Staff only"""
     orders_collection = await get_collection("orders")
-    products_collection = await get_collection("products")
     
     order_id = request.get("orderId")
     if not order_id:
@@ -497,18 +654,16 @@ async def delete_order(request: dict, staff: dict = Depends(auth_staff)):
             detail="Đơn hàng không tồn tại"
         )
     
-    # Nếu đơn hàng chưa bị hủy và chưa giao, hoàn lại số lượng sản phẩm
-    if order.get("status") not in ["Cancelled", "Delivered"]:
-        for item in order.get("items", []):
-            product_id = item["product"]["_id"]
-            quantity = item["quantity"]
-            # Hoàn lại số lượng vào kho
-            await update_product_quantity(product_id, quantity)
+    # Nếu đơn hàng đã trừ kho và chưa giao, hoàn lại số lượng sản phẩm (theo từng size)
+    if order.get("status") not in ["Cancelled", "Delivered", "Pending Payment"]:
+        await restore_stock([order])
     
     # Xóa đơn hàng
     result = await orders_collection.delete_one({"_id": ObjectId(order_id)})
     
     if result.deleted_count > 0:
+        # Đơn hàng đã xóa không còn là bằng chứng mua hàng
+        await remove_order_purchases(order_id)
         return {
             "success": True,
             "message": "Đã xóa đơn hàng thành công"
@@ -519,66 +674,90 @@ async def delete_order(request: dict, staff: dict = Depends(auth_staff)):
             detail="Không thể xóa đơn hàng"
         )
 
+@router.post("/stripe-webhook")
+async def stripe_webhook(request: Request):
+    """Receive Stripe events: verify signature, store in the inbox, ack immediately"""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Stripe webhook chưa được cấu hình"
+        )
+    
+    # Bước 1: Xác minh chữ ký (tính HMAC cục bộ, không gọi mạng)
+    payload = await request.body()
+    try:
+        stripe.Webhook.construct_event(payload, request.headers.get("stripe-signature"), settings.STRIPE_WEBHOOK_SECRET)
+    except (ValueError, stripe.SignatureVerificationError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Chữ ký Stripe không hợp lệ"
+        )
+    
+    # Bước 2: Lưu vào inbox (trùng event id thì bỏ qua), worker nền xử lý sau
+    await enqueue_stripe_event(json.loads(payload))
+    return {"received": True}
+
 @router.post("/verify-stripe", response_model=dict)
 async def verify_stripe_payment(session_id: str, request: Request, user: dict = Depends(auth_user)):
-    """Verify Stripe payment and update order"""
+    """Trạng thái thanh toán Stripe của đơn (đọc từ DB, webhook cập nhật đơn)"""
     orders_collection = await get_collection("orders")
-    users_collection = await get_collection("users")
+    order = await orders_collection.find_one(
+        {"stripeSessionId": session_id, "userId": str(user["_id"])},
+        {"status": 1, "isPaid": 1}
+    )
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy đơn hàng"
+        )
     
-    try:
-        # Retrieve session from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
-        
-        if session.payment_status == "paid":
-            # Get order to retrieve items
-            order = await orders_collection.find_one({"stripeSessionId": session_id})
-            
-            if order:
-                # Trừ số lượng sản phẩm trong kho
-                for item in order["items"]:
-                    product_id = item["product"]["_id"]
-                    await update_product_quantity(product_id, -item["quantity"])
-            
-            # Update order
-            result = await orders_collection.update_one(
-                {"stripeSessionId": session_id},
-                {
-                    "$set": {
-                        "isPaid": True,
-                        "paidAt": datetime.utcnow(),
-                        "status": "Order Placed",
-                        "updatedAt": datetime.utcnow()
-                    }
-                }
+    # Chưa cấu hình webhook (môi trường dev): hỏi Stripe qua gateway
+    if not order.get("isPaid") and order.get("status") == "Pending Payment" and not settings.STRIPE_WEBHOOK_SECRET:
+        try:
+            session = await get_stripe_gateway().retrieve_checkout_session(session_id)
+        except GatewayUnavailable:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Cổng thanh toán Stripe tạm thời không khả dụng, vui lòng thử lại sau"
             )
-            
-            # Clear cart
-            await users_collection.update_one(
-                {"_id": user["_id"]},
-                {"$set": {"cartData": {}, "updatedAt": datetime.utcnow()}}
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Payment verification failed: {str(e)}"
             )
-            
-            return {
-                "success": True,
-                "message": "Xác minh thanh toán thành công"
-            }
-        else:
-            return {
-                "success": False,
-                "message": "Thanh toán chưa hoàn tất"
-            }
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Payment verification failed: {str(e)}"
-        )
+        if session.payment_status == "paid":
+            result = await confirm_payment(
+                {"_id": order["_id"]},
+                provider="Stripe",
+                idempotency_key=f"stripe:{session_id}"
+            )
+            if result["outcome"] == CONFIRMED and not result["replayed"]:
+                await clear_cart(CartOwner(user_id=user["_id"]))
+            order = await orders_collection.find_one({"_id": order["_id"]}, {"status": 1, "isPaid": 1})
+    
+    if order.get("isPaid"):
+        return {
+            "success": True,
+            "message": "Xác minh thanh toán thành công",
+            "status": order["status"]
+        }
+    return {
+        "success": False,
+        "message": "Thanh toán chưa hoàn tất" if order.get("status") == "Pending Payment" else "Đơn hàng không còn chờ thanh toán",
+        "status": order.get("status")
+    }
+
+@router.get("/payment-gateway/metrics", response_model=dict)
+async def payment_gateway_metrics(admin: dict = Depends(auth_admin_only)):
+    """Trạng thái circuit breaker và latency các lệnh gọi Stripe (admin)"""
+    return {
+        "success": True,
+        **get_stripe_gateway().stats()
+    }
 
 @router.get("/vnpay-return")
 async def vnpay_return(request: Request):
-    """Handle VNPay payment callback"""
-    orders_collection = await get_collection("orders")
-    users_collection = await get_collection("users")
-    
+    """Handle VNPay payment callback (browser redirect; /vnpay-ipn confirms server-to-server)"""
     try:
         # Lấy tất cả query params từ VNPay
         params = dict(request.query_params)
@@ -594,72 +773,47 @@ async def vnpay_return(request: Request):
         vnp_response_code = params.get('vnp_ResponseCode')
         order_id = params.get('vnp_TxnRef')
         vnp_transaction_no = params.get('vnp_TransactionNo')
-        vnp_amount = params.get('vnp_Amount')
         
-        # Kiểm tra order tồn tại
-        order = await orders_collection.find_one({"_id": ObjectId(order_id)})
-        if not order:
+        if not order_id or not ObjectId.is_valid(order_id):
             return RedirectResponse(
                 url=f"{settings.FRONTEND_URL}/cart?error=order_not_found",
                 status_code=status.HTTP_303_SEE_OTHER
             )
         
         # Kiểm tra ResponseCode
-        if vnp_response_code == '00':
-            # Thanh toán thành công
+        if is_successful_payment(params):
+            # Thanh toán thành công: chuyển unpaid -> paid nguyên tử, callback trùng lặp chỉ redirect
+            result = await confirm_payment(
+                {"_id": ObjectId(order_id)},
+                provider="VNPay",
+                idempotency_key=f"vnpay:{order_id}:{vnp_transaction_no}",
+                payment_fields={"vnpayTransactionNo": vnp_transaction_no}
+            )
             
-            # Kiểm tra duplicate callback (idempotency)
-            if order.get("isPaid"):
-                # Order đã được thanh toán rồi, chỉ redirect
+            if result["outcome"] == NOT_FOUND:
                 return RedirectResponse(
-                    url=f"{settings.FRONTEND_URL}/my-orders?success=true&orderId={order_id}",
+                    url=f"{settings.FRONTEND_URL}/cart?error=order_not_found",
                     status_code=status.HTTP_303_SEE_OTHER
                 )
-            
-            # Trừ số lượng sản phẩm trong kho
-            for item in order["items"]:
-                product_id = item["product"]["_id"]
-                await update_product_quantity(product_id, -item["quantity"])
-            
-            # Update order status
-            await orders_collection.update_one(
-                {"_id": ObjectId(order_id)},
-                {
-                    "$set": {
-                        "status": "Order Placed",
-                        "isPaid": True,
-                        "paidAt": datetime.utcnow(),
-                        "vnpayTransactionNo": vnp_transaction_no,
-                        "updatedAt": datetime.utcnow()
-                    }
-                }
-            )
-            
-            # Clear user's cart
-            user_id = order.get("userId")
-            if user_id:
-                await users_collection.update_one(
-                    {"_id": ObjectId(user_id)},
-                    {"$set": {"cartData": {}, "updatedAt": datetime.utcnow()}}
+            if result["outcome"] == REFUND_REQUIRED:
+                # Đơn đã bị hủy trong lúc thanh toán: đã đánh dấu refundRequired cho nhân viên hoàn tiền
+                return RedirectResponse(
+                    url=f"{settings.FRONTEND_URL}/cart?error=order_not_pending",
+                    status_code=status.HTTP_303_SEE_OTHER
                 )
             
+            # Clear user's cart (chỉ lần xác nhận đầu tiên)
+            if result["outcome"] == CONFIRMED and not result["replayed"] and result["userId"]:
+                await clear_cart(CartOwner(user_id=result["userId"]))
+            
             # Redirect về My Orders với success message
             return RedirectResponse(
                 url=f"{settings.FRONTEND_URL}/my-orders?success=true&orderId={order_id}",
                 status_code=status.HTTP_303_SEE_OTHER
             )
         else:
-            # Thanh toán thất bại
-            # Xóa order hoặc update status = Cancelled
-            await orders_collection.update_one(
-                {"_id": ObjectId(order_id)},
-                {
-                    "$set": {
-                        "status": "Cancelled",
-                        "updatedAt": datetime.utcnow()
-                    }
-                }
-            )
+            # Thanh toán thất bại: hủy đơn nếu vẫn đang chờ thanh toán (không hủy đơn đã thanh toán)
+            await cancel_unpaid_order({"_id": ObjectId(order_id)})
             
             # Redirect về Cart với error message
             return RedirectResponse(
@@ -673,3 +827,60 @@ async def vnpay_return(request: Request):
             url=f"{settings.FRONTEND_URL}/cart?error=processing_failed",
             status_code=status.HTTP_303_SEE_OTHER
         )
+
+@router.get("/vnpay-ipn")
+async def vnpay_ipn(request: Request):
+    """
+    VNPay IPN (server-to-server): xác nhận thanh toán kể cả khi khách không quay về trang web.
+    VNPay gọi lại cho tới khi nhận RspCode; trả lời theo bảng mã của VNPay.
+    """
+    params = dict(request.query_params)
+    
+    # Bước 1: Xác minh chữ ký
+    if not verify_payment_signature(params):
+        return {"RspCode": "97", "Message": "Invalid Checksum"}
+    
+    order_id = params.get('vnp_TxnRef')
+    if not order_id or not ObjectId.is_valid(order_id):
+        return {"RspCode": "01", "Message": "Order not found"}
+    
+    try:
+        # Bước 2: Kiểm tra đơn hàng và số tiền (VNPay nhận số tiền VND * 100)
+        # (đơn đã hết hạn và bị lưu trữ vẫn được tìm thấy: thanh toán muộn sẽ khôi phục đơn)
+        order = await find_payment_order({"_id": ObjectId(order_id)}, {"amount": 1, "isPaid": 1, "status": 1})
+        if not order:
+            return {"RspCode": "01", "Message": "Order not found"}
+        try:
+            amount_matches = int(params.get('vnp_Amount', "")) == int(order["amount"]) * 100
+        except ValueError:
+            amount_matches = False
+        if not amount_matches:
+            return {"RspCode": "04", "Message": "Invalid amount"}
+        if order.get("isPaid"):
+            return {"RspCode": "02", "Message": "Order already confirmed"}
+        
+        # Bước 3: Cập nhật đơn (idempotent, cùng key với /vnpay-return)
+        if is_successful_payment(params):
+            # Đơn hết hạn: khôi phục và xác nhận; đơn đã hủy: đánh dấu cần hoàn tiền
+            vnp_transaction_no = params.get('vnp_TransactionNo')
+            result = await confirm_payment(
+                {"_id": ObjectId(order_id)},
+                provider="VNPay",
+                idempotency_key=f"vnpay:{order_id}:{vnp_transaction_no}",
+                payment_fields={"vnpayTransactionNo": vnp_transaction_no}
+            )
+            if result["outcome"] == NOT_FOUND:
+                return {"RspCode": "01", "Message": "Order not found"}
+            if result["outcome"] == ALREADY_PAID:
+                return {"RspCode": "02", "Message": "Order already confirmed"}
+            if result["outcome"] == CONFIRMED and not result["replayed"] and result["userId"]:
+                await clear_cart(CartOwner(user_id=result["userId"]))
+        elif order.get("status") == "Pending Payment":
+            await cancel_unpaid_order({"_id": ObjectId(order_id)})
+        else:
+            return {"RspCode": "02", "Message": "Order already confirmed"}
+        
+        return {"RspCode": "00", "Message": "Confirm Success"}
+    except Exception as e:
+        print(f"VNPay IPN error: {str(e)}")
+        return {"RspCode": "99", "Message": "Unknown error"}
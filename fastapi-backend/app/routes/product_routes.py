@@ -1,7 +1,7 @@
 # ===== IMPORT CÁC THƯ VIỆN VÀ MODULE CẦN THIẾT =====
 
 # Import các class và function từ FastAPI
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
 # - APIRouter: Tạo router để định nghĩa các endpoint API
 # - Depends: Dependency injection (tiêm phụ thuộc) để xác thực user
 # - HTTPException: Ném lỗi HTTP khi có vấn đề
@@ -17,20 +17,32 @@ from app.config.database import get_collection
 # Import middleware xác thực admin/staff
 from app.middleware.auth_admin import auth_staff
 
-# Import hàm upload ảnh lên Cloudinary
-from app.config.cloudinary import upload_image
+# Import hàm xử lý ảnh (resize, WebP, xóa metadata) và upload song song lên Cloudinary
+from app.services.upload_service import upload_image_variants
+
+# Import helper chọn ảnh "card" cho các endpoint danh sách
+from app.services.image_pipeline import LIST_PROJECTION, use_list_variant, variant_urls
+
+# Import cache giỏ hàng đã tính giá (xóa khi giá/trạng thái sản phẩm thay đổi)
+from app.services.cart_service import priced_carts
+
+# Import tồn kho theo size và sổ nhập/xuất kho
+from app.services import inventory_service
+# Import discount_service để áp dụng / gỡ giảm giá hàng loạt (một bulk_write)
+from app.services import discount_service
+from app.config.settings import settings
 
 # Import ObjectId của MongoDB để làm việc với _id
 from bson import ObjectId
 
 # Import để xử lý thời gian
-from datetime import datetime
+from datetime import date, datetime
 
 # Import kiểu dữ liệu List và Optional
-from typing import List, Optional
+from typing import List, Optional, Union
 
 # Import Pydantic BaseModel để define request schemas
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 # Import json để parse chuỗi JSON
 import json
@@ -39,49 +51,6 @@ import json
 # Tạo router để gom nhóm các endpoint về sản phẩm
 router = APIRouter()
 
-# ===== HELPER FUNCTION: TÍNH GIÁ SAU GIẢM =====
-def calculate_offer_price(price: float, discount_percent: float) -> float:
-    """
-    Calculate discounted price (offer price) from original price and discount percentage.
-    
-    Args:
-        price (float): Original product price
-        discount_percent (float): Discount percentage (0-100)
-        
-    Returns:
-        float: Calculated offer price, rounded to nearest 1000 VND
-        
-    Raises:
-        ValueError: If discount_percent is not in valid range (0-100)
-        
-    Examples:
-        >>> calculate_offer_price(500000, 10.0)
-        450000.0
-        >>> calculate_offer_price(299000, 15.0)
-        254000.0
-        >>> calculate_offer_price(750000, 35.0)
-        488000.0
-    """
-    # Validate discount percentage
-    if discount_percent < 0 or discount_percent > 100:
-        raise ValueError(f"Discount percent must be between 0 and 100, got {discount_percent}")
-    
-    # Return original price if no discount
-    if discount_percent == 0:
-        return price
-    
-    # Round discount to 2 decimal places for consistency
-    discount_percent = round(discount_percent, 2)
-    
-    # Calculate offer price: price * (1 - discount/100)
-    offer_price = price * (1 - discount_percent / 100)
-    
-    # Round to nearest 1000 VND for Vietnamese currency
-    # Example: 254150 → 254000, 487500 → 488000
-    offer_price = round(offer_price, -3)
-    
-    return offer_price
-
 # ===== ENDPOINT 1: LẤY DANH SÁCH TẤT CẢ SẢN PHẨM =====
 # Route: GET /api/product/list
 # Công khai (không cần đăng nhập)
@@ -122,12 +91,14 @@ async def get_all_products(
     # Bước 6: Thực hiện query và chuyển kết quả thành list
     # find(query): Tìm tất cả document phù hợp
     # to_list(length=None): Chuyển cursor thành list, None = không giới hạn
-    products = await products_collection.find(query).to_list(length=None)
+    # LIST_PROJECTION: chỉ lấy variant "card" của ảnh (bỏ thumb/full)
+    products = await products_collection.find(query, LIST_PROJECTION).to_list(length=None)
     
     # Bước 7: Chuyển ObjectId thành string để có thể serialize thành JSON
     # MongoDB dùng ObjectId cho _id, nhưng JSON không hỗ trợ ObjectId
     for product in products:
         product["_id"] = str(product["_id"])  # ObjectId("abc123") → "abc123"
+        use_list_variant(product)  # image = URL ảnh card (nhỏ hơn ảnh gốc)
     
     # Bước 8: Trả về response với format chuẩn
     return {
@@ -189,18 +160,12 @@ async def add_product(
     # json.loads(): Chuyển string → dict
     product_dict = json.loads(productData)
     
-    # Bước 3: Upload từng ảnh lên Cloudinary
-    image_urls = []  # Mảng chứa các URL ảnh đã upload
-    for image in images:
-        # Đọc nội dung file ảnh (binary data)
-        content = await image.read()
-        
-        # Upload lên Cloudinary folder "veloura/products"
-        # Trả về URL ảnh đã upload: https://res.cloudinary.com/.../image.jpg
-        url = await upload_image(content, folder="veloura/products")
-        
-        # Thêm URL vào mảng
-        image_urls.append(url)
+    # Bước 3: Xử lý và upload tất cả ảnh lên Cloudinary cùng lúc
+    # Mỗi ảnh được kiểm tra, xóa metadata, chuyển sang WebP và tạo 3 kích thước
+    # (thumb/card/full) trong process pool, rồi upload song song.
+    # Thứ tự ảnh giữ nguyên thứ tự gửi lên.
+    image_variants = await upload_image_variants(images, folder="veloura/products")
+    image_urls = variant_urls(image_variants, "full")  # Ảnh đầy đủ cho trang chi tiết
     
     # Bước 4: Tạo document sản phẩm để lưu vào MongoDB
     # Xử lý giá khuyến mãi: nếu rỗng hoặc không hợp lệ thì dùng giá gốc
@@ -226,6 +191,9 @@ async def add_product(
         # Mảng URL ảnh đã upload ở bước 3
         "image": image_urls,
         
+        # Các kích thước ảnh: [{thumb, card, full}] kèm width/height
+        "imageVariants": image_variants,
+        
         # Mặc định sản phẩm mới là inStock (hiển thị trên website)
         "inStock": True,
         
@@ -242,6 +210,9 @@ async def add_product(
     # Trả về object chứa inserted_id (ID của document vừa tạo)
     result = await products_collection.insert_one(product_doc)
     
+    # Tạo tồn kho theo từng size (chia đều quantity cho các size)
+    await inventory_service.ensure_inventory([str(result.inserted_id)])
+    
     # Bước 6: Trả về response thành công
     return {
         "success": True,
@@ -301,17 +272,12 @@ async def update_product(
         if "isActive" in product_dict:
             update_data["isActive"] = product_dict["isActive"]
     
-    # Bước 5: Upload ảnh mới (nếu có)
+    # Bước 5: Xử lý và upload ảnh mới (nếu có) - tất cả ảnh upload song song
     if images:
-        image_urls = []
-        for image in images:
-            # Đọc và upload từng ảnh
-            content = await image.read()
-            url = await upload_image(content, folder="veloura/products")
-            image_urls.append(url)
-        
-        # Thay thế mảng ảnh cũ bằng ảnh mới
-        update_data["image"] = image_urls
+        # Thay thế mảng ảnh cũ (và các kích thước) bằng ảnh mới
+        image_variants = await upload_image_variants(images, folder="veloura/products")
+        update_data["image"] = variant_urls(image_variants, "full")
+        update_data["imageVariants"] = image_variants
     
     # Bước 6: Cập nhật thời gian sửa đổi
     update_data["updatedAt"] = datetime.utcnow()
@@ -323,6 +289,10 @@ async def update_product(
         {"_id": ObjectId(product_id)},  # Điều kiện: tìm theo ID
         {"$set": update_data}            # Cập nhật các field trong update_data
     )
+    # Đổi size → thêm tồn kho 0 cho size mới, bỏ tồn kho của size đã xóa
+    if "sizes" in update_data:
+        await inventory_service.sync_sizes(product_id, update_data["sizes"], str(staff["_id"]))
+    priced_carts.invalidate_products([product_id])
     
     # Bước 8: Trả về response thành công
     return {
@@ -358,6 +328,7 @@ async def delete_product(product_id: str, staff: dict = Depends(auth_staff)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Không tìm thấy sản phẩm"
         )
+    priced_carts.invalidate_products([product_id])
     
     # Bước 4: Trả về response thành công
     return {
@@ -381,11 +352,12 @@ async def get_products_by_category(category: str):  # category từ URL path
     products = await products_collection.find({
         "category": category,   # Điều kiện 1: Danh mục phải khớp
         "inStock": True        # Điều kiện 2: Sản phẩm đang inStock
-    }).to_list(length=None)     # Chuyển cursor thành list
+    }, LIST_PROJECTION).to_list(length=None)     # Chuyển cursor thành list (chỉ lấy ảnh card)
     
     # Bước 3: Chuyển ObjectId thành string cho tất cả sản phẩm
     for product in products:
         product["_id"] = str(product["_id"])
+        use_list_variant(product)
     
     # Bước 4: Trả về danh sách sản phẩm
     return {
@@ -403,8 +375,16 @@ class ApplyDiscountRequest(BaseModel):
     category: Optional[str] = None
     applyToAll: bool = False
     discountPercent: float = Field(..., ge=0, le=100)
-    startDate: Optional[datetime] = None
-    endDate: Optional[datetime] = None
+    startDate: Optional[Union[datetime, date]] = None  # date: từ 00:00 ngày đó (giờ cửa hàng)
+    endDate: Optional[Union[datetime, date]] = None  # date: hết ngày đó (giờ cửa hàng)
+
+    @field_validator('startDate', 'endDate', mode='before')
+    @classmethod
+    def keep_date_only(cls, v):
+        # "YYYY-MM-DD" (date picker) giữ nguyên là ngày, không thành datetime 00:00
+        if isinstance(v, str) and len(v) == 10:
+            return date.fromisoformat(v)
+        return v
 
 class RemoveDiscountRequest(BaseModel):
     productIds: Optional[List[str]] = None
@@ -415,6 +395,18 @@ class UpdateDiscountRequest(BaseModel):
     productIds: List[str]
     newDiscountPercent: float = Field(..., ge=0, le=100)
 
+class RestockRequest(BaseModel):
+    productId: str
+    size: str
+    quantity: int = Field(..., gt=0)
+    note: Optional[str] = None
+
+class AdjustStockRequest(BaseModel):
+    productId: str
+    size: str
+    onHand: int = Field(..., ge=0)  # Số lượng kiểm kê thực tế
+    note: Optional[str] = None
+
 # ===== ENDPOINT 7: TOGGLE DISCOUNT ON/OFF =====
 @router.post("/toggle-discount", response_model=dict)
 async def toggle_discount(
@@ -433,21 +425,15 @@ async def toggle_discount(
             detail="Không tìm thấy sản phẩm"
         )
     
-    # Update hasDiscount field
-    update_data = {
-        "hasDiscount": data.hasDiscount,
-        "updatedAt": datetime.utcnow()
-    }
-    
-    # If turning off discount, reset to original price
     if not data.hasDiscount:
-        update_data["offerPrice"] = product["price"]
-        update_data["discountPercent"] = 0.0
-    
-    await products_collection.update_one(
-        {"_id": ObjectId(data.productId)},
-        {"$set": update_data}
-    )
+        # Turning off: reset to original price, drop dates and queued promotion transitions
+        await discount_service.remove_discount({"_id": product["_id"]})
+    else:
+        await products_collection.update_one(
+            {"_id": ObjectId(data.productId)},
+            {"$set": {"hasDiscount": True, "updatedAt": datetime.utcnow()}}
+        )
+        priced_carts.invalidate_products([data.productId])
     
     return {
         "success": True,
@@ -462,8 +448,6 @@ async def apply_discount(
 ):
     """Apply discount to products or entire category (Admin/Staff only)"""
     
-    products_collection = await get_collection("products")
-    
     # Build query
     query = {}
     if data.applyToAll and data.category:
@@ -478,45 +462,33 @@ async def apply_discount(
             detail="Phải cung cấp productIds hoặc (category với applyToAll=true)"
         )
     
-    # Find products
-    products = await products_collection.find(query).to_list(length=None)
-    if not products:
+    # Kiểm tra khoảng thời gian khuyến mãi
+    # Ngày từ trang admin (YYYY-MM-DD) là ngày theo giờ cửa hàng; endDate tính hết ngày đó
+    start_date = discount_service.shop_time_to_utc(data.startDate)
+    end_date = discount_service.shop_time_to_utc(data.endDate, end_of_day=True)
+    if end_date and end_date <= max(start_date or datetime.utcnow(), datetime.utcnow()):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Không tìm thấy sản phẩm nào"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="endDate phải sau startDate và sau thời điểm hiện tại"
         )
     
-    # Update each product
-    updated_count = 0
-    for product in products:
-        # Calculate new offer price
-        offer_price = calculate_offer_price(product["price"], data.discountPercent)
-        
-        # Prepare update data
-        update_data = {
-            "hasDiscount": True,
-            "discountPercent": round(data.discountPercent, 2),
-            "offerPrice": offer_price,
-            "updatedAt": datetime.utcnow()
-        }
-        
-        # Add dates if provided
-        if data.startDate:
-            update_data["discountStartDate"] = data.startDate
-        if data.endDate:
-            update_data["discountEndDate"] = data.endDate
-        
-        # Update product
-        await products_collection.update_one(
-            {"_id": product["_id"]},
-            {"$set": update_data}
+    # Tính offerPrice mới và ghi tất cả trong một bulk_write
+    # (startDate trong tương lai: chỉ lưu lịch, promotion_scheduler đổi giá đúng giờ)
+    summary = await discount_service.apply_discount(query, data.discountPercent, start_date, end_date)
+    if not summary["matched"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy sản phẩm nào"
         )
-        updated_count += 1
     
+    if summary["scheduled"]:
+        message = f"Scheduled {data.discountPercent}% discount for {summary['matched']} products from {start_date.isoformat()}Z"
+    else:
+        message = f"Applied {data.discountPercent}% discount to {summary['matched']} products"
     return {
         "success": True,
-        "message": f"Applied {data.discountPercent}% discount to {updated_count} products",
-        "updatedCount": updated_count
+        "message": message,
+        **summary
     }
 
 # ===== ENDPOINT 9: REMOVE DISCOUNT =====
@@ -527,13 +499,11 @@ async def remove_discount(
 ):
     """Remove discount from products or entire category (Admin/Staff only)"""
     
-    products_collection = await get_collection("products")
-    
     # Build query
     query = {}
     if data.removeAll and data.category:
-        # Remove from entire category
-        query = {"category": data.category, "hasDiscount": True}
+        # Remove from entire category (kể cả khuyến mãi đã lên lịch nhưng chưa bắt đầu)
+        query = {"category": data.category, "$or": [{"hasDiscount": True}, {"discountStartDate": {"$ne": None}}]}
     elif data.productIds:
         # Remove from specific products
         query = {"_id": {"$in": [ObjectId(pid) for pid in data.productIds]}}
@@ -543,36 +513,18 @@ async def remove_discount(
             detail="Phải cung cấp productIds hoặc (category với removeAll=true)"
         )
     
-    # Find products
-    products = await products_collection.find(query).to_list(length=None)
-    if not products:
+    # Đặt offerPrice = price cho tất cả trong một update_many
+    summary = await discount_service.remove_discount(query)
+    if not summary["matched"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Không tìm thấy sản phẩm nào"
         )
     
-    # Update each product
-    updated_count = 0
-    for product in products:
-        # Reset to original price
-        update_data = {
-            "hasDiscount": False,
-            "discountPercent": 0.0,
-            "offerPrice": product["price"],
-            "updatedAt": datetime.utcnow()
-        }
-        
-        # Update product
-        await products_collection.update_one(
-            {"_id": product["_id"]},
-            {"$set": update_data, "$unset": {"discountStartDate": "", "discountEndDate": ""}}
-        )
-        updated_count += 1
-    
     return {
         "success": True,
-        "message": f"Removed discount from {updated_count} products",
-        "updatedCount": updated_count
+        "message": f"Removed discount from {summary['matched']} products",
+        **summary
     }
 
 # ===== ENDPOINT 9B: TOGGLE PRODUCT ACTIVE STATUS =====
@@ -605,6 +557,7 @@ async def toggle_product_active(
             }
         }
     )
+    priced_carts.invalidate_products([product_id])
     
     status_text = "hiển thị" if new_status else "ẩn"
     return {
@@ -621,44 +574,127 @@ async def update_discount(
 ):
     """Update discount percentage for existing discounted products (Admin/Staff only)"""
     
-    products_collection = await get_collection("products")
-    
-    # Find products
-    query = {"_id": {"$in": [ObjectId(pid) for pid in data.productIds]}}
-    products = await products_collection.find(query).to_list(length=None)
+    # Tính offerPrice mới và ghi tất cả trong một bulk_write
+    # (sản phẩm có khuyến mãi chưa bắt đầu: chỉ đổi % trong lịch)
+    product_ids = [ObjectId(pid) for pid in data.productIds]
+    summary = await discount_service.update_discount(product_ids, data.newDiscountPercent)
     
-    if not products:
+    if not summary["matched"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Không tìm thấy sản phẩm nào"
         )
     
-    # Update each product
-    updated_count = 0
-    for product in products:
-        # Calculate new offer price
-        offer_price = calculate_offer_price(product["price"], data.newDiscountPercent)
-        
-        # Update product
-        await products_collection.update_one(
-            {"_id": product["_id"]},
-            {"$set": {
-                "discountPercent": round(data.newDiscountPercent, 2),
-                "offerPrice": offer_price,
-                "hasDiscount": True,
-                "updatedAt": datetime.utcnow()
-            }}
-        )
-        updated_count += 1
+    return {
+        "success": True,
+        "message": f"Updated discount to {data.newDiscountPercent}% for {summary['matched']} products",
+        **summary
+    }
+
+# ===== ENDPOINT 11: TỒN KHO THEO SIZE =====
+# Route: GET /api/product/stock/low?threshold=5
+@router.get("/stock/low", response_model=dict)
+async def get_low_stock(
+    threshold: Optional[int] = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    staff: dict = Depends(auth_staff)
+):
+    """Các (sản phẩm, size) sắp hết hàng, ít nhất trước (Admin/Staff only)"""
+    threshold = settings.LOW_STOCK_THRESHOLD if threshold is None else threshold
+    lines = await inventory_service.list_low_stock(threshold, limit)
     
+    # Gắn tên sản phẩm (một truy vấn $in)
+    products_collection = await get_collection("products")
+    product_ids = [ObjectId(line["productId"]) for line in lines if ObjectId.is_valid(line["productId"])]
+    names = {
+        str(p["_id"]): p["name"]
+        async for p in products_collection.find({"_id": {"$in": product_ids}}, {"name": 1})
+    }
+    for line in lines:
+        line["name"] = names.get(line["productId"])
+    
+    return {
+        "success": True,
+        "threshold": threshold,
+        "items": lines
+    }
+
+# Route: GET /api/product/{product_id}/stock
+@router.get("/{product_id}/stock", response_model=dict)
+async def get_product_stock(product_id: str, staff: dict = Depends(auth_staff)):
+    """Tồn kho theo size của một sản phẩm (Admin/Staff only)"""
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy sản phẩm"
+        )
+    stock = await inventory_service.get_product_stock(product_id)
     return {
         "success": True,
-        "message": f"Updated discount to {data.newDiscountPercent}% for {updated_count} products",
-        "updatedCount": updated_count
+        "stock": stock,
+        "total": sum(stock.values())
     }
 
+# Route: GET /api/product/{product_id}/stock/movements?cursor=...
+@router.get("/{product_id}/stock/movements", response_model=dict)
+async def get_stock_movements(
+    product_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    staff: dict = Depends(auth_staff)
+):
+    """Lịch sử nhập/xuất kho của một sản phẩm, mới nhất trước (Admin/Staff only)"""
+    try:
+        page = await inventory_service.list_movements(product_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor không hợp lệ"
+        )
+    return {"success": True, **page}
+
+# Route: POST /api/product/stock/restock
+@router.post("/stock/restock", response_model=dict)
+async def restock_product(data: RestockRequest, staff: dict = Depends(auth_staff)):
+    """Nhập thêm hàng cho một size (Admin/Staff only)"""
+    await _require_product_size(data.productId, data.size)
+    on_hand = await inventory_service.restock(data.productId, data.size, data.quantity, str(staff["_id"]), data.note)
+    return {
+        "success": True,
+        "message": f"Đã nhập thêm {data.quantity} sản phẩm size {data.size}",
+        "onHand": on_hand
+    }
+
+# Route: POST /api/product/stock/adjust
+@router.post("/stock/adjust", response_model=dict)
+async def adjust_product_stock(data: AdjustStockRequest, staff: dict = Depends(auth_staff)):
+    """Điều chỉnh tồn kho một size theo số kiểm kê (Admin/Staff only)"""
+    await _require_product_size(data.productId, data.size)
+    delta = await inventory_service.adjust(data.productId, data.size, data.onHand, str(staff["_id"]), data.note)
+    return {
+        "success": True,
+        "message": f"Đã điều chỉnh tồn kho size {data.size}",
+        "onHand": data.onHand,
+        "delta": delta
+    }
+
+async def _require_product_size(product_id: str, size: str) -> None:
+    """404 nếu sản phẩm không tồn tại, 400 nếu sản phẩm không có size này"""
+    products_collection = await get_collection("products")
+    product = await products_collection.find_one({"_id": ObjectId(product_id)}, {"sizes": 1}) if ObjectId.is_valid(product_id) else None
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy sản phẩm"
+        )
+    if size not in product.get("sizes", []):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sản phẩm không có size {size}"
+        )
+
 # ===== KẾT THÚC FILE =====
-# Tổng cộng 10 endpoints:
+# Tổng cộng 15 endpoints:
 # 1.  GET    /list                    → Lấy tất cả sản phẩm (có filter)
 # 2.  GET    /{product_id}            → Lấy 1 sản phẩm
 # 3.  POST   /add                     → Thêm sản phẩm mới (Admin/Staff)
@@ -669,3 +705,8 @@ async def update_discount(
 # 8.  POST   /apply-discount          → Áp dụng discount (Admin/Staff)
 # 9.  POST   /remove-discount         → Xóa discount (Admin/Staff)
 # 10. POST   /update-discount         → Cập nhật % discount (Admin/Staff)
+# 11. GET    /stock/low               → Size sắp hết hàng (Admin/Staff)
+# 12. GET    /{product_id}/stock      → Tồn kho theo size (Admin/Staff)
+# 13. GET    /{product_id}/stock/movements → Sổ nhập/xuất kho (Admin/Staff)
+# 14. POST   /stock/restock           → Nhập hàng (Admin/Staff)
+# 15. POST   /stock/adjust            → Điều chỉnh theo kiểm kê (Admin/Staff)
@@ -2,7 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from app.models.review import ReviewCreate, ReviewUpdate, ReviewResponse, ReviewStats
 from app.config.database import get_collection
 from app.middleware.auth_admin import auth_user
+from app.services.review_service import apply_rating_change, ensure_rating_stats, get_rating_stats, list_product_reviews, REVIEW_SORTS
+from app.services.hydration import DocumentLoader, hydrate, product_loader
+from app.services.purchase_service import find_purchase
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from typing import List, Optional
 
@@ -20,7 +25,6 @@ async def create_review(
     """
     try:
         reviews_collection = await get_collection("reviews")
-        orders_collection = await get_collection("orders")
         users_collection = await get_collection("users")
         products_collection = await get_collection("products")
 
@@ -42,25 +46,17 @@ async def create_review(
             )
 
         # 3. CHECK VERIFIED PURCHASE (Option 1 - Strict)
-        # Find order where user bought this product and it's delivered
-        order = await orders_collection.find_one({
-            "userId": str(current_user["_id"]),
-            "status": "Delivered",
-            "items": {
-                "$elemMatch": {
-                    "product._id": review_data.productId
-                }
-            }
-        })
+        # Point lookup in the purchases projection (delivered order lines)
+        purchase = await find_purchase(str(current_user["_id"]), review_data.productId)
 
-        if not order:
+        if not purchase:
             raise HTTPException(
                 status_code=403,
                 detail="Bạn phải mua và nhận sản phẩm này trước khi viết đánh giá"
             )
 
-        # Get purchase date from order
-        purchase_date = order.get("updatedAt") or order.get("createdAt")
+        # Get purchase date (when the order was delivered)
+        purchase_date = purchase.get("deliveredAt")
 
         # 4. Get user info
         user = await users_collection.find_one({"_id": ObjectId(current_user["_id"])})
@@ -82,7 +78,19 @@ async def create_review(
             "updatedAt": datetime.utcnow()
         }
 
-        result = await reviews_collection.insert_one(new_review)
+        # Stats must exist before the review is written (a seed must not count it twice)
+        await ensure_rating_stats(new_review["productId"])
+        try:
+            result = await reviews_collection.insert_one(new_review)
+        except DuplicateKeyError:
+            # Unique index (productId, userId): a concurrent request created it first
+            raise HTTPException(
+                status_code=400,
+                detail="Bạn đã đánh giá sản phẩm này rồi. Vui lòng chỉnh sửa đánh giá hiện tại."
+            )
+
+        # 6. Update denormalized rating stats of the product
+        await apply_rating_change(new_review["productId"], new_rating=review_data.rating)
 
         return {
             "success": True,
@@ -100,53 +108,45 @@ async def create_review(
 @router.get("/product/{product_id}", response_model=dict)
 async def get_product_reviews(
     product_id: str,
-    sort_by: Optional[str] = Query("newest", enum=["newest", "oldest", "rating_desc", "rating_asc"]),
+    sort_by: Optional[str] = Query("newest", enum=list(REVIEW_SORTS)),
     limit: int = Query(10, ge=1, le=50),
-    skip: int = Query(0, ge=0)
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page")
 ):
-    """Get all reviews for a specific product with sorting options"""
+    """
+    Get reviews for a specific product with sorting options.
+    Pages are fetched by cursor (keyset on the sort key), so deep pages are as fast as the first;
+    the total comes from the denormalized product stats.
+    """
     try:
-        reviews_collection = await get_collection("reviews")
-
         # Validate product_id
         if not ObjectId.is_valid(product_id):
             raise HTTPException(status_code=400, detail="ID sản phẩm không hợp lệ")
 
-        # Build sort query
-        sort_query = {}
-        if sort_by == "newest":
-            sort_query = {"createdAt": -1}
-        elif sort_by == "oldest":
-            sort_query = {"createdAt": 1}
-        elif sort_by == "rating_desc":
-            sort_query = {"rating": -1, "createdAt": -1}
-        elif sort_by == "rating_asc":
-            sort_query = {"rating": 1, "createdAt": -1}
-
-        # Get reviews
-        reviews_cursor = reviews_collection.find(
-            {"productId": ObjectId(product_id)}
-        ).sort(list(sort_query.items())).skip(skip).limit(limit)
-
-        reviews = await reviews_cursor.to_list(length=limit)
+        try:
+            page = await list_product_reviews(ObjectId(product_id), sort_by, limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor phân trang không hợp lệ")
 
         # Convert ObjectId to string
+        reviews = page["reviews"]
         for review in reviews:
             review["_id"] = str(review["_id"])
-            review["productId"] = str(review["productId"])
             review["userId"] = str(review["userId"])
 
-        # Get total count
-        total_reviews = await reviews_collection.count_documents({"productId": ObjectId(product_id)})
+        # Total from product_stats (no count_documents per page)
+        stats = await get_rating_stats(ObjectId(product_id))
 
         return {
             "success": True,
             "reviews": reviews,
-            "total": total_reviews,
+            "total": stats["totalReviews"],
             "limit": limit,
-            "skip": skip
+            "nextCursor": page["nextCursor"],
+            "hasMore": page["hasMore"]
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch reviews: {str(e)}")
 
@@ -154,50 +154,23 @@ async def get_product_reviews(
 # ===== ENDPOINT 3: GET REVIEW STATISTICS =====
 @router.get("/product/{product_id}/stats", response_model=dict)
 async def get_review_stats(product_id: str):
-    """Get review statistics for a product (average rating, total reviews, rating distribution)"""
+    """
+    Get review statistics for a product (average rating, total reviews, rating distribution).
+    Read from the denormalized product_stats document (kept up to date on every review change).
+    """
     try:
-        reviews_collection = await get_collection("reviews")
-
         if not ObjectId.is_valid(product_id):
             raise HTTPException(status_code=400, detail="ID sản phẩm không hợp lệ")
 
-        # Aggregate statistics
-        pipeline = [
-            {"$match": {"productId": ObjectId(product_id)}},
-            {
-                "$group": {
-                    "_id": None,
-                    "averageRating": {"$avg": "$rating"},
-                    "totalReviews": {"$sum": 1},
-                    "ratings": {"$push": "$rating"}
-                }
-            }
-        ]
-
-        result = await reviews_collection.aggregate(pipeline).to_list(length=1)
-
-        if not result:
-            return {
-                "success": True,
-                "averageRating": 0,
-                "totalReviews": 0,
-                "ratingDistribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-            }
-
-        stats = result[0]
-        
-        # Calculate rating distribution
-        rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating in stats.get("ratings", []):
-            rating_distribution[rating] += 1
+        stats = await get_rating_stats(ObjectId(product_id))
 
         return {
             "success": True,
-            "averageRating": round(stats["averageRating"], 1),
-            "totalReviews": stats["totalReviews"],
-            "ratingDistribution": rating_distribution
+            **stats
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch review stats: {str(e)}")
 
@@ -234,12 +207,19 @@ async def update_review(
         if review_data.comment is not None:
             update_data["comment"] = review_data.comment.strip()
 
-        # Update review
-        await reviews_collection.update_one(
+        if review_data.rating is not None:
+            await ensure_rating_stats(review["productId"])
+
+        # Update review (returns the previous version so stats use the rating actually replaced)
+        previous = await reviews_collection.find_one_and_update(
             {"_id": ObjectId(review_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
 
+        if previous and review_data.rating is not None:
+            await apply_rating_change(previous["productId"], previous.get("rating"), review_data.rating)
+
         return {
             "success": True,
             "message": "Cập nhật đánh giá thành công"
@@ -276,8 +256,12 @@ async def delete_review(
         if not (is_owner or is_admin):
             raise HTTPException(status_code=403, detail="Bạn không có quyền xóa đánh giá này")
 
-        # Delete review
-        await reviews_collection.delete_one({"_id": ObjectId(review_id)})
+        await ensure_rating_stats(review["productId"])
+
+        # Delete review (only the request that actually deleted it updates the stats)
+        deleted = await reviews_collection.find_one_and_delete({"_id": ObjectId(review_id)})
+        if deleted:
+            await apply_rating_change(deleted["productId"], old_rating=deleted.get("rating"))
 
         return {
             "success": True,
@@ -295,12 +279,12 @@ async def delete_review(
 async def get_user_reviews(
     current_user: dict = Depends(auth_user),
     limit: int = Query(20, ge=1, le=100),
-    skip: int = Query(0, ge=0)
+    skip: int = Query(0, ge=0),
+    products: DocumentLoader = Depends(product_loader)
 ):
     """Get all reviews written by the current user"""
     try:
         reviews_collection = await get_collection("reviews")
-        products_collection = await get_collection("products")
 
         # Get user's reviews
         reviews_cursor = reviews_collection.find(
@@ -309,9 +293,9 @@ async def get_user_reviews(
 
         reviews = await reviews_cursor.to_list(length=limit)
 
-        # Populate product info
-        for review in reviews:
-            product = await products_collection.find_one({"_id": review["productId"]})
+        # Populate product info (all products in one $in query)
+        review_products = await hydrate(reviews, "productId", products)
+        for review, product in zip(reviews, review_products):
             review["_id"] = str(review["_id"])
             review["productId"] = str(review["productId"])
             review["userId"] = str(review["userId"])
@@ -34,6 +34,12 @@ from app.utils.email import send_verification_email, send_welcome_email
 # auth_user: Middleware xác thực user từ JWT token
 from app.middleware.auth_user import auth_user
 
+# get_guest_token: Đọc token giỏ hàng khách (X-Cart-Token) để gộp khi đăng nhập
+from app.middleware.cart_owner import get_guest_token
+
+# Giỏ hàng lưu trong collection `carts` (không nằm trong document user nữa)
+from app.services.cart_service import CartOwner, read_cart, merge_guest_cart
+
 # ObjectId: Kiểu dữ liệu _id của MongoDB
 from bson import ObjectId
 
@@ -154,7 +160,6 @@ async def register_user(user: UserCreate, background_tasks: BackgroundTasks):
         "address": user.address,        # Địa chỉ (optional)
         "dateOfBirth": user.dateOfBirth.isoformat() if user.dateOfBirth else None,  # Ngày sinh (YYYY-MM-DD)
         "gender": user.gender,          # Giới tính (optional)
-        "cartData": {},                 # Giỏ hàng trống {}
         "role": "customer",             # Role mặc định là customer
         "emailVerified": False,         # 👈 Chưa xác thực email
         "isActive": False,              # 👈 Tài khoản chưa active (đợi xác thực email)
@@ -201,12 +206,12 @@ async def register_user(user: UserCreate, background_tasks: BackgroundTasks):
 # LOGIN ENDPOINT - API Đăng nhập
 # ============================================================================
 @router.post("/login", response_model=dict)  # POST /api/user/login
-async def login_user(user: UserLogin, response: Response):
+async def login_user(user: UserLogin, response: Response, request: Request):
     """
     Đăng nhập customer
     - Kiểm tra email & password
     - Tạo JWT token
-    - Lưu token vào HTTP-only cookie
+    - Gộp giỏ hàng khách (X-Cart-Token) vào giỏ hàng của user
     """
     # Lấy collection 'users' từ MongoDB
     users_collection = await get_collection("users")
@@ -269,6 +274,12 @@ async def login_user(user: UserLogin, response: Response):
     # Token sẽ có expiry time (default 7 days)
     access_token = create_access_token(data=token_data)
     
+    # ========================================================================
+    # BƯỚC 5.1: Gộp giỏ hàng khách (nếu có) vào giỏ hàng của user
+    # ========================================================================
+    # Giỏ hàng khách bị xóa sau khi gộp, frontend có thể bỏ cart token
+    cart_merged = await merge_guest_cart(get_guest_token(request), db_user["_id"])
+    
     # ========================================================================
     # BƯỚC 6: Trả về response thành công với token
     # ========================================================================
@@ -277,7 +288,8 @@ async def login_user(user: UserLogin, response: Response):
     return {
         "success": True,           # Flag thành công
         "message": "Đăng nhập thành công",  # Thông báo
-        "token": access_token      # Token để frontend lưu vào localStorage
+        "token": access_token,     # Token để frontend lưu vào localStorage
+        "cartMerged": cart_merged  # Giỏ hàng khách đã được gộp vào giỏ hàng user
     }
 
 # ============================================================================
@@ -330,6 +342,9 @@ async def is_authenticated(request: Request):
         # Xóa field password khỏi response (bảo mật)
         user.pop("password", None)
         
+        # Giỏ hàng đọc từ collection `carts` (giữ field cartData cho frontend)
+        user["cartData"] = await read_cart(CartOwner(user_id=user["_id"]))
+        
         # ====================================================================
         # BƯỚC 3: Trả về user info
         # ====================================================================
@@ -370,6 +385,9 @@ async def get_profile(request: Request, user: dict = Depends(auth_user)):
     # Xóa password khỏi response
     user.pop("password", None)
     
+    # Giỏ hàng đọc từ collection `carts`
+    user["cartData"] = await read_cart(CartOwner(user_id=user["_id"]))
+    
     # Trả về user info
     return {
         "success": True,  # Thành công
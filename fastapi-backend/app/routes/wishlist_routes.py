@@ -4,17 +4,25 @@ Các endpoint để quản lý wishlist của user:
 - GET /api/wishlist - Lấy danh sách sản phẩm trong wishlist
 - GET /api/wishlist/count - Đếm số lượng sản phẩm
 - GET /api/wishlist/check/{productId} - Kiểm tra sản phẩm có trong wishlist
+- POST /api/wishlist/check-many - Kiểm tra nhiều sản phẩm trong 1 request (lưới sản phẩm)
 - POST /api/wishlist/add - Thêm sản phẩm vào wishlist
 - DELETE /api/wishlist/remove - Xóa sản phẩm khỏi wishlist
 - DELETE /api/wishlist/clear - Xóa toàn bộ wishlist
+
+Dữ liệu lưu trong collection `wishlist_items`, mỗi document là 1 cặp (userId, productId)
+với unique index - xem app/services/wishlist_service.py
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from app.middleware.auth_user import auth_user
 from app.config.database import get_collection
-from app.models.wishlist import AddToWishlistRequest, RemoveFromWishlistRequest
+from app.models.wishlist import AddToWishlistRequest, RemoveFromWishlistRequest, CheckWishlistManyRequest
+from app.services.wishlist_service import (
+    add_item, remove_item, clear_items, count_items, contains_many, list_items
+)
+from app.services.hydration import DocumentLoader, product_loader
+from app.services.image_pipeline import use_list_variant
 from bson import ObjectId
-from datetime import datetime
 from typing import List, Dict
 
 router = APIRouter(prefix="/wishlist", tags=["Wishlist"])
@@ -23,7 +31,7 @@ router = APIRouter(prefix="/wishlist", tags=["Wishlist"])
 # GET WISHLIST - Lấy danh sách sản phẩm trong wishlist
 # ============================================================================
 @router.get("", response_model=dict)
-async def get_wishlist(request: Request, user=Depends(auth_user)):
+async def get_wishlist(request: Request, user=Depends(auth_user), products: DocumentLoader = Depends(product_loader)):
     """
     Lấy toàn bộ sản phẩm trong wishlist của user
     - Protected endpoint (cần login)
@@ -32,15 +40,11 @@ async def get_wishlist(request: Request, user=Depends(auth_user)):
     try:
         print(f"🔍 Getting wishlist for user: {user.get('email')}")
         
-        # Lấy wishlist collection
-        wishlist_collection = await get_collection("wishlists")
-        products_collection = await get_collection("products")
-        
-        # Tìm wishlist của user
+        # Lấy các item của user (đã sắp xếp mới nhất lên đầu bằng index)
         user_id = str(user["_id"])
-        wishlist = await wishlist_collection.find_one({"userId": user_id})
+        items = await list_items(user_id)
         
-        if not wishlist or not wishlist.get("products"):
+        if not items:
             print(f"✅ User has empty wishlist")
             return {
                 "success": True,
@@ -48,26 +52,20 @@ async def get_wishlist(request: Request, user=Depends(auth_user)):
                 "products": []
             }
         
-        # Lấy danh sách productId từ wishlist
-        product_ids = [ObjectId(item["productId"]) for item in wishlist["products"]]
+        # Query tất cả products từ database bằng 1 truy vấn $in
+        products_by_id = await products.load_many(item["productId"] for item in items)
         
-        # Query tất cả products từ database
-        products_cursor = products_collection.find({"_id": {"$in": product_ids}})
-        products = await products_cursor.to_list(length=None)
-        
-        # Format products data và thêm addedAt timestamp
+        # Giữ thứ tự của wishlist (mới nhất lên đầu), tra cứu sản phẩm bằng dict
         formatted_products = []
-        for product in products:
-            # Tìm addedAt từ wishlist
-            wishlist_item = next((item for item in wishlist["products"] if item["productId"] == str(product["_id"])), None)
-            
-            product["_id"] = str(product["_id"])
-            product["addedAt"] = wishlist_item["addedAt"] if wishlist_item else datetime.utcnow()
+        for item in items:
+            product = products_by_id.get(item["productId"])
+            if not product:
+                continue
+            product["_id"] = item["productId"]
+            product["addedAt"] = item["addedAt"]
+            use_list_variant(product)  # image = URL ảnh card giống lưới sản phẩm
             formatted_products.append(product)
         
-        # Sort theo thời gian thêm (mới nhất lên đầu)
-        formatted_products.sort(key=lambda x: x.get("addedAt", datetime.min), reverse=True)
-        
         print(f"✅ Found {len(formatted_products)} products in wishlist")
         
         return {
@@ -93,12 +91,8 @@ async def get_wishlist_count(request: Request, user=Depends(auth_user)):
     - Dùng để hiển thị badge số lượng ở icon wishlist
     """
     try:
-        wishlist_collection = await get_collection("wishlists")
         user_id = str(user["_id"])
-        
-        wishlist = await wishlist_collection.find_one({"userId": user_id})
-        
-        count = len(wishlist.get("products", [])) if wishlist else 0
+        count = await count_items(user_id)
         
         print(f"✅ Wishlist count for {user.get('email')}: {count}")
         
@@ -124,14 +118,8 @@ async def check_in_wishlist(productId: str, request: Request, user=Depends(auth_
     - Dùng để hiển thị trạng thái button wishlist (filled/outline heart)
     """
     try:
-        wishlist_collection = await get_collection("wishlists")
         user_id = str(user["_id"])
-        
-        wishlist = await wishlist_collection.find_one({"userId": user_id})
-        
-        in_wishlist = False
-        if wishlist and wishlist.get("products"):
-            in_wishlist = any(item["productId"] == productId for item in wishlist["products"])
+        in_wishlist = productId in await contains_many(user_id, [productId])
         
         print(f"✅ Product {productId} in wishlist: {in_wishlist}")
         
@@ -147,6 +135,33 @@ async def check_in_wishlist(productId: str, request: Request, user=Depends(auth_
             detail=f"Failed to check product: {str(e)}"
         )
 
+# ============================================================================
+# CHECK MANY PRODUCTS - Kiểm tra nhiều sản phẩm cùng lúc
+# ============================================================================
+@router.post("/check-many", response_model=dict)
+async def check_many_in_wishlist(request_data: CheckWishlistManyRequest, request: Request, user=Depends(auth_user)):
+    """
+    Kiểm tra nhiều sản phẩm có trong wishlist hay không trong 1 request
+    - Dùng cho lưới sản phẩm (đánh dấu icon trái tim cho cả trang)
+    - Trả về map {productId: true/false}
+    - Đọc từ tập productId đã cache của user (tối đa 1 query khi cache miss)
+    """
+    try:
+        user_id = str(user["_id"])
+        wishlisted = await contains_many(user_id, request_data.productIds)
+        
+        return {
+            "success": True,
+            "inWishlist": {product_id: product_id in wishlisted for product_id in request_data.productIds}
+        }
+        
+    except Exception as e:
+        print(f"❌ Error checking products in wishlist: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to check products: {str(e)}"
+        )
+
 # ============================================================================
 # ADD TO WISHLIST - Thêm sản phẩm vào wishlist
 # ============================================================================
@@ -155,8 +170,7 @@ async def add_to_wishlist(request_data: AddToWishlistRequest, request: Request,
     """
     Thêm sản phẩm vào wishlist
     - Validate productId tồn tại
-    - Kiểm tra duplicate (không thêm sản phẩm đã có)
-    - Tự động tạo wishlist mới nếu user chưa có
+    - Kiểm tra duplicate bằng unique index (không thêm sản phẩm đã có)
     """
     try:
         product_id = request_data.productId
@@ -164,7 +178,7 @@ async def add_to_wishlist(request_data: AddToWishlistRequest, request: Request,
         
         # Validate product tồn tại
         products_collection = await get_collection("products")
-        product = await products_collection.find_one({"_id": ObjectId(product_id)})
+        product = await products_collection.find_one({"_id": ObjectId(product_id)}, {"_id": 1})
         
         if not product:
             raise HTTPException(
@@ -172,61 +186,20 @@ async def add_to_wishlist(request_data: AddToWishlistRequest, request: Request,
                 detail="Không tìm thấy sản phẩm"
             )
         
-        wishlist_collection = await get_collection("wishlists")
         user_id = str(user["_id"])
         
-        # Tìm wishlist của user
-        wishlist = await wishlist_collection.find_one({"userId": user_id})
-        
-        if not wishlist:
-            # Tạo wishlist mới nếu chưa có
-            new_wishlist = {
-                "userId": user_id,
-                "products": [
-                    {
-                        "productId": product_id,
-                        "addedAt": datetime.utcnow()
-                    }
-                ],
-                "createdAt": datetime.utcnow(),
-                "updatedAt": datetime.utcnow()
-            }
-            await wishlist_collection.insert_one(new_wishlist)
-            print(f"✅ Created new wishlist and added product")
-            
-            return {
-                "success": True,
-                "message": "Đã thêm sản phẩm vào danh sách yêu thích",
-                "count": 1
-            }
+        # Unique index (userId, productId) chặn thêm trùng, không cần đọc wishlist
+        added = await add_item(user_id, product_id)
+        new_count = await count_items(user_id)
         
-        # Kiểm tra duplicate
-        existing_products = [item["productId"] for item in wishlist.get("products", [])]
-        if product_id in existing_products:
+        if not added:
             print(f"⚠️ Product already in wishlist")
             return {
                 "success": False,
                 "message": "Product already in wishlist",
-                "count": len(existing_products)
+                "count": new_count
             }
         
-        # Thêm product vào wishlist
-        await wishlist_collection.update_one(
-            {"userId": user_id},
-            {
-                "$push": {
-                    "products": {
-                        "productId": product_id,
-                        "addedAt": datetime.utcnow()
-                    }
-                },
-                "$set": {
-                    "updatedAt": datetime.utcnow()
-                }
-            }
-        )
-        
-        new_count = len(existing_products) + 1
         print(f"✅ Product added to wishlist. New count: {new_count}")
         
         return {
@@ -251,30 +224,18 @@ async def add_to_wishlist(request_data: AddToWishlistRequest, request: Request,
 async def remove_from_wishlist(request_data: RemoveFromWishlistRequest, request: Request, user=Depends(auth_user)):
     """
     Xóa sản phẩm khỏi wishlist
-    - Xóa productId khỏi products array
-    - Cập nhật updatedAt timestamp
+    - Xóa document (userId, productId) khỏi wishlist_items
     """
     try:
         product_id = request_data.productId
         print(f"🔍 Removing product {product_id} from wishlist for user {user.get('email')}")
         
-        wishlist_collection = await get_collection("wishlists")
         user_id = str(user["_id"])
         
-        # Xóa product khỏi wishlist
-        result = await wishlist_collection.update_one(
-            {"userId": user_id},
-            {
-                "$pull": {
-                    "products": {"productId": product_id}
-                },
-                "$set": {
-                    "updatedAt": datetime.utcnow()
-                }
-            }
-        )
+        # Xóa document (userId, productId)
+        removed = await remove_item(user_id, product_id)
         
-        if result.modified_count == 0:
+        if not removed:
             print(f"⚠️ Product not found in wishlist or wishlist doesn't exist")
             return {
                 "success": False,
@@ -283,8 +244,7 @@ async def remove_from_wishlist(request_data: RemoveFromWishlistRequest, request:
             }
         
         # Lấy count mới
-        wishlist = await wishlist_collection.find_one({"userId": user_id})
-        new_count = len(wishlist.get("products", [])) if wishlist else 0
+        new_count = await count_items(user_id)
         
         print(f"✅ Product removed from wishlist. New count: {new_count}")
         
@@ -308,24 +268,15 @@ async def remove_from_wishlist(request_data: RemoveFromWishlistRequest, request:
 async def clear_wishlist(request: Request, user=Depends(auth_user)):
     """
     Xóa toàn bộ sản phẩm trong wishlist
-    - Xóa hết products array nhưng giữ wishlist document
+    - Xóa tất cả document của user trong wishlist_items
     """
     try:
         print(f"🔍 Clearing wishlist for user {user.get('email')}")
         
-        wishlist_collection = await get_collection("wishlists")
         user_id = str(user["_id"])
         
         # Xóa tất cả products
-        await wishlist_collection.update_one(
-            {"userId": user_id},
-            {
-                "$set": {
-                    "products": [],
-                    "updatedAt": datetime.utcnow()
-                }
-            }
-        )
+        await clear_items(user_id)
         
         print(f"✅ Wishlist cleared")
         
@@ -0,0 +1,502 @@
+"""
+Cart Service
+Carts live in their own `carts` collection, outside the users document:
+- _id "user:<userId>" for customers, "guest:<token>" for anonymous shoppers
+- {_id, userId?, items: {itemId: {size: qty}}, createdAt, updatedAt, expiresAt?}
+- Guest carts carry expiresAt (TTL index), refreshed on every write
+- Every write is a targeted $inc/$set/$unset on items.<itemId>.<size>
+- Legacy users.cartData is moved into `carts` the first time a user's cart is touched
+- A guest cart is merged into the user cart on login
+
+It also builds the hydrated, priced view of a cart:
+- All products of the cart are loaded with one batched $in query
+- Line totals use the current offerPrice; fees come from the active `settings` document
+- Missing/inactive products, invalid sizes and insufficient stock are reported as warnings
+- Priced carts are cached per cart for a few seconds; the cache is invalidated when
+  the cart changes, when a product in it changes, or when fee settings change
+
+The cache is per process, so with several workers another worker may serve a
+priced cart up to CART_CACHE_TTL_SECONDS old.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import logging
+import re
+import secrets
+import time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+
+from app.config.database import get_collection
+from app.config.settings import settings
+from app.services.image_pipeline import LIST_VARIANT
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "carts"
+
+# Guest cart tokens are generated by new_guest_token()
+GUEST_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]{20,64}$")
+
+# Fallback fees, same defaults as GET /api/settings/current
+DEFAULT_SHIPPING_FEE = 10.0
+DEFAULT_TAX_RATE = 0.02
+
+# Product fields needed to render and price a cart line
+CART_PRODUCT_PROJECTION = {
+    "name": 1,
+    "image": 1,
+    f"imageVariants.{LIST_VARIANT}": 1,
+    "price": 1,
+    "offerPrice": 1,
+    "category": 1,
+    "sizes": 1,
+    "quantity": 1,
+    "isActive": 1,
+    "inStock": 1,
+}
+
+
+class CartOwner:
+    """Who a cart belongs to: a logged-in user or a guest token"""
+
+    def __init__(self, user_id=None, guest_token: Optional[str] = None):
+        if user_id is None and guest_token is None:
+            raise ValueError("CartOwner needs a user id or a guest token")
+        self.user_id = str(user_id) if user_id is not None else None
+        self.guest_token = guest_token
+
+    @property
+    def is_guest(self) -> bool:
+        return self.user_id is None
+
+    @property
+    def key(self) -> str:
+        """_id of the cart document (also the priced-cart cache key)"""
+        return f"guest:{self.guest_token}" if self.is_guest else f"user:{self.user_id}"
+
+
+def new_guest_token() -> str:
+    """Generate an unguessable guest cart token"""
+    return secrets.token_urlsafe(24)
+
+
+def is_valid_guest_token(token: Optional[str]) -> bool:
+    return bool(token) and bool(GUEST_TOKEN_PATTERN.match(token))
+
+
+def line_path(item_id: str, size: str) -> str:
+    """
+    Dotted path of one cart line: items.<itemId>.<size>
+
+    Raises:
+        HTTPException 400: If the id or size cannot be used as a field path
+    """
+    try:
+        ObjectId(item_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID sản phẩm không hợp lệ"
+        )
+    # "." và "$" sẽ phá vỡ đường dẫn field của MongoDB
+    if not size or "." in size or size.startswith("$"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Kích cỡ không hợp lệ"
+        )
+    return f"items.{item_id}.{size}"
+
+
+def _touch(owner: CartOwner) -> Dict[str, Any]:
+    """Fields $set on every write (guest carts get their expiry pushed back)"""
+    now = datetime.utcnow()
+    fields = {"updatedAt": now}
+    if owner.is_guest:
+        fields["expiresAt"] = now + timedelta(days=settings.CART_GUEST_TTL_DAYS)
+    return fields
+
+
+async def _create_cart(owner: CartOwner) -> None:
+    """
+    Create the cart document if it does not exist yet.
+    For users, legacy users.cartData is moved into it (once).
+    """
+    carts_collection = await get_collection(COLLECTION_NAME)
+    items: Dict[str, Dict[str, int]] = {}
+    on_insert: Dict[str, Any] = {"createdAt": datetime.utcnow()}
+
+    if not owner.is_guest:
+        users_collection = await get_collection("users")
+        legacy = await users_collection.find_one({"_id": ObjectId(owner.user_id)}, {"cartData": 1})
+        items = (legacy or {}).get("cartData") or {}
+        on_insert["userId"] = ObjectId(owner.user_id)
+
+    on_insert["items"] = items
+    await carts_collection.update_one({"_id": owner.key}, {"$setOnInsert": on_insert}, upsert=True)
+
+    if not owner.is_guest:
+        await users_collection.update_one({"_id": ObjectId(owner.user_id)}, {"$unset": {"cartData": ""}})
+        if items:
+            logger.info(f"Moved legacy cartData of user {owner.user_id} to carts")
+
+
+async def _update_cart(owner: CartOwner, update: Dict[str, Any], **kwargs) -> Optional[Dict[str, Any]]:
+    """
+    Apply one update to an existing cart document, creating the document on first use.
+    Extra kwargs go to find_one_and_update (e.g. projection).
+    """
+    carts_collection = await get_collection(COLLECTION_NAME)
+    update = {**update, "$set": {**update.get("$set", {}), **_touch(owner)}}
+
+    for _ in range(2):
+        doc = await carts_collection.find_one_and_update(
+            {"_id": owner.key}, update, return_document=ReturnDocument.AFTER, **kwargs
+        )
+        if doc is not None:
+            priced_carts.invalidate_user(owner.key)
+            return doc
+        await _create_cart(owner)
+    return None
+
+
+async def read_cart(owner: CartOwner) -> Dict[str, Dict[str, int]]:
+    """Current items of a cart ({} for an unknown guest token)"""
+    carts_collection = await get_collection(COLLECTION_NAME)
+    doc = await carts_collection.find_one({"_id": owner.key}, {"items": 1})
+    if doc is None and not owner.is_guest:
+        await _create_cart(owner)
+        doc = await carts_collection.find_one({"_id": owner.key}, {"items": 1})
+    return (doc or {}).get("items") or {}
+
+
+async def add_line(owner: CartOwner, item_id: str, size: str, quantity: int = 1) -> int:
+    """Atomically add quantity to one line and return the new line quantity"""
+    path = line_path(item_id, size)
+    doc = await _update_cart(owner, {"$inc": {path: quantity}}, projection={path: 1})
+    return doc["items"][item_id][size]
+
+
+async def set_line(owner: CartOwner, item_id: str, size: str, quantity: int) -> None:
+    """Set one line's quantity; 0 removes the line (and the product entry once it is empty)"""
+    path = line_path(item_id, size)
+    if quantity > 0:
+        await _update_cart(owner, {"$set": {path: quantity}}, projection={"_id": 1})
+        return
+
+    await _update_cart(owner, {"$unset": {path: ""}}, projection={"_id": 1})
+    # No-op if other sizes of the product remain
+    carts_collection = await get_collection(COLLECTION_NAME)
+    await carts_collection.update_one(
+        {"_id": owner.key, f"items.{item_id}": {}},
+        {"$unset": {f"items.{item_id}": ""}}
+    )
+
+
+async def merge_lines(owner: CartOwner, increments: Dict[str, int]) -> None:
+    """Add many lines in one write; increments maps line_path() -> quantity"""
+    if increments:
+        await _update_cart(owner, {"$inc": increments}, projection={"_id": 1})
+
+
+async def clear_cart(owner: CartOwner) -> None:
+    """Empty a cart (after an order is placed or on request)"""
+    carts_collection = await get_collection(COLLECTION_NAME)
+    await carts_collection.update_one({"_id": owner.key}, {"$set": {"items": {}, **_touch(owner)}})
+    priced_carts.invalidate_user(owner.key)
+
+
+async def delete_cart(owner: CartOwner) -> None:
+    """Remove a cart document entirely (e.g. when the customer is deleted)"""
+    carts_collection = await get_collection(COLLECTION_NAME)
+    await carts_collection.delete_one({"_id": owner.key})
+    priced_carts.invalidate_user(owner.key)
+
+
+async def merge_guest_cart(guest_token: Optional[str], user_id) -> bool:
+    """
+    Move a guest cart into the user's cart (quantities are added) and delete the guest cart.
+
+    Returns:
+        True if a non-empty guest cart was merged
+    """
+    if not is_valid_guest_token(guest_token):
+        return False
+
+    carts_collection = await get_collection(COLLECTION_NAME)
+    guest = CartOwner(guest_token=guest_token)
+    # Claim the guest cart atomically so two logins cannot merge it twice
+    doc = await carts_collection.find_one_and_delete({"_id": guest.key})
+    priced_carts.invalidate_user(guest.key)
+    items = (doc or {}).get("items") or {}
+
+    increments = {}
+    for item_id, sizes in items.items():
+        for size, quantity in sizes.items():
+            if quantity > 0:
+                increments[line_path(item_id, size)] = quantity
+    if not increments:
+        return False
+
+    await merge_lines(CartOwner(user_id=user_id), increments)
+    logger.info(f"Merged guest cart ({len(increments)} lines) into user {user_id}")
+    return True
+
+
+async def get_current_fees() -> Dict[str, Any]:
+    """
+    Shipping fee and tax rate from the active settings of the current year,
+    falling back to the latest active settings, then to the defaults.
+    """
+    settings_collection = await get_collection("settings")
+    current_year = datetime.now().year
+    fee_settings = await settings_collection.find_one({"year": current_year, "isActive": True})
+    if not fee_settings:
+        fee_settings = await settings_collection.find_one({"isActive": True}, sort=[("year", -1)])
+    if not fee_settings:
+        return {"shippingFee": DEFAULT_SHIPPING_FEE, "taxRate": DEFAULT_TAX_RATE, "year": current_year}
+    return {
+        "shippingFee": fee_settings.get("shippingFee", DEFAULT_SHIPPING_FEE),
+        "taxRate": fee_settings.get("taxRate", DEFAULT_TAX_RATE),
+        "year": fee_settings.get("year", current_year)
+    }
+
+
+def _object_ids(item_ids: Iterable[str]) -> List[ObjectId]:
+    ids = []
+    for item_id in item_ids:
+        try:
+            ids.append(ObjectId(item_id))
+        except (InvalidId, TypeError):
+            continue
+    return ids
+
+
+def _card_image(product: Dict[str, Any]) -> Optional[str]:
+    variants = product.get("imageVariants") or []
+    if variants and variants[0].get(LIST_VARIANT):
+        return variants[0][LIST_VARIANT]["url"]
+    images = product.get("image") or []
+    return images[0] if images else None
+
+
+def price_lines(
+    cart_data: Dict[str, Dict[str, int]],
+    products: Dict[str, Dict[str, Any]],
+    fees: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Price a cart from already loaded products (no I/O).
+
+    Args:
+        cart_data: {itemId: {size: quantity}}
+        products: Products of the cart keyed by str(_id)
+        fees: {"shippingFee", "taxRate", "year"}
+
+    Returns:
+        {"items", "warnings", "itemCount", "subtotal", "shippingFee", "taxRate", "tax", "total", "feesYear"}
+    """
+    items = []
+    warnings = []
+    subtotal = 0.0
+    item_count = 0
+
+    for item_id, sizes in cart_data.items():
+        product = products.get(item_id)
+        if not product or not product.get("isActive", True) or product.get("inStock") is False:
+            warnings.append({"itemId": item_id, "code": "unavailable", "message": "Sản phẩm không còn bán"})
+            continue
+
+        requested = 0
+        for size, quantity in sizes.items():
+            if quantity <= 0:
+                continue
+            if size not in product.get("sizes", []):
+                warnings.append({
+                    "itemId": item_id, "size": size, "code": "invalid_size",
+                    "message": f"Kích cỡ {size} không còn cho '{product['name']}'"
+                })
+                continue
+
+            line_total = round(product["offerPrice"] * quantity, 2)
+            items.append({
+                "itemId": item_id,
+                "size": size,
+                "quantity": quantity,
+                "product": {
+                    "_id": item_id,
+                    "name": product["name"],
+                    "image": _card_image(product),
+                    "price": product.get("price"),
+                    "offerPrice": product["offerPrice"],
+                    "category": product.get("category")
+                },
+                "lineTotal": line_total
+            })
+            subtotal += line_total
+            item_count += quantity
+            requested += quantity
+
+        # Stock is tracked per product (all sizes together)
+        stock = product.get("quantity")
+        if stock is not None and requested > stock:
+            warnings.append({
+                "itemId": item_id, "code": "insufficient_stock", "available": stock,
+                "message": f"Sản phẩm '{product['name']}' chỉ còn {stock} sản phẩm trong kho"
+            })
+
+    subtotal = round(subtotal, 2)
+    shipping_fee = fees["shippingFee"] if items else 0.0
+    tax = round(subtotal * fees["taxRate"], 2)
+    return {
+        "items": items,
+        "warnings": warnings,
+        "itemCount": item_count,
+        "subtotal": subtotal,
+        "shippingFee": shipping_fee,
+        "taxRate": fees["taxRate"],
+        "tax": tax,
+        "total": round(subtotal + shipping_fee + tax, 2),
+        "feesYear": fees.get("year")
+    }
+
+
+async def price_cart(cart_data: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """Load the cart's products with one $in query and the current fees, then price the cart"""
+    products = {}
+    product_ids = _object_ids(cart_data)
+    if product_ids:
+        products_collection = await get_collection("products")
+        async for product in products_collection.find({"_id": {"$in": product_ids}}, CART_PRODUCT_PROJECTION):
+            products[str(product["_id"])] = product
+    return price_lines(cart_data, products, await get_current_fees())
+
+
+class PricedCartCache:
+    """
+    Short-lived per-cart cache of priced carts (keyed by CartOwner.key).
+
+    Keeps a reverse index product id -> user ids so a product change only drops
+    the carts that contain that product.
+
+    A loader takes a generation() before reading the cart and passes it to put();
+    if the cart, one of its products or the whole cache was invalidated in between
+    (a concurrent cart write, price or stock change), the stale priced cart is not
+    cached.
+    """
+
+    def __init__(self, capacity: int = settings.CART_CACHE_SIZE, ttl_seconds: float = settings.CART_CACHE_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # user id -> (expires_at, priced cart)
+        self._users_by_product: Dict[str, Set[str]] = {}
+        self._clock = 0
+        # ("user" | "product", id) -> generation of its last invalidation (LRU)
+        self._invalidated: "OrderedDict[tuple, int]" = OrderedDict()
+        # Highest generation dropped from _invalidated (or of the last clear()); loads older than it are not cached
+        self._forgotten = 0
+
+    def generation(self) -> int:
+        return self._clock
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user_id: str, priced: Dict[str, Any], generation: Optional[int] = None) -> None:
+        product_ids = self._product_ids(priced)
+        if generation is not None and self._changed_since(generation, user_id, product_ids):
+            return
+        self._drop(user_id)
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, priced)
+        for product_id in product_ids:
+            self._users_by_product.setdefault(product_id, set()).add(user_id)
+        while len(self._entries) > self.capacity:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    @staticmethod
+    def _product_ids(priced: Dict[str, Any]) -> Set[str]:
+        return {line["itemId"] for line in priced["items"]} | {w["itemId"] for w in priced["warnings"]}
+
+    def _changed_since(self, generation: int, user_id: str, product_ids: Set[str]) -> bool:
+        if generation < self._forgotten:
+            return True
+        marks = [("user", user_id)] + [("product", product_id) for product_id in product_ids]
+        return any(self._invalidated.get(mark, -1) > generation for mark in marks)
+
+    def _mark(self, mark: tuple) -> None:
+        self._clock += 1
+        self._invalidated[mark] = self._clock
+        self._invalidated.move_to_end(mark)
+        while len(self._invalidated) > self.capacity:
+            _, forgotten = self._invalidated.popitem(last=False)
+            self._forgotten = max(self._forgotten, forgotten)
+
+    def invalidate_user(self, user_id) -> None:
+        """Drop one cart's priced view (call after any write to that cart)"""
+        self._mark(("user", str(user_id)))
+        self._drop(str(user_id))
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        for product_id in self._product_ids(entry[1]):
+            users = self._users_by_product.get(product_id)
+            if users is not None:
+                users.discard(str(user_id))
+                if not users:
+                    del self._users_by_product[product_id]
+
+    def invalidate_products(self, product_ids: Iterable) -> None:
+        """Drop every cached cart containing one of these products (price, stock or status changed)"""
+        for product_id in product_ids:
+            self._mark(("product", str(product_id)))
+            for user_id in list(self._users_by_product.get(str(product_id), ())):
+                self._drop(user_id)
+
+    def clear(self) -> None:
+        """Drop everything (e.g. fee settings changed)"""
+        self._clock += 1
+        self._forgotten = self._clock
+        self._invalidated.clear()
+        self._entries.clear()
+        self._users_by_product.clear()
+
+
+# Shared cache used by cart, product, order and settings routes
+priced_carts = PricedCartCache()
+
+
+async def get_priced_cart(owner: CartOwner) -> Dict[str, Any]:
+    """
+    Hydrated, priced cart, served from the cache when fresh.
+
+    Returns:
+        price_lines() result plus "cartData" (the raw map) and "cached"
+    """
+    key = owner.key
+    cached = priced_carts.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    started = time.perf_counter()
+    generation = priced_carts.generation()
+    cart_data = await read_cart(owner)
+    priced = await price_cart(cart_data)
+    priced["cartData"] = cart_data
+    priced_carts.put(key, priced, generation)
+    logger.info(f"Priced cart for {key}: {len(priced['items'])} lines in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return {**priced, "cached": False}
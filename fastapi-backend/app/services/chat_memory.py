@@ -0,0 +1,217 @@
+"""
+Chat Session Memory Service
+Server-side conversation history for the RAG chatbot:
+- MongoDB collection `chat_sessions` (one document per session, TTL on updatedAt)
+- In-process LRU of hot sessions so most turns skip the database read
+- turnCount is the document version: a turn is saved only if the stored turnCount is
+  still the one it was built on. With several workers, a session extended by another
+  worker is detected on save, reloaded and the turn re-applied on top of it (the
+  prompt of that turn may have used the worker's older cached history)
+- Rolling summary: older turns are folded into a bounded summary, only the
+  last few messages are kept verbatim, so prompts and documents stay small
+"""
+
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import logging
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+from app.config.database import get_collection
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "chat_sessions"
+
+# Max characters kept per message when it is folded into the summary
+SUMMARY_LINE_CHARS = 160
+
+# Saves of one turn before giving up when other workers keep extending the session
+SAVE_ATTEMPTS = 3
+
+
+def new_session_id() -> str:
+    """Generate an unguessable session id"""
+    return uuid.uuid4().hex
+
+
+def _shorten(text: str, limit: int = SUMMARY_LINE_CHARS) -> str:
+    # Keep only the first line, assistant answers are long product lists
+    first_line = " ".join((text or "").strip().splitlines()[:1])
+    return first_line if len(first_line) <= limit else first_line[:limit - 1].rstrip() + "…"
+
+
+def summarize_messages(messages: List[Dict[str, Any]]) -> str:
+    """
+    Condense messages into summary lines (extractive, no LLM call).
+
+    Args:
+        messages: Messages with 'role' and 'content'
+
+    Returns:
+        One line per message, e.g. "Người dùng hỏi: ..." / "Trợ lý trả lời: ..."
+    """
+    lines = []
+    for msg in messages:
+        prefix = "Người dùng hỏi" if msg.get("role") == "user" else "Trợ lý trả lời"
+        lines.append(f"{prefix}: {_shorten(msg.get('content', ''))}")
+    return "\n".join(lines)
+
+
+def merge_summary(summary: str, addition: str, max_chars: int) -> str:
+    """
+    Append new summary lines and drop the oldest lines until it fits max_chars.
+    """
+    lines = [line for line in (summary or "").splitlines() + addition.splitlines() if line]
+    while lines and len("\n".join(lines)) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ChatSessionStore:
+    """
+    Chat sessions keyed by session id, cached in an LRU and persisted to MongoDB.
+
+    Each session document:
+        {_id: sessionId, summary: str, messages: [{role, content, timestamp}],
+         turnCount: int, createdAt, updatedAt}
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.CHAT_SESSION_CACHE_SIZE,
+        recent_messages: int = settings.CHAT_RECENT_MESSAGES,
+        summary_max_chars: int = settings.CHAT_SUMMARY_MAX_CHARS
+    ):
+        self.capacity = capacity
+        self.recent_messages = recent_messages
+        self.summary_max_chars = summary_max_chars
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _remember(self, session: Dict[str, Any]) -> None:
+        """Insert/refresh a session in the LRU, evicting the least recently used"""
+        session_id = session["_id"]
+        self._cache[session_id] = session
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.capacity:
+            evicted_id, _ = self._cache.popitem(last=False)
+            lock = self._locks.get(evicted_id)
+            if lock is not None and not lock.locked():
+                del self._locks[evicted_id]
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        if session_id not in self._locks:
+            self._locks[session_id] = asyncio.Lock()
+        return self._locks[session_id]
+
+    async def get(self, session_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Load a session from the LRU or MongoDB, or start a new one.
+
+        Args:
+            session_id: Existing session id, or None to start a new session
+
+        Returns:
+            Session dict (new sessions are only persisted on the first append_turn)
+        """
+        if session_id and session_id in self._cache:
+            self._cache.move_to_end(session_id)
+            return self._cache[session_id]
+
+        session = None
+        if session_id:
+            collection = await get_collection(COLLECTION_NAME)
+            session = await collection.find_one({"_id": session_id})
+
+        if not session:
+            now = datetime.utcnow()
+            session = {
+                "_id": session_id or new_session_id(),
+                "summary": "",
+                "messages": [],
+                "turnCount": 0,
+                "createdAt": now,
+                "updatedAt": now
+            }
+
+        self._remember(session)
+        return session
+
+    async def append_turn(self, session_id: str, user_message: str, assistant_message: str) -> Dict[str, Any]:
+        """
+        Record one user/assistant exchange, folding overflow into the summary.
+
+        Args:
+            session_id: Session id returned by get()
+            user_message: The user's message
+            assistant_message: The generated answer
+
+        Returns:
+            Updated session dict
+        """
+        async with self._lock(session_id):
+            session = await self.get(session_id)
+            collection = await get_collection(COLLECTION_NAME)
+
+            for _ in range(SAVE_ATTEMPTS):
+                updated = self._with_turn(session, user_message, assistant_message)
+                try:
+                    # Whole document is bounded in size, so a single upsert replaces it;
+                    # only applies if no other worker saved a turn since `session` was read
+                    await collection.update_one(
+                        {"_id": session_id, "turnCount": session.get("turnCount", 0)},
+                        {
+                            "$set": {
+                                "summary": updated["summary"],
+                                "messages": updated["messages"],
+                                "updatedAt": updated["updatedAt"]
+                            },
+                            "$inc": {"turnCount": 1},
+                            "$setOnInsert": {"createdAt": updated["createdAt"]}
+                        },
+                        upsert=True
+                    )
+                except DuplicateKeyError:
+                    # Stored turnCount moved on (another worker): re-apply on the fresh document
+                    session = await collection.find_one({"_id": session_id}) or session
+                    continue
+
+                self._remember(updated)
+                logger.info(f"Chat session {session_id}: turn {updated['turnCount']}, {len(updated['messages'])} recent messages")
+                return updated
+
+            self._cache.pop(session_id, None)
+            logger.warning(f"Chat session {session_id}: turn not saved after {SAVE_ATTEMPTS} concurrent updates")
+            return updated
+
+    def _with_turn(self, session: Dict[str, Any], user_message: str, assistant_message: str) -> Dict[str, Any]:
+        """Copy of the session with one exchange appended and overflow folded into the summary"""
+        now = datetime.utcnow()
+        messages = session["messages"] + [
+            {"role": "user", "content": user_message, "timestamp": now},
+            {"role": "assistant", "content": assistant_message, "timestamp": now}
+        ]
+
+        # Fold everything older than the verbatim window into the summary
+        summary = session["summary"]
+        overflow = len(messages) - self.recent_messages
+        if overflow > 0:
+            summary = merge_summary(summary, summarize_messages(messages[:overflow]), self.summary_max_chars)
+            messages = messages[overflow:]
+
+        return {
+            **session,
+            "summary": summary,
+            "messages": messages,
+            "turnCount": session.get("turnCount", 0) + 1,
+            "updatedAt": now
+        }
+
+
+# Shared store used by chat routes
+chat_sessions = ChatSessionStore()
@@ -0,0 +1,420 @@
+"""
+Discount Service
+Applies, changes and removes product discounts in bulk (single products up to whole
+categories) with a constant number of database round-trips:
+
+- Apply / update: matching products are streamed with a price-only projection, the
+  new offerPrice is computed with calculate_offer_price (same rounding as before)
+  and all changes are sent in ONE bulk_write. Products whose price would not change
+  are left untouched (no write, no updatedAt bump)
+- Remove: ONE pipeline update_many resets offerPrice to each product's own price in
+  the database
+
+Promotions with a window (discountStartDate / discountEndDate) are queued in
+`promotion_schedule`, one entry per product and transition:
+
+    {productId: ObjectId, action: activate | expire, runAt, discountPercent, createdAt}
+
+A promotion starting in the future only stores its dates on the products; prices
+change when promotion_scheduler (app lifespan) applies the due entries with
+apply_due_transitions. Applying or removing a discount replaces the queued entries
+of those products. Each transition is guarded by the product's current
+discountStartDate / discountEndDate, so an entry left over from a replaced
+promotion never changes a price.
+
+Every call returns a change summary:
+
+    {
+        "matched": products selected,
+        "modified": products actually written,
+        "unchanged": products that already had these prices,
+        "scheduled": products waiting for a future start date,
+        "updatedCount": same as matched (kept for the admin frontend),
+        "changes": [{productId, name, price, offerPriceBefore, offerPriceAfter}, ...]
+    }
+
+"changes" is capped at CHANGE_SAMPLE_SIZE entries so a category-wide promotion does
+not return thousands of rows.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+import asyncio
+import logging
+
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+
+from app.config.database import get_collection
+from app.config.settings import settings
+from app.services.cart_service import priced_carts
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_COLLECTION_NAME = "promotion_schedule"
+
+ACTIVATE = "activate"
+EXPIRE = "expire"
+
+CHANGE_SAMPLE_SIZE = 20
+
+DATE_FIELDS = ("discountStartDate", "discountEndDate")
+
+PRICE_PROJECTION = {"name": 1, "price": 1, "offerPrice": 1, "hasDiscount": 1, "discountPercent": 1, **{f: 1 for f in DATE_FIELDS}}
+
+# Off-discount state as an update pipeline: offerPrice is copied from each product's own price
+RESET_PIPELINE = [
+    {"$set": {
+        "hasDiscount": False,
+        "discountPercent": 0.0,
+        "offerPrice": "$price",
+        "updatedAt": "$$NOW"
+    }},
+    {"$unset": list(DATE_FIELDS)}
+]
+
+# Set whenever the schedule changes, wakes promotion_scheduler
+schedule_changed = asyncio.Event()
+
+
+def calculate_offer_price(price: float, discount_percent: float) -> float:
+    """
+    Calculate discounted price (offer price) from original price and discount percentage.
+
+    Args:
+        price (float): Original product price
+        discount_percent (float): Discount percentage (0-100)
+
+    Returns:
+        float: Calculated offer price, rounded to nearest 1000 VND
+
+    Raises:
+        ValueError: If discount_percent is not in valid range (0-100)
+
+    Examples:
+        >>> calculate_offer_price(500000, 10.0)
+        450000.0
+        >>> calculate_offer_price(299000, 15.0)
+        254000.0
+        >>> calculate_offer_price(750000, 35.0)
+        488000.0
+    """
+    # Validate discount percentage
+    if discount_percent < 0 or discount_percent > 100:
+        raise ValueError(f"Discount percent must be between 0 and 100, got {discount_percent}")
+
+    # Return original price if no discount
+    if discount_percent == 0:
+        return price
+
+    # Round discount to 2 decimal places for consistency
+    discount_percent = round(discount_percent, 2)
+
+    # Calculate offer price: price * (1 - discount/100)
+    offer_price = price * (1 - discount_percent / 100)
+
+    # Round to nearest 1000 VND for Vietnamese currency
+    # Example: 254150 → 254000, 487500 → 488000
+    offer_price = round(offer_price, -3)
+
+    return offer_price
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Naive UTC datetime as MongoDB stores it (millisecond precision), so a stored
+    date compares equal to the queued runAt.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def shop_time_to_utc(value: Union[date, datetime, None], end_of_day: bool = False) -> Optional[datetime]:
+    """
+    Promotion date entered by staff -> naive UTC.
+
+    Args:
+        value: A date (admin date picker) or a datetime; naive values are in SHOP_TIMEZONE
+        end_of_day: For end dates: a date means the whole day, so the promotion ends
+            at the following midnight (a one-day promotion has start == end)
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.combine(value + timedelta(days=1) if end_of_day else value, time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=ZoneInfo(settings.SHOP_TIMEZONE))
+    return to_utc(value)
+
+
+def _change(product: Dict[str, Any], offer_price: float) -> Dict[str, Any]:
+    return {
+        "productId": str(product["_id"]),
+        "name": product.get("name"),
+        "price": product.get("price"),
+        "offerPriceBefore": product.get("offerPrice"),
+        "offerPriceAfter": offer_price
+    }
+
+
+def _summary(matched: int, modified: int, changes: List[Dict[str, Any]], scheduled: int = 0) -> Dict[str, Any]:
+    return {
+        "matched": matched,
+        "modified": modified,
+        "unchanged": matched - modified - scheduled,
+        "scheduled": scheduled,
+        "updatedCount": matched,
+        "changes": changes[:CHANGE_SAMPLE_SIZE]
+    }
+
+
+async def _set_discount(
+    query: Dict[str, Any],
+    discount_percent: float,
+    dates: Optional[Dict[str, Optional[datetime]]]
+) -> Tuple[Dict[str, Any], List[ObjectId]]:
+    """
+    Compute offer prices of all matching products and write the changed ones in one bulk_write.
+
+    Args:
+        dates: Discount dates to store (None values are unset), or None to keep them
+
+    Returns:
+        (change summary, ids of all matching products)
+    """
+    products_collection = await get_collection("products")
+    percent = round(discount_percent, 2)
+    now = datetime.utcnow()
+
+    set_dates = {field: value for field, value in (dates or {}).items() if value is not None}
+    unset_dates = {field: "" for field, value in (dates or {}).items() if value is None}
+
+    ids: List[ObjectId] = []
+    operations: List[UpdateOne] = []
+    changes: List[Dict[str, Any]] = []
+    touched: List[str] = []
+    async for product in products_collection.find(query, PRICE_PROJECTION):
+        ids.append(product["_id"])
+        offer_price = calculate_offer_price(product["price"], percent)
+        unchanged = (
+            product.get("hasDiscount") is True
+            and product.get("discountPercent") == percent
+            and product.get("offerPrice") == offer_price
+            and all(product.get(field) == value for field, value in (dates or {}).items())
+        )
+        if unchanged:
+            continue
+        update: Dict[str, Any] = {"$set": {
+            "hasDiscount": True,
+            "discountPercent": percent,
+            "offerPrice": offer_price,
+            "updatedAt": now,
+            **set_dates
+        }}
+        if unset_dates:
+            update["$unset"] = unset_dates
+        operations.append(UpdateOne({"_id": product["_id"]}, update))
+        touched.append(str(product["_id"]))
+        if len(changes) < CHANGE_SAMPLE_SIZE:
+            changes.append(_change(product, offer_price))
+
+    modified = 0
+    if operations:
+        result = await products_collection.bulk_write(operations, ordered=False)
+        modified = result.modified_count
+        # Prices changed: cached priced carts with these products are stale
+        priced_carts.invalidate_products(touched)
+    logger.info(f"Discount {percent}%: {len(ids)} matched, {modified} modified")
+    return _summary(len(ids), modified, changes), ids
+
+
+async def _schedule(
+    product_ids: List[ObjectId],
+    discount_percent: float,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> None:
+    """Replace the queued transitions of these products"""
+    if not product_ids:
+        return
+    schedule_collection = await get_collection(SCHEDULE_COLLECTION_NAME)
+    await schedule_collection.delete_many({"productId": {"$in": product_ids}})
+
+    now = datetime.utcnow()
+    entries = []
+    for run_at, action in ((start_date, ACTIVATE), (end_date, EXPIRE)):
+        if run_at:
+            entries.extend(
+                {"productId": pid, "action": action, "runAt": run_at, "discountPercent": round(discount_percent, 2), "createdAt": now}
+                for pid in product_ids
+            )
+    if entries:
+        await schedule_collection.insert_many(entries, ordered=False)
+        schedule_changed.set()
+
+
+async def apply_discount(
+    query: Dict[str, Any],
+    discount_percent: float,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Put every product matching query on discount, now or from start_date.
+
+    Args:
+        query: Products filter (category or _id list)
+        discount_percent: Discount percentage (0-100)
+        start_date: Prices change at this time if it is in the future
+        end_date: Discount is removed at this time
+
+    Returns:
+        Change summary (see module docstring)
+    """
+    start_date, end_date = to_utc(start_date), to_utc(end_date)
+    dates = {"discountStartDate": start_date, "discountEndDate": end_date}
+
+    if not start_date or start_date <= datetime.utcnow():
+        summary, ids = await _set_discount(query, discount_percent, dates)
+        await _schedule(ids, discount_percent, None, end_date)
+        return summary
+
+    # Starts later: store the window now, prices change on activation
+    products_collection = await get_collection("products")
+    ids: List[ObjectId] = []
+    changes: List[Dict[str, Any]] = []
+    async for product in products_collection.find(query, PRICE_PROJECTION):
+        ids.append(product["_id"])
+        if len(changes) < CHANGE_SAMPLE_SIZE:
+            changes.append(_change(product, calculate_offer_price(product["price"], discount_percent)))
+    if not ids:
+        return _summary(0, 0, [])
+
+    update: Dict[str, Any] = {"$set": {"discountStartDate": start_date, "updatedAt": datetime.utcnow()}}
+    if end_date:
+        update["$set"]["discountEndDate"] = end_date
+    else:
+        update["$unset"] = {"discountEndDate": ""}
+    await products_collection.update_many({"_id": {"$in": ids}}, update)
+    await _schedule(ids, discount_percent, start_date, end_date)
+    logger.info(f"Discount {round(discount_percent, 2)}% scheduled for {len(ids)} products at {start_date}")
+    return _summary(len(ids), 0, changes, scheduled=len(ids))
+
+
+async def update_discount(product_ids: List[ObjectId], discount_percent: float) -> Dict[str, Any]:
+    """
+    Change the discount percentage of these products (dates are kept). Products
+    whose promotion has not started yet get the new percentage on activation.
+
+    Returns:
+        Change summary (see module docstring)
+    """
+    started = {"$or": [{"discountStartDate": None}, {"discountStartDate": {"$lte": datetime.utcnow()}}]}
+    summary, _ = await _set_discount({"_id": {"$in": product_ids}, **started}, discount_percent, None)
+
+    schedule_collection = await get_collection(SCHEDULE_COLLECTION_NAME)
+    pending = await schedule_collection.update_many(
+        {"productId": {"$in": product_ids}, "action": ACTIVATE},
+        {"$set": {"discountPercent": round(discount_percent, 2)}}
+    )
+    if not pending.matched_count:
+        return summary
+    return _summary(summary["matched"] + pending.matched_count, summary["modified"], summary["changes"], pending.matched_count)
+
+
+async def remove_discount(query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Take every product matching query off discount: offerPrice back to price,
+    discount dates and queued transitions removed. One pipeline update_many,
+    offerPrice is copied from price in the database.
+
+    Returns:
+        Change summary (see module docstring)
+    """
+    products_collection = await get_collection("products")
+
+    # Read ids (for cart invalidation) and a sample of the prices being reset
+    ids = []
+    changes: List[Dict[str, Any]] = []
+    async for product in products_collection.find(query, PRICE_PROJECTION):
+        ids.append(product["_id"])
+        if len(changes) < CHANGE_SAMPLE_SIZE:
+            changes.append(_change(product, product.get("price")))
+    if not ids:
+        return _summary(0, 0, [])
+
+    result = await products_collection.update_many({"_id": {"$in": ids}}, RESET_PIPELINE)
+    # No new dates: only drops the queued transitions
+    await _schedule(ids, 0.0, None, None)
+    priced_carts.invalidate_products(ids)
+    logger.info(f"Discount removed: {len(ids)} matched, {result.modified_count} modified")
+    return _summary(len(ids), result.modified_count, changes)
+
+
+async def apply_due_transitions(now: Optional[datetime] = None, limit: int = 500) -> Dict[str, int]:
+    """
+    Apply the oldest queued transitions due at `now`, at most `limit`, in one
+    bulk_write (activations first, then expirations), then drop them from the queue.
+
+    Returns:
+        {"processed": entries handled, "modified": products written}
+    """
+    now = now or datetime.utcnow()
+    schedule_collection = await get_collection(SCHEDULE_COLLECTION_NAME)
+    entries = await schedule_collection.find({"runAt": {"$lte": now}}).sort([("runAt", 1), ("_id", 1)]).limit(limit).to_list(length=limit)
+    if not entries:
+        return {"processed": 0, "modified": 0}
+
+    products_collection = await get_collection("products")
+    activations = [entry for entry in entries if entry["action"] == ACTIVATE]
+    prices: Dict[ObjectId, float] = {}
+    if activations:
+        prices = {
+            product["_id"]: product["price"]
+            async for product in products_collection.find({"_id": {"$in": [e["productId"] for e in activations]}}, {"price": 1})
+        }
+
+    operations: List[Any] = [
+        UpdateOne(
+            # Guard: the product still has the promotion this entry was queued for
+            {"_id": entry["productId"], "discountStartDate": entry["runAt"]},
+            {"$set": {
+                "hasDiscount": True,
+                "discountPercent": entry["discountPercent"],
+                "offerPrice": calculate_offer_price(prices[entry["productId"]], entry["discountPercent"]),
+                "updatedAt": now
+            }}
+        )
+        for entry in activations
+        if entry["productId"] in prices
+    ]
+    expirations: Dict[datetime, List[ObjectId]] = defaultdict(list)
+    for entry in entries:
+        if entry["action"] == EXPIRE:
+            expirations[entry["runAt"]].append(entry["productId"])
+    operations.extend(
+        UpdateMany({"_id": {"$in": product_ids}, "discountEndDate": run_at}, RESET_PIPELINE)
+        for run_at, product_ids in expirations.items()
+    )
+
+    modified = 0
+    if operations:
+        # Ordered: a product activated and expired in the same batch ends up expired
+        result = await products_collection.bulk_write(operations, ordered=True)
+        modified = result.modified_count
+    await schedule_collection.delete_many({"_id": {"$in": [entry["_id"] for entry in entries]}})
+    priced_carts.invalidate_products({entry["productId"] for entry in entries})
+    logger.info(f"Promotion transitions: {len(entries)} processed, {modified} products modified")
+    return {"processed": len(entries), "modified": modified}
+
+
+async def next_transition_at() -> Optional[datetime]:
+    """runAt of the earliest queued transition"""
+    schedule_collection = await get_collection(SCHEDULE_COLLECTION_NAME)
+    entry = await schedule_collection.find_one({}, {"runAt": 1}, sort=[("runAt", 1)])
+    return entry["runAt"] if entry else None
@@ -0,0 +1,72 @@
+"""
+Document Hydration
+Resolves foreign keys (e.g. review.productId, wishlist productId, order item product ids)
+to documents without N+1 queries:
+- Ids are collected first and loaded with one projected $in query
+- Each loader is an identity map: an id is fetched at most once per loader, and
+  ids that do not exist are remembered as missing
+- product_loader() is a FastAPI dependency, so every request gets its own loader
+  (no cross-request staleness) that all code in the request can share
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from app.config.database import get_collection
+from app.services.image_pipeline import LIST_PROJECTION
+
+
+class DocumentLoader:
+    """Batched, per-request loader of documents of one collection by _id"""
+
+    def __init__(self, collection_name: str, projection: Optional[Dict[str, Any]] = None):
+        self.collection_name = collection_name
+        self.projection = projection
+        self._docs: Dict[str, Optional[Dict[str, Any]]] = {}  # str id -> document (None = not found)
+
+    async def load_many(self, ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Load documents by id, querying only ids not seen before.
+
+        Args:
+            ids: ObjectIds or their string form (invalid ids are treated as not found)
+
+        Returns:
+            {str id: document} for the ids that exist
+        """
+        keys = list(dict.fromkeys(str(i) for i in ids if i is not None))
+        missing = [key for key in keys if key not in self._docs]
+        if missing:
+            for key in missing:
+                self._docs[key] = None
+            object_ids = [ObjectId(key) for key in missing if ObjectId.is_valid(key)]
+            if object_ids:
+                collection = await get_collection(self.collection_name)
+                async for doc in collection.find({"_id": {"$in": object_ids}}, self.projection):
+                    self._docs[str(doc["_id"])] = doc
+        return {key: self._docs[key] for key in keys if self._docs[key] is not None}
+
+    async def load(self, id: Any) -> Optional[Dict[str, Any]]:
+        """Load a single document (same identity map as load_many)"""
+        return (await self.load_many([id])).get(str(id))
+
+
+async def hydrate(
+    docs: List[Dict[str, Any]],
+    key: str,
+    loader: DocumentLoader
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Resolve docs[i][key] for every doc with one load_many call.
+
+    Returns:
+        Related document (or None if missing) for each doc, in the same order
+    """
+    related = await loader.load_many(doc.get(key) for doc in docs)
+    return [related.get(str(doc.get(key))) for doc in docs]
+
+
+async def product_loader() -> DocumentLoader:
+    """FastAPI dependency: products loader for the current request (list image variant only)"""
+    return DocumentLoader("products", LIST_PROJECTION)
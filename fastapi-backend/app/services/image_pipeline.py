@@ -0,0 +1,184 @@
+"""
+Image Preprocessing Pipeline
+Runs before admin uploads reach Cloudinary:
+- Validates the file (real image, allowed format, size and pixel limits)
+- Applies EXIF orientation, then strips all metadata (EXIF, GPS, ICC, comments)
+- Re-encodes to WebP (or AVIF when Pillow supports it)
+- Generates thumb / card / full variants and records their dimensions
+
+Decoding and encoding are CPU-bound, so they run in a process pool.
+"""
+
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import io
+import logging
+
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest edge in pixels (images are never upscaled)
+VARIANTS = {
+    "thumb": 200,
+    "card": 600,
+    "full": 1600,
+}
+
+# Variant returned by list endpoints (product grids, blog lists, category tiles)
+LIST_VARIANT = "card"
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF", "MPO"}
+
+OUTPUT_QUALITY = {"WEBP": 82, "AVIF": 60}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def output_format() -> str:
+    """Configured output format, falling back to WEBP if this Pillow build cannot write AVIF"""
+    fmt = settings.IMAGE_OUTPUT_FORMAT.upper()
+    if fmt == "AVIF":
+        Image.init()
+        if "AVIF" not in Image.SAVE:
+            logger.warning("Pillow has no AVIF encoder, using WEBP")
+            return "WEBP"
+    return fmt if fmt in OUTPUT_QUALITY else "WEBP"
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    options = {"quality": OUTPUT_QUALITY[fmt]}
+    if fmt == "WEBP":
+        options["method"] = 4
+    # No exif/icc_profile arguments: the re-encoded file carries no metadata
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def process_image(data: bytes, fmt: str = "WEBP", max_pixels: int = 40_000_000) -> Dict[str, Dict[str, Any]]:
+    """
+    Validate, normalize and resize one image (runs inside a worker process).
+
+    Args:
+        data: Raw uploaded file content
+        fmt: Output format ("WEBP" or "AVIF")
+        max_pixels: Reject images larger than this (decompression bomb guard)
+
+    Returns:
+        {variant: {"data": bytes, "width": int, "height": int, "format": str, "bytes": int}}
+
+    Raises:
+        ValueError: If the content is not an acceptable image
+    """
+    # Pillow's own guard uses the same limit (it raises DecompressionBombError above 2x)
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Ảnh quá lớn: {e}")
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise ValueError(f"File không phải là ảnh hợp lệ: {e}")
+
+    if image.format not in ALLOWED_FORMATS:
+        raise ValueError(f"Định dạng ảnh không được hỗ trợ: {image.format}")
+    if image.width * image.height > max_pixels:
+        raise ValueError(f"Ảnh quá lớn: {image.width}x{image.height}")
+
+    # Bake EXIF orientation into the pixels before metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for name, edge in VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail((edge, edge), Image.LANCZOS)
+        encoded = _encode(variant, fmt)
+        variants[name] = {
+            "data": encoded,
+            "width": variant.width,
+            "height": variant.height,
+            "format": fmt.lower(),
+            "bytes": len(encoded)
+        }
+    return variants
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    """Stop worker processes (called on application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def read_upload(upload: UploadFile) -> bytes:
+    """Read an UploadFile, rejecting anything above IMAGE_MAX_UPLOAD_BYTES"""
+    data = await upload.read(settings.IMAGE_MAX_UPLOAD_BYTES + 1)
+    if len(data) > settings.IMAGE_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Ảnh {upload.filename} vượt quá {settings.IMAGE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB"
+        )
+    return data
+
+
+async def preprocess_upload(upload: UploadFile) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the pipeline for one UploadFile in the process pool.
+
+    Raises:
+        HTTPException 400/413: If the file is not an acceptable image
+    """
+    data = await read_upload(upload)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_pool(), process_image, data, output_format(), settings.IMAGE_MAX_PIXELS
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{upload.filename}: {str(e)}"
+        )
+
+
+def variant_urls(variant_maps: List[Dict[str, Any]], variant: str = LIST_VARIANT) -> List[str]:
+    """URLs of one variant from a list of variant maps (e.g. product imageVariants)"""
+    return [v[variant]["url"] for v in variant_maps if v.get(variant)]
+
+
+def use_list_variant(doc: Dict[str, Any], variant: str = LIST_VARIANT) -> Dict[str, Any]:
+    """
+    Replace a document's image field with its list variant and drop the variant map.
+    Works for products (image: list, imageVariants: list) and blogs/categories
+    (image: str, imageVariants: dict). Documents without variants are left unchanged.
+    """
+    variants = doc.pop("imageVariants", None)
+    if not variants:
+        return doc
+    if isinstance(variants, list):
+        urls = variant_urls(variants, variant)
+        if urls:
+            doc["image"] = urls
+    elif variants.get(variant):
+        doc["image"] = variants[variant]["url"]
+    return doc
+
+
+# Projection for list queries: keep only the list variant of each image
+LIST_PROJECTION = {f"imageVariants.{name}": 0 for name in VARIANTS if name != LIST_VARIANT}
@@ -0,0 +1,367 @@
+"""
+Inventory Service
+Stock is kept per (product, size) in `inventory`, every change is appended to the
+`inventory_movements` ledger:
+
+    inventory:           {productId: str, size: str, onHand: int, updatedAt}
+    inventory_movements: {productId, size, delta, type, orderId, actor, note, createdAt}
+
+Movement types: sale (order placed / paid), cancel (stock returned by a cancelled,
+expired or deleted order), restock, adjust (stock count correction).
+
+- Checkout takes stock line by line with a conditional decrement
+  ({onHand: {$gte: qty}} + $inc), a point operation on the unique (productId, size)
+  index; if a line cannot be served the lines already taken are put back and
+  InsufficientStock is raised, so stock never goes negative
+- Online checkout (Stripe/VNPay) only checks per-size stock when the order is placed
+  (check_available: one $in read); the stock is taken once the order is paid
+- Stock taken for paid orders and returned by cancellations is applied with one
+  bulk_write of $inc per (product, size)
+- products.quantity stays the total over all sizes (product pages, cart warnings);
+  every movement $inc's it by the same delta
+- Index (onHand, productId) answers "low stock" without a collection scan
+
+Products created before per-size stock are seeded the first time their stock is
+touched: products.quantity is split evenly over products.sizes (first sizes get the
+remainder). scripts/migrate_inventory.py seeds all products at once.
+
+Editing a product's sizes (sync_sizes) adds zero-stock rows for new sizes and drops
+the rows of removed sizes; stock left on a removed size is written off as an
+adjustment so products.quantity stays the total.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime
+import logging
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.config.database import get_collection
+from app.services.cart_service import priced_carts
+from app.utils.pagination import decode_cursor, keyset_filter, page_of
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "inventory"
+MOVEMENTS_COLLECTION_NAME = "inventory_movements"
+
+SALE = "sale"
+CANCEL = "cancel"
+RESTOCK = "restock"
+ADJUST = "adjust"
+
+MOVEMENT_SORT = [("createdAt", -1), ("_id", -1)]
+
+Line = Tuple[str, str]  # (productId, size)
+
+
+class InsufficientStock(Exception):
+    """A (product, size) line has less stock than requested"""
+
+    def __init__(self, product_id: str, size: str, available: int):
+        super().__init__(f"Only {available} left of product {product_id} size {size}")
+        self.product_id = product_id
+        self.size = size
+        self.available = available
+
+
+def order_lines(items: Iterable[Dict[str, Any]]) -> Dict[Line, int]:
+    """Quantity per (productId, size) of order items ({product: {_id}, size, quantity})"""
+    lines: Dict[Line, int] = defaultdict(int)
+    for item in items:
+        lines[(str(item["product"]["_id"]), item.get("size") or "")] += item["quantity"]
+    return dict(lines)
+
+
+def split_evenly(quantity: int, sizes: List[str]) -> Dict[str, int]:
+    """Initial per-size stock of a product that only had a total quantity"""
+    sizes = sizes or [""]
+    base, remainder = divmod(max(int(quantity or 0), 0), len(sizes))
+    return {size: base + (1 if i < remainder else 0) for i, size in enumerate(sizes)}
+
+
+async def ensure_inventory(product_ids: Iterable[str]) -> int:
+    """
+    Seed per-size stock for products that have none yet.
+
+    Returns:
+        Number of inventory documents created
+    """
+    product_ids = list(dict.fromkeys(str(pid) for pid in product_ids))
+    if not product_ids:
+        return 0
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    tracked = set(await inventory_collection.distinct("productId", {"productId": {"$in": product_ids}}))
+    missing = [ObjectId(pid) for pid in product_ids if pid not in tracked and ObjectId.is_valid(pid)]
+    if not missing:
+        return 0
+
+    products_collection = await get_collection("products")
+    now = datetime.utcnow()
+    docs = [
+        {"productId": str(product["_id"]), "size": size, "onHand": on_hand, "updatedAt": now}
+        async for product in products_collection.find({"_id": {"$in": missing}}, {"sizes": 1, "quantity": 1})
+        for size, on_hand in split_evenly(product.get("quantity", 0), product.get("sizes", [])).items()
+    ]
+    if not docs:
+        return 0
+    try:
+        result = await inventory_collection.insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        # Seeded concurrently by another request
+        return e.details.get("nInserted", 0)
+
+
+async def sync_sizes(product_id: str, sizes: List[str], actor: Optional[str] = None) -> Dict[str, int]:
+    """
+    Match a product's inventory rows to its sizes after an edit.
+
+    Returns:
+        {"added": new zero-stock sizes, "removed": dropped sizes}
+    """
+    await ensure_inventory([product_id])
+    wanted = list(dict.fromkeys(sizes or [""]))
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    tracked = set(await inventory_collection.distinct("size", {"productId": product_id}))
+
+    added = [size for size in wanted if size not in tracked]
+    if added:
+        now = datetime.utcnow()
+        await inventory_collection.bulk_write([
+            UpdateOne(
+                {"productId": product_id, "size": size},
+                {"$setOnInsert": {"onHand": 0, "updatedAt": now}},
+                upsert=True
+            )
+            for size in added
+        ], ordered=False)
+
+    deltas: List[Tuple[Line, int, Optional[str]]] = []
+    removed = [size for size in tracked if size not in wanted]
+    for size in removed:
+        doc = await inventory_collection.find_one_and_delete({"productId": product_id, "size": size}, {"onHand": 1})
+        if doc and doc["onHand"]:
+            deltas.append(((product_id, size), -doc["onHand"], None))
+    await _record(deltas, ADJUST, actor, "size removed")
+    return {"added": len(added), "removed": len(removed)}
+
+
+async def _record(
+    deltas: List[Tuple[Line, int, Optional[str]]],
+    movement_type: str,
+    actor: Optional[str] = None,
+    note: Optional[str] = None
+) -> None:
+    """Append ledger entries for applied deltas and keep products.quantity in sync"""
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    movements_collection = await get_collection(MOVEMENTS_COLLECTION_NAME)
+    await movements_collection.insert_many([
+        {
+            "productId": product_id,
+            "size": size,
+            "delta": delta,
+            "type": movement_type,
+            "orderId": order_id,
+            "actor": actor,
+            "note": note,
+            "createdAt": now
+        }
+        for (product_id, size), delta, order_id in deltas
+    ], ordered=False)
+
+    totals: Dict[str, int] = defaultdict(int)
+    for (product_id, _), delta, _ in deltas:
+        totals[product_id] += delta
+    operations = [
+        UpdateOne({"_id": ObjectId(product_id)}, {"$inc": {"quantity": delta}, "$set": {"updatedAt": now}})
+        for product_id, delta in totals.items()
+        if delta and ObjectId.is_valid(product_id)
+    ]
+    if operations:
+        products_collection = await get_collection("products")
+        await products_collection.bulk_write(operations, ordered=False)
+    # Stock changed: cached priced carts with these products have stale warnings
+    priced_carts.invalidate_products(totals.keys())
+
+
+async def reserve_order_items(order_id: str, items: List[Dict[str, Any]]) -> None:
+    """
+    Take stock for a new order, all lines or none.
+
+    Raises:
+        InsufficientStock: First line that cannot be served (nothing is taken)
+    """
+    lines = order_lines(items)
+    await ensure_inventory(product_id for product_id, _ in lines)
+    inventory_collection = await get_collection(COLLECTION_NAME)
+
+    taken: List[Tuple[Line, int]] = []
+    for (product_id, size), quantity in lines.items():
+        doc = await inventory_collection.find_one_and_update(
+            {"productId": product_id, "size": size, "onHand": {"$gte": quantity}},
+            {"$inc": {"onHand": -quantity}, "$set": {"updatedAt": datetime.utcnow()}},
+            projection={"_id": 1}
+        )
+        if doc is None:
+            # Put back what this order already took
+            if taken:
+                await inventory_collection.bulk_write([
+                    UpdateOne({"productId": pid, "size": sz}, {"$inc": {"onHand": qty}})
+                    for (pid, sz), qty in taken
+                ], ordered=False)
+            current = await inventory_collection.find_one({"productId": product_id, "size": size}, {"onHand": 1})
+            raise InsufficientStock(product_id, size, max(current["onHand"], 0) if current else 0)
+        taken.append(((product_id, size), quantity))
+
+    await _record([(line, -quantity, order_id) for line, quantity in taken], SALE)
+
+
+async def check_available(items: List[Dict[str, Any]]) -> None:
+    """
+    Check that every (product, size) line of an order is in stock, without taking it.
+
+    Raises:
+        InsufficientStock: First line with less stock than ordered
+    """
+    lines = order_lines(items)
+    await ensure_inventory(product_id for product_id, _ in lines)
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    on_hand = {
+        (doc["productId"], doc["size"]): doc["onHand"]
+        async for doc in inventory_collection.find(
+            {"productId": {"$in": list({product_id for product_id, _ in lines})}},
+            {"_id": 0, "productId": 1, "size": 1, "onHand": 1}
+        )
+    }
+    for (product_id, size), quantity in lines.items():
+        available = max(on_hand.get((product_id, size), 0), 0)
+        if available < quantity:
+            raise InsufficientStock(product_id, size, available)
+
+
+async def apply_order_movements(orders: List[Dict[str, Any]], movement_type: str) -> Dict[str, int]:
+    """
+    Take (sale) or return (cancel) the stock of many orders with one bulk_write.
+    Unconditional: a paid order keeps its stock even if that oversells a size.
+
+    Returns:
+        {productId: quantity moved}
+    """
+    sign = -1 if movement_type == SALE else 1
+    deltas: List[Tuple[Line, int, Optional[str]]] = []
+    per_line: Dict[Line, int] = defaultdict(int)
+    for order in orders:
+        for line, quantity in order_lines(order.get("items", [])).items():
+            deltas.append((line, sign * quantity, str(order["_id"])))
+            per_line[line] += sign * quantity
+    if not per_line:
+        return {}
+
+    await ensure_inventory(product_id for product_id, _ in per_line)
+    now = datetime.utcnow()
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    await inventory_collection.bulk_write([
+        UpdateOne(
+            {"productId": product_id, "size": size},
+            {"$inc": {"onHand": delta}, "$set": {"updatedAt": now}},
+            upsert=True
+        )
+        for (product_id, size), delta in per_line.items()
+    ], ordered=False)
+    await _record(deltas, movement_type)
+
+    moved: Dict[str, int] = defaultdict(int)
+    for (product_id, _), delta in per_line.items():
+        moved[product_id] += abs(delta)
+    return dict(moved)
+
+
+async def restock(product_id: str, size: str, quantity: int, actor: Optional[str] = None, note: Optional[str] = None) -> int:
+    """
+    Add received stock to one size.
+
+    Returns:
+        New on-hand quantity
+    """
+    await ensure_inventory([product_id])
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    doc = await inventory_collection.find_one_and_update(
+        {"productId": product_id, "size": size},
+        {"$inc": {"onHand": quantity}, "$set": {"updatedAt": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    await _record([((product_id, size), quantity, None)], RESTOCK, actor, note)
+    return doc["onHand"]
+
+
+async def adjust(product_id: str, size: str, on_hand: int, actor: Optional[str] = None, note: Optional[str] = None) -> int:
+    """
+    Set the counted stock of one size; the difference is recorded as an adjustment.
+
+    Returns:
+        Recorded delta
+    """
+    await ensure_inventory([product_id])
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    before = await inventory_collection.find_one_and_update(
+        {"productId": product_id, "size": size},
+        {"$set": {"onHand": on_hand, "updatedAt": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    delta = on_hand - (before["onHand"] if before else 0)
+    if delta:
+        await _record([((product_id, size), delta, None)], ADJUST, actor, note)
+    return delta
+
+
+async def get_product_stock(product_id: str) -> Dict[str, int]:
+    """{size: onHand} of one product"""
+    await ensure_inventory([product_id])
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    return {
+        doc["size"]: doc["onHand"]
+        async for doc in inventory_collection.find({"productId": product_id}, {"_id": 0, "size": 1, "onHand": 1})
+    }
+
+
+async def list_low_stock(threshold: int, limit: int = 50) -> List[Dict[str, Any]]:
+    """(product, size) lines with onHand <= threshold, lowest first (index on onHand)"""
+    inventory_collection = await get_collection(COLLECTION_NAME)
+    return await inventory_collection.find(
+        {"onHand": {"$lte": threshold}},
+        {"_id": 0, "productId": 1, "size": 1, "onHand": 1, "updatedAt": 1}
+    ).sort([("onHand", 1), ("productId", 1)]).limit(limit).to_list(length=limit)
+
+
+async def list_movements(product_id: str, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Ledger of one product, newest first.
+
+    Returns:
+        {"movements", "nextCursor", "hasMore"}
+
+    Raises:
+        ValueError: Malformed cursor
+    """
+    query: Dict[str, Any] = {"productId": product_id}
+    if cursor:
+        query = {"$and": [query, keyset_filter(MOVEMENT_SORT, decode_cursor(cursor, MOVEMENT_SORT))]}
+    movements_collection = await get_collection(MOVEMENTS_COLLECTION_NAME)
+    docs = await movements_collection.find(query).sort(MOVEMENT_SORT).limit(limit + 1).to_list(length=limit + 1)
+
+    page = page_of(docs, limit, MOVEMENT_SORT)
+    for doc in page["items"]:
+        doc["_id"] = str(doc["_id"])
+    return {
+        "movements": page["items"],
+        "nextCursor": page["nextCursor"],
+        "hasMore": page["hasMore"]
+    }
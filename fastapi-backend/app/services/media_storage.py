@@ -0,0 +1,248 @@
+"""
+Media Storage Backends
+Where uploaded images are stored, selected by MEDIA_STORAGE_BACKEND:
+- "cloudinary": Cloudinary (default, previous behaviour)
+- "local": content-addressed files on disk, served by /media with long-lived cache headers
+- "s3": content-addressed objects in any S3-compatible bucket (needs boto3)
+
+Local and S3 keys are the SHA-256 of the content, so re-uploading the same file is a no-op.
+All blocking I/O runs in the bounded upload pool.
+"""
+
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+from pathlib import Path
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from app.config.cloudinary import run_in_upload_pool, upload_to_cloudinary, delete_image
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+FileData = Union[bytes, BinaryIO]
+
+# Read/hash/write block size for streaming writes
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Content-addressed key: <sha256>.<ext>
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,5}$")
+
+CONTENT_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+}
+
+
+def normalize_extension(extension: Optional[str]) -> str:
+    ext = (extension or "bin").lower().lstrip(".")
+    return ext if re.fullmatch(r"[a-z0-9]{1,5}", ext) else "bin"
+
+
+def spool_and_hash(file: FileData, tmp_dir: Optional[str] = None) -> Tuple[str, str, int]:
+    """
+    Copy content to a temp file in chunks while hashing it.
+
+    Returns:
+        (temp file path, sha256 hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, prefix="upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if isinstance(file, (bytes, bytearray)):
+                digest.update(file)
+                out.write(file)
+                size = len(file)
+            else:
+                while True:
+                    chunk = file.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+class MediaStorage:
+    """Base class for storage backends"""
+
+    name = "base"
+
+    async def save(self, file: FileData, folder: str, size: int = 0, extension: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store one file.
+
+        Args:
+            file: Content as bytes or a readable file object (read in chunks)
+            folder: Logical folder, e.g. "veloura/products"
+            size: Content size if known (used for chunked uploads)
+            extension: File extension for the stored object, e.g. "webp"
+
+        Returns:
+            {"url", "publicId", "deduplicated"}
+        """
+        raise NotImplementedError
+
+    async def delete(self, public_id: str) -> bool:
+        """Delete a stored file by the publicId returned from save()"""
+        raise NotImplementedError
+
+
+class CloudinaryStorage(MediaStorage):
+    """Cloudinary backend (configured in app.config.cloudinary)"""
+
+    name = "cloudinary"
+
+    async def save(self, file: FileData, folder: str, size: int = 0, extension: Optional[str] = None) -> Dict[str, Any]:
+        result = await upload_to_cloudinary(file, folder=folder)
+        return {"url": result.get("secure_url"), "publicId": result.get("public_id"), "deduplicated": False}
+
+    async def delete(self, public_id: str) -> bool:
+        return await delete_image(public_id)
+
+
+class LocalStorage(MediaStorage):
+    """
+    Content-addressed local disk backend.
+
+    Files live at <root>/<h[0:2]>/<h[2:4]>/<h>.<ext> and are served as /media/<h>.<ext>.
+    Because a key is derived from the content, the same image uploaded twice is stored once.
+    Deleting removes the shared file, so only delete keys that no document references.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, public_url: str):
+        self.root = Path(root).resolve()
+        self.tmp_dir = self.root / ".tmp"
+        self.public_url = public_url.rstrip("/")
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        """Filesystem path of a key (raises ValueError for anything that is not a valid key)"""
+        if not KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid media key: {key}")
+        return self.root / key[0:2] / key[2:4] / key
+
+    def _save_sync(self, file: FileData, extension: str) -> Tuple[str, bool]:
+        tmp_path, digest, _ = spool_and_hash(file, str(self.tmp_dir))
+        key = f"{digest}.{extension}"
+        path = self.path_for(key)
+        if path.exists():
+            os.unlink(tmp_path)
+            return key, True
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        return key, False
+
+    async def save(self, file: FileData, folder: str, size: int = 0, extension: Optional[str] = None) -> Dict[str, Any]:
+        key, deduplicated = await run_in_upload_pool(self._save_sync, file, normalize_extension(extension))
+        if deduplicated:
+            logger.info(f"Media {key} already stored, skipped write")
+        return {"url": f"{self.public_url}/{key}", "publicId": key, "deduplicated": deduplicated}
+
+    def _delete_sync(self, key: str) -> bool:
+        try:
+            self.path_for(key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def delete(self, public_id: str) -> bool:
+        return await run_in_upload_pool(self._delete_sync, public_id)
+
+
+class S3Storage(MediaStorage):
+    """Content-addressed backend for S3-compatible object storage (AWS S3, MinIO, R2, ...)"""
+
+    name = "s3"
+
+    def __init__(self):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        if not settings.S3_BUCKET:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 requires S3_BUCKET")
+
+        self._client_error = ClientError
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY
+        )
+        default_url = f"{settings.S3_ENDPOINT_URL or 'https://s3.amazonaws.com'}/{self.bucket}"
+        self.public_url = (settings.S3_PUBLIC_URL or default_url).rstrip("/")
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self._client_error:
+            return False
+
+    def _save_sync(self, file: FileData, extension: str) -> Tuple[str, bool]:
+        tmp_path, digest, _ = spool_and_hash(file)
+        try:
+            key = f"{digest}.{extension}"
+            if self._exists(key):
+                return key, True
+            with open(tmp_path, "rb") as body:
+                self.client.upload_fileobj(
+                    body,
+                    self.bucket,
+                    key,
+                    ExtraArgs={
+                        "ContentType": CONTENT_TYPES.get(extension, "application/octet-stream"),
+                        "CacheControl": settings.MEDIA_CACHE_CONTROL
+                    }
+                )
+            return key, False
+        finally:
+            os.unlink(tmp_path)
+
+    async def save(self, file: FileData, folder: str, size: int = 0, extension: Optional[str] = None) -> Dict[str, Any]:
+        key, deduplicated = await run_in_upload_pool(self._save_sync, file, normalize_extension(extension))
+        return {"url": f"{self.public_url}/{key}", "publicId": key, "deduplicated": deduplicated}
+
+    async def delete(self, public_id: str) -> bool:
+        await run_in_upload_pool(self.client.delete_object, Bucket=self.bucket, Key=public_id)
+        return True
+
+
+_storage: Optional[MediaStorage] = None
+
+
+def get_storage() -> MediaStorage:
+    """Storage backend selected by MEDIA_STORAGE_BACKEND (created on first use)"""
+    global _storage
+    if _storage is None:
+        backend = settings.MEDIA_STORAGE_BACKEND.lower()
+        if backend == "local":
+            public_url = settings.MEDIA_PUBLIC_URL or f"{settings.BACKEND_URL}/media"
+            _storage = LocalStorage(settings.MEDIA_LOCAL_ROOT, public_url)
+        elif backend == "s3":
+            _storage = S3Storage()
+        elif backend == "cloudinary":
+            _storage = CloudinaryStorage()
+        else:
+            raise RuntimeError(f"Unknown MEDIA_STORAGE_BACKEND: {settings.MEDIA_STORAGE_BACKEND}")
+        logger.info(f"Media storage backend: {_storage.name}")
+    return _storage
@@ -0,0 +1,148 @@
+"""
+Pending Payment Order Reaper
+Stripe and VNPay orders are created as "Pending Payment" before the customer pays.
+If the payment page is abandoned they would stay in `orders` forever, so a
+background task (started in the app lifespan) expires them:
+
+1. Pick the oldest pending orders past PENDING_ORDER_TTL_MINUTES + ORDER_REAPER_GRACE_MINUTES,
+   one batch at a time, using the (status, createdAt) index. The payment pages
+   expire after the TTL; the grace period covers payments completed at the last
+   moment whose callback arrives late
+2. Claim them with a guarded update_many (status "Pending Payment" and unpaid ->
+   "Expired"), so a payment confirmed at the same moment wins and several workers
+   running the reaper never process an order twice
+3. Move them to `orders_archive` and delete them from `orders`
+
+Batches are separated by a short pause so a large backlog never spikes DB load.
+
+No stock is released: Stripe / VNPay orders only take stock when the payment is
+confirmed (payment_service), so an expired order never held any.
+
+A payment that still arrives for an expired order is not lost:
+payment_service.confirm_payment restores the order from `orders_archive` as paid.
+"""
+
+from typing import Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+from pymongo.errors import BulkWriteError
+
+from app.config.database import get_collection
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUS = "Pending Payment"
+EXPIRED_STATUS = "Expired"
+ARCHIVE_COLLECTION_NAME = "orders_archive"
+
+_task: Optional[asyncio.Task] = None
+
+
+async def reap_batch(cutoff: datetime, batch_size: int) -> int:
+    """
+    Expire and archive up to batch_size pending orders created before cutoff.
+
+    Returns:
+        Number of orders archived
+    """
+    orders_collection = await get_collection("orders")
+    pending = {"status": PENDING_STATUS, "isPaid": {"$ne": True}}
+
+    ids = [
+        doc["_id"]
+        async for doc in orders_collection.find(
+            {**pending, "createdAt": {"$lt": cutoff}},
+            {"_id": 1}
+        ).sort("createdAt", 1).limit(batch_size)
+    ]
+    if not ids:
+        return 0
+
+    # Claim: only orders that are still pending and unpaid
+    now = datetime.utcnow()
+    await orders_collection.update_many(
+        {**pending, "_id": {"$in": ids}},
+        {"$set": {"status": EXPIRED_STATUS, "expiredAt": now, "updatedAt": now}}
+    )
+    claimed = await orders_collection.find({"_id": {"$in": ids}, "status": EXPIRED_STATUS, "expiredAt": now}).to_list(length=None)
+    if not claimed:
+        return 0
+
+    archive_collection = await get_collection(ARCHIVE_COLLECTION_NAME)
+    try:
+        await archive_collection.insert_many([{**order, "archivedAt": now} for order in claimed], ordered=False)
+    except BulkWriteError:
+        # Already archived by an earlier run that stopped before deleting
+        pass
+    claimed_ids = [order["_id"] for order in claimed]
+    await orders_collection.delete_many({"_id": {"$in": claimed_ids}, "status": EXPIRED_STATUS})
+    # Paid while being archived (late payment revived it in place): drop the stale archive copy
+    revived = await orders_collection.distinct("_id", {"_id": {"$in": claimed_ids}})
+    if revived:
+        await archive_collection.delete_many({"_id": {"$in": revived}})
+    return len(claimed)
+
+
+async def reap_expired_orders(
+    ttl_minutes: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    batch_pause_seconds: Optional[float] = None
+) -> int:
+    """
+    Expire every pending order older than ttl_minutes, batch by batch.
+
+    Returns:
+        Number of orders archived
+    """
+    ttl_minutes = ttl_minutes or settings.PENDING_ORDER_TTL_MINUTES
+    batch_size = batch_size or settings.ORDER_REAPER_BATCH_SIZE
+    batch_pause_seconds = settings.ORDER_REAPER_BATCH_PAUSE_SECONDS if batch_pause_seconds is None else batch_pause_seconds
+
+    cutoff = datetime.utcnow() - timedelta(minutes=ttl_minutes + settings.ORDER_REAPER_GRACE_MINUTES)
+    total = 0
+    while True:
+        archived = await reap_batch(cutoff, batch_size)
+        total += archived
+        if archived < batch_size:
+            break
+        await asyncio.sleep(batch_pause_seconds)
+
+    if total:
+        logger.info(f"Expired and archived {total} pending payment orders older than {ttl_minutes} minutes")
+    return total
+
+
+async def _run_forever(interval_seconds: float) -> None:
+    while True:
+        try:
+            await reap_expired_orders()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Order reaper run failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_order_reaper() -> Optional[asyncio.Task]:
+    """Start the background reaper (no-op if disabled or already running)"""
+    global _task
+    if not settings.ORDER_REAPER_ENABLED or (_task and not _task.done()):
+        return _task
+    _task = asyncio.create_task(_run_forever(settings.ORDER_REAPER_INTERVAL_SECONDS))
+    logger.info("Pending payment order reaper started")
+    return _task
+
+
+async def stop_order_reaper() -> None:
+    """Cancel the background reaper and wait for it to stop"""
+    global _task
+    if _task and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
@@ -0,0 +1,223 @@
+"""
+Order Service
+Read models for orders:
+- Order history: compact summaries of a user's orders, newest first, with keyset
+  pagination on (userId, createdAt, _id) (index in database.create_indexes).
+  Summaries are computed in the aggregation, so item snapshots, addresses and fees
+  never leave the database for a history page.
+- Order detail: the full order document, only for its owner.
+- Admin order queue: filtered, keyset-paginated list for staff. The page is an
+  index-backed $match/$sort/$limit on (createdAt, _id) or (status, createdAt, _id);
+  counts per status / payment method / paid for the same filters come from one
+  $facet aggregation, only when asked for (first page).
+"""
+
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.config.database import get_collection
+from app.utils.pagination import decode_cursor, keyset_filter, page_of
+
+ORDER_HISTORY_SORT = [("createdAt", -1), ("_id", -1)]
+
+# id, date, status, total, item count, first thumbnail
+ORDER_SUMMARY_PROJECTION = {
+    "createdAt": 1,
+    "status": 1,
+    "amount": 1,
+    "isPaid": 1,
+    "paymentMethod": 1,
+    "itemCount": {"$sum": "$items.quantity"},
+    "thumbnail": {"$arrayElemAt": [{"$arrayElemAt": ["$items.product.image", 0]}, 0]},
+}
+
+
+async def list_order_summaries(user_id: str, limit: int = 10, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of a user's order history.
+
+    Args:
+        user_id: Owner of the orders
+        limit: Page size
+        cursor: nextCursor of the previous page (None for the first page)
+
+    Returns:
+        {"orders", "nextCursor", "hasMore"}
+
+    Raises:
+        ValueError: Malformed cursor
+    """
+    match: Dict[str, Any] = {"userId": user_id}
+    if cursor:
+        match.update(keyset_filter(ORDER_HISTORY_SORT, decode_cursor(cursor, ORDER_HISTORY_SORT)))
+
+    orders_collection = await get_collection("orders")
+    pipeline = [
+        {"$match": match},
+        {"$sort": dict(ORDER_HISTORY_SORT)},
+        {"$limit": limit + 1},  # One extra document tells whether another page exists
+        {"$project": ORDER_SUMMARY_PROJECTION},
+    ]
+    orders = await orders_collection.aggregate(pipeline).to_list(length=limit + 1)
+
+    page = page_of(orders, limit, ORDER_HISTORY_SORT)
+    for order in page["items"]:
+        order["_id"] = str(order["_id"])
+    return {
+        "orders": page["items"],
+        "nextCursor": page["nextCursor"],
+        "hasMore": page["hasMore"]
+    }
+
+
+async def get_user_order(user_id: str, order_id: str) -> Optional[Dict[str, Any]]:
+    """Full order if it exists and belongs to the user, else None"""
+    if not ObjectId.is_valid(order_id):
+        return None
+    orders_collection = await get_collection("orders")
+    order = await orders_collection.find_one({"_id": ObjectId(order_id), "userId": user_id})
+    if order:
+        order["_id"] = str(order["_id"])
+    return order
+
+
+ORDER_QUEUE_SORT = [("createdAt", -1), ("_id", -1)]
+
+ORDER_STATUSES = ["Pending Payment", "Order Placed", "Processing", "Shipped", "Delivered", "Cancelled"]
+
+# Fields rendered by the admin Orders page; each item keeps only its first image
+ORDER_QUEUE_PROJECTION = {
+    "userId": 1,
+    "amount": 1,
+    "address": 1,
+    "status": 1,
+    "paymentMethod": 1,
+    "isPaid": 1,
+    "createdAt": 1,
+    "items": {
+        "$map": {
+            "input": "$items",
+            "as": "item",
+            "in": {
+                "product": {
+                    "_id": "$$item.product._id",
+                    "name": "$$item.product.name",
+                    "image": {"$slice": ["$$item.product.image", 1]},
+                    "offerPrice": "$$item.product.offerPrice",
+                },
+                "quantity": "$$item.quantity",
+                "size": "$$item.size",
+            },
+        }
+    },
+}
+
+
+def build_order_filter(
+    statuses: Optional[List[str]] = None,
+    payment_method: Optional[str] = None,
+    is_paid: Optional[bool] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    email: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Mongo filter for the admin order queue (every argument is optional).
+
+    Args:
+        statuses: Any of these statuses
+        payment_method: "COD", "Stripe" or "VNPay"
+        is_paid: Paid / unpaid only
+        date_from: createdAt >= date_from
+        date_to: createdAt < date_to
+        user_id: Orders of one customer
+        email: Orders whose shipping address has this email
+    """
+    query: Dict[str, Any] = {}
+    if statuses:
+        query["status"] = statuses[0] if len(statuses) == 1 else {"$in": statuses}
+    if payment_method:
+        query["paymentMethod"] = payment_method
+    if is_paid is not None:
+        query["isPaid"] = is_paid
+    if date_from or date_to:
+        query["createdAt"] = {}
+        if date_from:
+            query["createdAt"]["$gte"] = date_from
+        if date_to:
+            query["createdAt"]["$lt"] = date_to
+    if user_id:
+        query["userId"] = user_id
+    if email:
+        query["address.email"] = email.strip()
+    return query
+
+
+async def list_order_queue(query: Dict[str, Any], limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of orders matching `query`, newest first.
+
+    Returns:
+        {"orders", "nextCursor", "hasMore"}
+
+    Raises:
+        ValueError: Malformed cursor
+    """
+    match = dict(query)
+    if cursor:
+        match = {"$and": [query, keyset_filter(ORDER_QUEUE_SORT, decode_cursor(cursor, ORDER_QUEUE_SORT))]}
+
+    orders_collection = await get_collection("orders")
+    pipeline = [
+        {"$match": match},
+        {"$sort": dict(ORDER_QUEUE_SORT)},
+        {"$limit": limit + 1},
+        {"$project": ORDER_QUEUE_PROJECTION},
+    ]
+    orders = await orders_collection.aggregate(pipeline).to_list(length=limit + 1)
+
+    page = page_of(orders, limit, ORDER_QUEUE_SORT)
+    for order in page["items"]:
+        order["_id"] = str(order["_id"])
+    return {
+        "orders": page["items"],
+        "nextCursor": page["nextCursor"],
+        "hasMore": page["hasMore"]
+    }
+
+
+async def count_order_facets(query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Order counts for `query` by status, payment method and paid flag (one $facet aggregation).
+
+    Returns:
+        {"total", "status": {status: n}, "paymentMethod": {method: n}, "isPaid": {"true": n, "false": n}}
+    """
+    orders_collection = await get_collection("orders")
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "paymentMethod": [{"$group": {"_id": "$paymentMethod", "count": {"$sum": 1}}}],
+            "isPaid": [{"$group": {"_id": "$isPaid", "count": {"$sum": 1}}}],
+        }},
+    ]
+    result = await orders_collection.aggregate(pipeline).to_list(length=1)
+    facets = result[0] if result else {}
+
+    status_counts = {order_status: 0 for order_status in ORDER_STATUSES}
+    for row in facets.get("status", []):
+        if row["_id"]:
+            status_counts[row["_id"]] = status_counts.get(row["_id"], 0) + row["count"]
+    paid_counts = {"true": 0, "false": 0}
+    for row in facets.get("isPaid", []):
+        paid_counts["true" if row["_id"] else "false"] += row["count"]
+    return {
+        "total": sum(paid_counts.values()),
+        "status": status_counts,
+        "paymentMethod": {row["_id"]: row["count"] for row in facets.get("paymentMethod", []) if row["_id"]},
+        "isPaid": paid_counts
+    }
@@ -0,0 +1,150 @@
+"""
+Order Status Transitions
+State machine for staff status changes:
+    Order Placed -> Processing -> Shipped -> Delivered
+    Pending Payment / Order Placed / Processing / Shipped -> Cancelled
+Delivered and Cancelled are final.
+
+Bulk transitions are applied with one bulk_write on `orders`. Each update is guarded
+by the status it was validated against, so an order changed concurrently is not
+moved twice. Stock of cancelled orders is restored (and stock of paid orders taken)
+through inventory_service, one bulk_write aggregated per (product, size).
+"""
+
+from typing import Any, Dict, List
+from datetime import datetime
+import logging
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.config.database import get_collection
+from app.services.inventory_service import CANCEL, SALE, apply_order_movements
+from app.services.purchase_service import record_delivered_orders
+
+logger = logging.getLogger(__name__)
+
+ORDER_TRANSITIONS: Dict[str, List[str]] = {
+    "Pending Payment": ["Cancelled"],
+    "Order Placed": ["Processing", "Cancelled"],
+    "Processing": ["Shipped", "Cancelled"],
+    "Shipped": ["Delivered", "Cancelled"],
+    "Delivered": [],
+    "Cancelled": [],
+}
+
+# Statuses whose items were taken from stock (Pending Payment is decremented only once paid)
+STOCK_HELD_STATUSES = {"Order Placed", "Processing", "Shipped"}
+
+
+def can_transition(from_status: str, to_status: str) -> bool:
+    return to_status in ORDER_TRANSITIONS.get(from_status, [])
+
+
+async def restore_stock(orders: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Put the items of these orders back in stock (one bulk_write of $inc per product and
+    size, recorded as "cancel" movements).
+
+    Returns:
+        {productId: quantity restored}
+    """
+    return await apply_order_movements(orders, CANCEL)
+
+
+async def take_stock(orders: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Take the items of these orders out of stock (one bulk_write of $inc per product and
+    size, recorded as "sale" movements).
+
+    Returns:
+        {productId: quantity taken}
+    """
+    return await apply_order_movements(orders, SALE)
+
+
+async def bulk_transition(order_ids: List[str], to_status: str) -> Dict[str, Any]:
+    """
+    Move many orders to `to_status`.
+
+    Args:
+        order_ids: Orders to move (duplicates are ignored)
+        to_status: Target status
+
+    Returns:
+        {
+            "updated": [orderId],
+            "rejected": [{"orderId", "status", "reason"}],
+            "stockRestored": {productId: quantity}
+        }
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    rejected: List[Dict[str, Any]] = []
+    valid_ids = []
+    for order_id in order_ids:
+        if ObjectId.is_valid(order_id):
+            valid_ids.append(ObjectId(order_id))
+        else:
+            rejected.append({"orderId": order_id, "status": None, "reason": "not_found"})
+
+    orders_collection = await get_collection("orders")
+    orders = {
+        str(order["_id"]): order
+        async for order in orders_collection.find(
+            {"_id": {"$in": valid_ids}},
+            {"status": 1, "userId": 1, "items.product._id": 1, "items.quantity": 1, "items.size": 1}
+        )
+    }
+
+    # Validate every order against the state machine
+    accepted = []
+    for object_id in valid_ids:
+        order = orders.get(str(object_id))
+        if not order:
+            rejected.append({"orderId": str(object_id), "status": None, "reason": "not_found"})
+        elif not can_transition(order.get("status"), to_status):
+            rejected.append({"orderId": str(object_id), "status": order.get("status"), "reason": "invalid_transition"})
+        else:
+            accepted.append(order)
+
+    if not accepted:
+        return {"updated": [], "rejected": rejected, "stockRestored": {}}
+
+    # One bulk_write; each update only applies if the status is still the validated one
+    now = datetime.utcnow()
+    result = await orders_collection.bulk_write([
+        UpdateOne(
+            {"_id": order["_id"], "status": order["status"]},
+            {"$set": {"status": to_status, "updatedAt": now}}
+        )
+        for order in accepted
+    ], ordered=False)
+
+    applied = accepted
+    if result.modified_count != len(accepted):
+        # Some orders changed in between: keep only the ones this call moved
+        moved = {
+            doc["_id"]
+            async for doc in orders_collection.find(
+                {"_id": {"$in": [order["_id"] for order in accepted]}, "status": to_status, "updatedAt": now},
+                {"_id": 1}
+            )
+        }
+        applied = [order for order in accepted if order["_id"] in moved]
+        for order in accepted:
+            if order["_id"] not in moved:
+                rejected.append({"orderId": str(order["_id"]), "status": order["status"], "reason": "concurrent_update"})
+
+    # Restore stock (aggregated per product) and keep purchases in sync
+    stock_restored: Dict[str, int] = {}
+    if to_status == "Cancelled":
+        stock_restored = await restore_stock([order for order in applied if order["status"] in STOCK_HELD_STATUSES])
+    elif to_status == "Delivered":
+        await record_delivered_orders(applied, now)
+
+    logger.info(f"Bulk transition to {to_status}: {len(applied)} updated, {len(rejected)} rejected")
+    return {
+        "updated": [str(order["_id"]) for order in applied],
+        "rejected": rejected,
+        "stockRestored": stock_restored
+    }
@@ -0,0 +1,222 @@
+"""
+Payment Confirmation Service
+Marks "Pending Payment" orders (Stripe, VNPay) as paid exactly once, however many
+times or however concurrently the provider callback / client verification arrives:
+
+- The transition is one find_one_and_update guarded by {status: "Pending Payment",
+  isPaid: false}. Only the call that wins it takes the items out of stock (one
+  bulk_write of $inc per product and size), so retries never decrement stock twice.
+- Every handled callback is recorded in `payment_events` under an idempotency key
+  (e.g. "stripe:<sessionId>", "vnpay:<txnRef>:<transactionNo>"). A replayed key
+  returns the recorded outcome without touching orders or stock. Events expire
+  after PAYMENT_EVENT_TTL_DAYS (TTL index in database.create_indexes).
+- Failed payments cancel the order with the same guard, so a late failure callback
+  can never cancel an order that has been paid in the meantime.
+- A payment arriving after the order expired (order_reaper) is still honoured: the
+  order is marked paid where it is, or restored from `orders_archive`, and its stock
+  is taken. A payment for an order that was cancelled in the meantime flags the
+  order refundRequired for staff. Neither is recorded as a silent no-op.
+- A payment whose order cannot be found at all is logged as an error and NOT
+  recorded, so a later retry of the same callback is handled again.
+"""
+
+from typing import Any, Dict, Optional
+from datetime import datetime
+import logging
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config.database import get_collection
+from app.services.order_reaper import ARCHIVE_COLLECTION_NAME, EXPIRED_STATUS
+from app.services.order_transitions import take_stock
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION_NAME = "payment_events"
+
+PENDING_STATUS = "Pending Payment"
+PAID_STATUS = "Order Placed"
+CANCELLED_STATUS = "Cancelled"
+
+# Outcomes of confirm_payment
+CONFIRMED = "confirmed"  # This call marked the order paid and took the stock
+ALREADY_PAID = "already_paid"  # An earlier call did
+REFUND_REQUIRED = "refund_required"  # Paid, but the order had been cancelled: flagged for refund
+NOT_FOUND = "not_found"  # Not recorded: a retry is handled again
+
+UNPAID_PENDING = {"status": PENDING_STATUS, "isPaid": {"$ne": True}}
+
+STOCK_PROJECTION = {"userId": 1, "items.product._id": 1, "items.quantity": 1, "items.size": 1}
+
+
+async def _recorded_event(idempotency_key: str) -> Optional[Dict[str, Any]]:
+    events_collection = await get_collection(EVENTS_COLLECTION_NAME)
+    return await events_collection.find_one({"_id": idempotency_key})
+
+
+async def _record_event(idempotency_key: str, provider: str, order_id: Optional[str], outcome: str) -> None:
+    events_collection = await get_collection(EVENTS_COLLECTION_NAME)
+    try:
+        await events_collection.insert_one({
+            "_id": idempotency_key,
+            "provider": provider,
+            "orderId": order_id,
+            "outcome": outcome,
+            "createdAt": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # A concurrent call with the same key recorded it first
+        pass
+
+
+async def _revive_expired(order_filter: Dict[str, Any], paid_fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Mark an expired order paid: in place if the reaper has not removed it yet,
+    otherwise by moving it back from orders_archive.
+
+    Returns:
+        The revived order (stock projection), or None if there is no expired unpaid order
+    """
+    orders_collection = await get_collection("orders")
+    archive_collection = await get_collection(ARCHIVE_COLLECTION_NAME)
+    expired_unpaid = {"status": EXPIRED_STATUS, "isPaid": {"$ne": True}}
+    revived_fields = {**paid_fields, "restoredAt": paid_fields["updatedAt"]}
+
+    # Two attempts: an insert can collide with the reaper still holding the expired copy in orders
+    for _ in range(2):
+        order = await orders_collection.find_one_and_update(
+            {**order_filter, **expired_unpaid},
+            {"$set": revived_fields},
+            projection=STOCK_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if order:
+            await archive_collection.delete_one({"_id": order["_id"]})
+            return order
+
+        archived = await archive_collection.find_one({**order_filter, **expired_unpaid})
+        if not archived:
+            return None
+        archived.pop("archivedAt", None)
+        try:
+            await orders_collection.insert_one({**archived, **revived_fields})
+        except DuplicateKeyError:
+            # Still in orders (being archived) or revived concurrently: check again
+            continue
+        await archive_collection.delete_one({"_id": archived["_id"]})
+        return archived
+    return None
+
+
+async def confirm_payment(
+    order_filter: Dict[str, Any],
+    provider: str,
+    idempotency_key: str,
+    payment_fields: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Mark the order matching order_filter as paid, once.
+
+    Args:
+        order_filter: Selects one order (e.g. {"_id": ObjectId}, {"stripeSessionId": id})
+        provider: "Stripe" or "VNPay"
+        idempotency_key: Key of this callback / verification
+        payment_fields: Extra fields stored on the order (e.g. vnpayTransactionNo)
+
+    Returns:
+        {
+            "outcome": confirmed | already_paid | refund_required | not_found,
+            "orderId": str or None,
+            "userId": str or None,
+            "replayed": True if the key had been handled before,
+            "restored": True if the order had expired and was revived
+        }
+    """
+    event = await _recorded_event(idempotency_key)
+    if event:
+        return {"outcome": event["outcome"], "orderId": event.get("orderId"), "userId": None, "replayed": True, "restored": False}
+
+    orders_collection = await get_collection("orders")
+    now = datetime.utcnow()
+    paid_fields = {
+        "isPaid": True,
+        "paidAt": now,
+        "status": PAID_STATUS,
+        "updatedAt": now,
+        **(payment_fields or {})
+    }
+    order = await orders_collection.find_one_and_update(
+        {**order_filter, **UNPAID_PENDING},
+        {"$set": paid_fields},
+        projection=STOCK_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    restored = False
+    if not order:
+        # Paid after the payment window: bring the expired order back
+        order = await _revive_expired(order_filter, paid_fields)
+        restored = order is not None
+        if restored:
+            logger.warning(f"{provider} payment {idempotency_key} arrived after order {order['_id']} expired, order restored")
+
+    if order:
+        outcome = CONFIRMED
+        await take_stock([order])
+    else:
+        order = await orders_collection.find_one(order_filter, {"userId": 1, "isPaid": 1})
+        if not order:
+            # Money may have been taken: keep the key unrecorded so a retry is handled again
+            logger.error(f"{provider} payment {idempotency_key} arrived for an order that does not exist ({order_filter})")
+            return {"outcome": NOT_FOUND, "orderId": None, "userId": None, "replayed": False, "restored": False}
+        if order.get("isPaid"):
+            outcome = ALREADY_PAID
+        else:
+            # Cancelled while the customer was paying: keep the money visible to staff
+            outcome = REFUND_REQUIRED
+            await orders_collection.update_one(
+                {"_id": order["_id"], "isPaid": {"$ne": True}},
+                {"$set": {
+                    "refundRequired": True,
+                    "paymentProvider": provider,
+                    "paymentReceivedAt": now,
+                    "updatedAt": now,
+                    **(payment_fields or {})
+                }}
+            )
+            logger.error(f"{provider} payment {idempotency_key} arrived for order {order['_id']} that is no longer payable, flagged for refund")
+
+    order_id = str(order["_id"])
+    await _record_event(idempotency_key, provider, order_id, outcome)
+    return {
+        "outcome": outcome,
+        "orderId": order_id,
+        "userId": order.get("userId"),
+        "replayed": False,
+        "restored": restored
+    }
+
+
+async def find_payment_order(order_filter: Dict[str, Any], projection: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The order a payment callback refers to, also if it has expired and been archived"""
+    orders_collection = await get_collection("orders")
+    order = await orders_collection.find_one(order_filter, projection)
+    if order:
+        return order
+    archive_collection = await get_collection(ARCHIVE_COLLECTION_NAME)
+    return await archive_collection.find_one(order_filter, projection)
+
+
+async def cancel_unpaid_order(order_filter: Dict[str, Any]) -> bool:
+    """
+    Cancel the order after a failed payment, only if it is still pending and unpaid.
+
+    Returns:
+        True if the order was cancelled
+    """
+    orders_collection = await get_collection("orders")
+    result = await orders_collection.update_one(
+        {**order_filter, **UNPAID_PENDING},
+        {"$set": {"status": CANCELLED_STATUS, "updatedAt": datetime.utcnow()}}
+    )
+    return result.modified_count == 1
@@ -0,0 +1,88 @@
+"""
+Promotion Scheduler
+Background task (started in the app lifespan) that activates and expires
+discounts at their discountStartDate / discountEndDate, so prices change on time
+without staff flipping promotions by hand and without date checks on every request.
+
+Transitions are queued by discount_service in `promotion_schedule` (index on runAt):
+
+1. Apply every due entry, oldest first, PROMOTION_BATCH_SIZE entries per
+   bulk_write (discount_service.apply_due_transitions); cached priced carts of
+   the changed products are invalidated
+2. Sleep until the next queued runAt, at most PROMOTION_POLL_SECONDS; a newly
+   scheduled promotion wakes the task at once
+
+Entries missed while the app was down are applied on startup. Transitions are
+idempotent and guarded by the product's dates, so several workers running the
+scheduler at the same time is harmless.
+"""
+
+from typing import Optional
+from datetime import datetime
+import asyncio
+import logging
+
+from app.config.settings import settings
+from app.services import discount_service
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+
+
+async def run_due_transitions(batch_size: Optional[int] = None) -> int:
+    """
+    Apply all transitions due now, one batch at a time.
+
+    Returns:
+        Number of queue entries processed
+    """
+    batch_size = batch_size or settings.PROMOTION_BATCH_SIZE
+    processed = 0
+    while True:
+        result = await discount_service.apply_due_transitions(datetime.utcnow(), batch_size)
+        processed += result["processed"]
+        if result["processed"] < batch_size:
+            return processed
+
+
+async def _run_forever(poll_seconds: float) -> None:
+    while True:
+        discount_service.schedule_changed.clear()
+        timeout = poll_seconds
+        try:
+            await run_due_transitions()
+            next_at = await discount_service.next_transition_at()
+            if next_at:
+                timeout = min(poll_seconds, max((next_at - datetime.utcnow()).total_seconds(), 0.0))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Promotion scheduler run failed: {e}")
+        # Newly scheduled promotions wake the task before the timeout
+        try:
+            await asyncio.wait_for(discount_service.schedule_changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_promotion_scheduler() -> Optional[asyncio.Task]:
+    """Start the background scheduler (no-op if disabled or already running)"""
+    global _task
+    if not settings.PROMOTION_SCHEDULER_ENABLED or (_task and not _task.done()):
+        return _task
+    _task = asyncio.create_task(_run_forever(settings.PROMOTION_POLL_SECONDS))
+    logger.info("Promotion scheduler started")
+    return _task
+
+
+async def stop_promotion_scheduler() -> None:
+    """Cancel the background scheduler and wait for it to stop"""
+    global _task
+    if _task and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
@@ -0,0 +1,164 @@
+"""
+Purchase Service
+`purchases` is a projection of delivered order lines, one document per (user, product, order):
+    {userId: str, productId: str, orderId: str, deliveredAt: datetime}
+- Written when an order moves to Delivered, removed when it leaves Delivered
+  (cancelled, status corrected) or is deleted
+- Unique index (userId, productId, orderId): "has this user received this product"
+  is a point lookup on the index prefix instead of a scan of nested order items
+- Index (userId, deliveredAt) serves "buy again" (recently received products)
+
+Delivered orders from before this projection are backfilled per user the first time
+the user's purchases are read (once per process); scripts/rebuild_purchases.py
+rebuilds the whole collection.
+"""
+
+from typing import Any, Dict, List, Optional, Set
+from datetime import datetime
+import logging
+
+from pymongo import UpdateOne
+
+from app.config.database import get_collection
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "purchases"
+
+DELIVERED_STATUS = "Delivered"
+
+# Upserts per bulk_write during a rebuild
+REBUILD_BATCH_SIZE = 500
+
+# Users whose delivered orders have already been backfilled (per process)
+_backfilled_users: Set[str] = set()
+
+
+def _purchase_upserts(order: Dict[str, Any], delivered_at: datetime) -> List[UpdateOne]:
+    order_id = str(order["_id"])
+    product_ids = dict.fromkeys(str(item["product"]["_id"]) for item in order.get("items", []))
+    return [
+        UpdateOne(
+            {"userId": order["userId"], "productId": product_id, "orderId": order_id},
+            {"$setOnInsert": {"deliveredAt": delivered_at}},
+            upsert=True
+        )
+        for product_id in product_ids
+    ]
+
+
+async def record_delivered_order(order: Dict[str, Any], delivered_at: Optional[datetime] = None) -> int:
+    """
+    Add one purchase per product of a delivered order (idempotent).
+
+    Returns:
+        Number of purchases created
+    """
+    return await record_delivered_orders([order], delivered_at)
+
+
+async def record_delivered_orders(orders: List[Dict[str, Any]], delivered_at: Optional[datetime] = None) -> int:
+    """Same as record_delivered_order for many orders, in one bulk_write"""
+    delivered_at = delivered_at or datetime.utcnow()
+    operations = [op for order in orders for op in _purchase_upserts(order, delivered_at)]
+    if not operations:
+        return 0
+    purchases_collection = await get_collection(COLLECTION_NAME)
+    result = await purchases_collection.bulk_write(operations, ordered=False)
+    return result.upserted_count
+
+
+async def remove_order_purchases(order_id: str) -> int:
+    """Remove the purchases of an order that is no longer delivered"""
+    purchases_collection = await get_collection(COLLECTION_NAME)
+    result = await purchases_collection.delete_many({"orderId": str(order_id)})
+    return result.deleted_count
+
+
+async def sync_order_purchases(order: Dict[str, Any]) -> None:
+    """Make purchases match an order's current status (call after the status changed)"""
+    if order.get("status") == DELIVERED_STATUS:
+        await record_delivered_order(order)
+    else:
+        await remove_order_purchases(str(order["_id"]))
+
+
+async def backfill_user_purchases(user_id: str) -> int:
+    """
+    Project a user's existing delivered orders into `purchases` (once per process).
+
+    Returns:
+        Number of purchases created
+    """
+    if user_id in _backfilled_users:
+        return 0
+
+    orders_collection = await get_collection("orders")
+    created = 0
+    async for order in orders_collection.find(
+        {"userId": user_id, "status": DELIVERED_STATUS},
+        {"userId": 1, "items.product._id": 1, "updatedAt": 1, "createdAt": 1}
+    ):
+        created += await record_delivered_order(order, order.get("updatedAt") or order.get("createdAt"))
+    if created:
+        logger.info(f"Backfilled {created} purchases of user {user_id}")
+
+    _backfilled_users.add(user_id)
+    return created
+
+
+async def find_purchase(user_id: str, product_id: str) -> Optional[Dict[str, Any]]:
+    """
+    A delivered purchase of this product by this user (index point lookup).
+
+    Returns:
+        Purchase document or None if the user has not received the product
+    """
+    await backfill_user_purchases(user_id)
+    purchases_collection = await get_collection(COLLECTION_NAME)
+    return await purchases_collection.find_one({"userId": user_id, "productId": product_id})
+
+
+async def recent_purchased_product_ids(user_id: str, limit: int = 20) -> List[str]:
+    """Distinct product ids the user received, most recent first ("buy again")"""
+    await backfill_user_purchases(user_id)
+    purchases_collection = await get_collection(COLLECTION_NAME)
+    cursor = purchases_collection.find(
+        {"userId": user_id},
+        {"_id": 0, "productId": 1}
+    ).sort("deliveredAt", -1)
+
+    product_ids: Dict[str, None] = {}
+    async for purchase in cursor:
+        product_ids.setdefault(purchase["productId"])
+        if len(product_ids) >= limit:
+            break
+    return list(product_ids)
+
+
+async def rebuild_purchases() -> int:
+    """
+    Recreate `purchases` from all delivered orders.
+
+    Returns:
+        Number of purchases written
+    """
+    orders_collection = await get_collection("orders")
+    purchases_collection = await get_collection(COLLECTION_NAME)
+
+    await purchases_collection.delete_many({})
+    operations: List[UpdateOne] = []
+    written = 0
+    async for order in orders_collection.find(
+        {"status": DELIVERED_STATUS},
+        {"userId": 1, "items.product._id": 1, "updatedAt": 1, "createdAt": 1}
+    ):
+        operations.extend(_purchase_upserts(order, order.get("updatedAt") or order.get("createdAt")))
+        if len(operations) >= REBUILD_BATCH_SIZE:
+            written += (await purchases_collection.bulk_write(operations, ordered=False)).upserted_count
+            operations = []
+    if operations:
+        written += (await purchases_collection.bulk_write(operations, ordered=False)).upserted_count
+
+    logger.info(f"Rebuilt {written} purchases from delivered orders")
+    return written
@@ -3,8 +3,9 @@ RAG (Retrieval-Augmented Generation) Service
 Performs vector search across MongoDB collections and formats results for LLM context
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 import logging
+import re
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.config.database import get_database
@@ -20,12 +21,159 @@ VECTOR_INDEXES = {
     "categories": "vector_index_categories"
 }
 
+# Common Vietnamese filler words that carry no search intent
+STOP_WORDS = {'tìm', 'cho', 'tôi', 'mua', 'xem', 'có', 'gì', 'không', 'muốn', 'cần', 'được'}
+
+# Search modes supported by vector_search
+SEARCH_MODES = ("hybrid", "keyword", "vector")
+
+# Fields returned by the $vectorSearch pipeline
+VECTOR_PROJECTION = {
+    "_id": 1,
+    "name": 1,
+    "title": 1,
+    "description": 1,
+    "category": 1,
+    "subCategory": 1,
+    "price": 1,
+    "image": 1,
+    "author": 1,
+    "date": 1,
+    "score": {"$meta": "vectorSearchScore"}
+}
+
+EmbedFn = Callable[..., Awaitable[List[float]]]
+
+
+def extract_keywords(query: str) -> List[str]:
+    """
+    Extract meaningful keywords from a search query.
+    
+    Args:
+        query: User's search query text
+        
+    Returns:
+        Lowercased keywords with stop words and single characters removed
+    """
+    query_lower = query.lower()
+    return [w for w in re.findall(r'\b[\w]+\b', query_lower) if w not in STOP_WORDS and len(w) > 1]
+
+
+async def keyword_search(
+    collection: Any,
+    keywords: List[str],
+    top_k: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Keyword search on name/category with name matches weighted higher.
+    
+    Args:
+        collection: Motor collection (or any object with a compatible find())
+        keywords: Keywords returned by extract_keywords()
+        top_k: Number of results wanted; up to top_k * 2 candidates are scored
+        
+    Returns:
+        Matching documents sorted by keyword score (best first)
+    """
+    if not keywords:
+        return []
+    
+    # Build more precise keyword filters
+    or_conditions = []
+    for kw in keywords:
+        # Use word boundary for more precise matching
+        or_conditions.extend([
+            {"name": {"$regex": f"\\b{kw}", "$options": "i"}},
+            {"category": {"$regex": f"\\b{kw}", "$options": "i"}},
+        ])
+    
+    keyword_results = []
+    async for doc in collection.find({"$or": or_conditions}).limit(top_k * 2):
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        
+        # Calculate keyword match score with priority on name
+        name_lower = doc.get("name", "").lower()
+        category_lower = doc.get("category", "").lower()
+        
+        # Count matches in name (higher weight) and category (lower weight)
+        name_matches = sum(3 for kw in keywords if kw in name_lower)  # 3x weight for name matches
+        category_matches = sum(1 for kw in keywords if kw in category_lower)  # 1x weight for category
+        
+        total_score = name_matches + category_matches
+        
+        # Only include if there's at least one name match OR 2+ category matches
+        if name_matches > 0 or category_matches >= 2:
+            doc["score"] = 0.9 + (total_score * 0.05)
+            keyword_results.append(doc)
+    
+    # Sort by score (name matches prioritized)
+    keyword_results.sort(key=lambda x: x.get("score", 0), reverse=True)
+    return keyword_results
+
+
+async def semantic_search(
+    collection: Any,
+    collection_name: str,
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    embed_fn: Optional[EmbedFn] = None
+) -> List[Dict[str, Any]]:
+    """
+    Vector similarity search using the Atlas $vectorSearch stage.
+    
+    Args:
+        collection: Motor collection (or any object with a compatible aggregate())
+        collection_name: Name of collection, used to pick the vector index
+        query: User's search query text
+        top_k: Number of results wanted; top_k * 2 candidates are returned
+        filters: Optional MongoDB filters applied after the vector stage
+        embed_fn: Async embedder, defaults to Gemini generate_embedding
+        
+    Returns:
+        Documents with vectorSearchScore, sorted by similarity
+    """
+    embed_fn = embed_fn or generate_embedding
+    
+    logger.info(f"Generating embedding for query: '{query[:50]}...'")
+    query_embedding = await embed_fn(query, task_type="retrieval_query")
+    
+    # Build vector search pipeline
+    pipeline = [
+        {
+            "$vectorSearch": {
+                "index": VECTOR_INDEXES[collection_name],
+                "path": "embedding",
+                "queryVector": query_embedding,
+                "numCandidates": top_k * 10,
+                "limit": top_k * 2  # Get more candidates
+            }
+        },
+        {"$project": VECTOR_PROJECTION}
+    ]
+    
+    # Add filters if provided
+    if filters:
+        pipeline.insert(1, {"$match": filters})
+    
+    vector_results = []
+    async for doc in collection.aggregate(pipeline):
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        vector_results.append(doc)
+    
+    return vector_results
+
 
 async def vector_search(
     query: str,
     collection_name: str,
     top_k: int = 5,
-    filters: Optional[Dict[str, Any]] = None
+    filters: Optional[Dict[str, Any]] = None,
+    mode: str = "hybrid",
+    collection: Any = None,
+    embed_fn: Optional[EmbedFn] = None
 ) -> List[Dict[str, Any]]:
     """
     Perform hybrid search: keyword + vector similarity search on a MongoDB collection.
@@ -35,111 +183,42 @@ async def vector_search(
         collection_name: Name of collection to search ('products', 'blogs', 'categories')
         top_k: Number of top results to return (default: 5)
         filters: Optional MongoDB filters to combine with vector search
+        mode: 'hybrid' (default), 'keyword' or 'vector' only
+        collection: Collection to search instead of the live database one (offline evaluation)
+        embed_fn: Async embedder to use instead of Gemini (offline evaluation)
         
     Returns:
         List of documents with relevance scores, sorted by similarity
         
     Raises:
-        ValueError: If collection_name is invalid
+        ValueError: If collection_name or mode is invalid
         Exception: If vector search fails
     """
     if collection_name not in VECTOR_INDEXES:
         raise ValueError(f"Invalid collection: {collection_name}. Must be one of {list(VECTOR_INDEXES.keys())}")
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Invalid search mode: {mode}. Must be one of {list(SEARCH_MODES)}")
     
     try:
         # Get database and collection
-        database = await get_database()
-        collection = database[collection_name]
+        if collection is None:
+            database = await get_database()
+            collection = database[collection_name]
         
-        # Extract keywords from query for keyword matching
-        import re
-        # Clean query and extract meaningful keywords (remove common words)
-        query_lower = query.lower()
-        stop_words = {'tìm', 'cho', 'tôi', 'mua', 'xem', 'có', 'gì', 'không', 'muốn', 'cần', 'được'}
-        keywords = [w for w in re.findall(r'\b[\w]+\b', query_lower) if w not in stop_words and len(w) > 1]
+        if mode == "vector":
+            results = await semantic_search(collection, collection_name, query, top_k, filters, embed_fn)
+            return results[:top_k]
         
         # Try keyword search first for exact matches
-        keyword_results = []
-        if keywords:
-            # Build more precise keyword filters
-            or_conditions = []
-            for kw in keywords:
-                # Use word boundary for more precise matching
-                or_conditions.extend([
-                    {"name": {"$regex": f"\\b{kw}", "$options": "i"}},
-                    {"category": {"$regex": f"\\b{kw}", "$options": "i"}},
-                ])
-            
-            if or_conditions:
-                async for doc in collection.find({"$or": or_conditions}).limit(top_k * 2):
-                    if "_id" in doc:
-                        doc["_id"] = str(doc["_id"])
-                    
-                    # Calculate keyword match score with priority on name
-                    name_lower = doc.get("name", "").lower()
-                    category_lower = doc.get("category", "").lower()
-                    
-                    # Count matches in name (higher weight) and category (lower weight)
-                    name_matches = sum(3 for kw in keywords if kw in name_lower)  # 3x weight for name matches
-                    category_matches = sum(1 for kw in keywords if kw in category_lower)  # 1x weight for category
-                    
-                    total_score = name_matches + category_matches
-                    
-                    # Only include if there's at least one name match OR 2+ category matches
-                    if name_matches > 0 or category_matches >= 2:
-                        doc["score"] = 0.9 + (total_score * 0.05)
-                        keyword_results.append(doc)
-                
-                # Sort by score (name matches prioritized)
-                keyword_results.sort(key=lambda x: x.get("score", 0), reverse=True)
+        keyword_results = await keyword_search(collection, extract_keywords(query), top_k)
         
-        # If we have good keyword results, return them
-        if len(keyword_results) >= top_k:
+        # If we have good keyword results (or keyword-only mode), return them
+        if mode == "keyword" or len(keyword_results) >= top_k:
             logger.info(f"Keyword search found {len(keyword_results)} results for '{query}' in {collection_name}")
             return keyword_results[:top_k]
         
         # Otherwise, combine with vector search
-        logger.info(f"Generating embedding for query: '{query[:50]}...'")
-        query_embedding = await generate_embedding(query, task_type="retrieval_query")
-        
-        # Build vector search pipeline
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": VECTOR_INDEXES[collection_name],
-                    "path": "embedding",
-                    "queryVector": query_embedding,
-                    "numCandidates": top_k * 10,
-                    "limit": top_k * 2  # Get more candidates
-                }
-            },
-            {
-                "$project": {
-                    "_id": 1,
-                    "name": 1,
-                    "title": 1,
-                    "description": 1,
-                    "category": 1,
-                    "subCategory": 1,
-                    "price": 1,
-                    "image": 1,
-                    "author": 1,
-                    "date": 1,
-                    "score": {"$meta": "vectorSearchScore"}
-                }
-            }
-        ]
-        
-        # Add filters if provided
-        if filters:
-            pipeline.insert(1, {"$match": filters})
-        
-        # Execute vector search
-        vector_results = []
-        async for doc in collection.aggregate(pipeline):
-            if "_id" in doc:
-                doc["_id"] = str(doc["_id"])
-            vector_results.append(doc)
+        vector_results = await semantic_search(collection, collection_name, query, top_k, filters, embed_fn)
         
         # Combine results: keyword matches first, then vector results
         seen_ids = {doc["_id"] for doc in keyword_results}
@@ -0,0 +1,249 @@
+"""
+Review Service
+Rating aggregates are denormalized into `product_stats`, one document per product:
+    {_id: productId (ObjectId), ratingCount, ratingSum, ratingHistogram: {"1".."5"}, updatedAt}
+- create/update/delete review adjust them with a single atomic $inc (no upsert)
+- Review stats for a product page are one _id lookup instead of a $group over its reviews
+- A product without a stats document (reviewed before product_stats existed) is
+  seeded from its reviews the first time its stats are read or changed. Writers call
+  ensure_rating_stats() before writing the review, so a seed never counts a review
+  whose $inc is still to come
+- rebuild_rating_stats() recomputes them from `reviews` (scripts/rebuild_review_stats.py)
+
+Product review lists use keyset (cursor) pagination (app/utils/pagination.py): every
+sort mode ends with _id so the order is total, and each has a matching compound index
+on `reviews` (see database.create_indexes), so page N costs the same as page 1.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import logging
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from app.config.database import get_collection
+from app.utils.pagination import decode_cursor, keyset_filter, page_of
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION_NAME = "product_stats"
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+# Upserts per bulk_write during a rebuild
+REBUILD_BATCH_SIZE = 500
+
+# Sort modes of GET /api/review/product/{id}; each is served by an index prefixed with productId
+REVIEW_SORTS: Dict[str, List[Tuple[str, int]]] = {
+    "newest": [("createdAt", -1), ("_id", -1)],
+    "oldest": [("createdAt", 1), ("_id", 1)],
+    "rating_desc": [("rating", -1), ("createdAt", -1), ("_id", -1)],
+    "rating_asc": [("rating", 1), ("createdAt", -1), ("_id", -1)],
+}
+
+# Review fields rendered by the storefront
+REVIEW_LIST_PROJECTION = {
+    "userId": 1,
+    "rating": 1,
+    "title": 1,
+    "comment": 1,
+    "userName": 1,
+    "userAvatar": 1,
+    "verified": 1,
+    "purchaseDate": 1,
+    "createdAt": 1,
+}
+
+
+def empty_histogram() -> Dict[str, int]:
+    return {str(rating): 0 for rating in RATING_VALUES}
+
+
+async def apply_rating_change(
+    product_id: ObjectId,
+    old_rating: Optional[int] = None,
+    new_rating: Optional[int] = None
+) -> None:
+    """
+    Adjust a product's aggregates for one review change with a single $inc.
+
+    Args:
+        product_id: Product of the review
+        old_rating: Rating before the change (None when the review is created)
+        new_rating: Rating after the change (None when the review is deleted)
+    """
+    increments: Dict[str, int] = {}
+    if old_rating is not None:
+        increments["ratingCount"] = increments.get("ratingCount", 0) - 1
+        increments["ratingSum"] = increments.get("ratingSum", 0) - old_rating
+        increments[f"ratingHistogram.{old_rating}"] = -1
+    if new_rating is not None:
+        increments["ratingCount"] = increments.get("ratingCount", 0) + 1
+        increments["ratingSum"] = increments.get("ratingSum", 0) + new_rating
+        histogram_key = f"ratingHistogram.{new_rating}"
+        increments[histogram_key] = increments.get(histogram_key, 0) + 1
+
+    increments = {key: value for key, value in increments.items() if value}
+    if not increments:
+        return
+
+    stats_collection = await get_collection(STATS_COLLECTION_NAME)
+    result = await stats_collection.update_one(
+        {"_id": product_id},
+        {"$inc": increments, "$set": {"updatedAt": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        # ensure_rating_stats() was skipped or the document was removed since:
+        # recount from the reviews, which already include this change
+        await rebuild_rating_stats(product_id)
+
+
+async def ensure_rating_stats(product_id: ObjectId) -> None:
+    """
+    Make sure a product has a stats document before one of its reviews is written.
+    Call before the review write, then apply_rating_change() after it.
+    """
+    stats_collection = await get_collection(STATS_COLLECTION_NAME)
+    if await stats_collection.find_one({"_id": product_id}, {"_id": 1}) is None:
+        await _seed_rating_stats(product_id)
+
+
+async def _seed_rating_stats(product_id: ObjectId) -> bool:
+    """
+    Create the stats document of a product that has none, from its reviews.
+
+    Returns:
+        False if another request created it first (nothing written)
+    """
+    reviews_collection = await get_collection("reviews")
+    stats = {"ratingCount": 0, "ratingSum": 0, "ratingHistogram": empty_histogram()}
+    async for row in reviews_collection.aggregate([
+        {"$match": {"productId": product_id}},
+        {"$group": {"_id": "$rating", "count": {"$sum": 1}}}
+    ]):
+        if row["_id"] in RATING_VALUES:
+            stats["ratingCount"] += row["count"]
+            stats["ratingSum"] += row["_id"] * row["count"]
+            stats["ratingHistogram"][str(row["_id"])] += row["count"]
+
+    stats_collection = await get_collection(STATS_COLLECTION_NAME)
+    result = await stats_collection.update_one(
+        {"_id": product_id},
+        {"$setOnInsert": {**stats, "updatedAt": datetime.utcnow()}},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+
+def format_rating_stats(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Stats document -> {averageRating, totalReviews, ratingDistribution}"""
+    count = (stats or {}).get("ratingCount", 0)
+    histogram = (stats or {}).get("ratingHistogram", {})
+    return {
+        "averageRating": round(stats["ratingSum"] / count, 1) if count > 0 else 0,
+        "totalReviews": max(count, 0),
+        "ratingDistribution": {rating: max(histogram.get(str(rating), 0), 0) for rating in RATING_VALUES}
+    }
+
+
+async def get_rating_stats(product_id: ObjectId) -> Dict[str, Any]:
+    """
+    Rating summary of a product (one _id lookup).
+
+    Returns:
+        {"averageRating", "totalReviews", "ratingDistribution": {1..5: count}}
+    """
+    stats_collection = await get_collection(STATS_COLLECTION_NAME)
+    stats = await stats_collection.find_one({"_id": product_id})
+    if stats is None:
+        # First read since product_stats was introduced (an empty document is stored too)
+        await _seed_rating_stats(product_id)
+        stats = await stats_collection.find_one({"_id": product_id})
+    return format_rating_stats(stats)
+
+
+async def list_product_reviews(
+    product_id: ObjectId,
+    sort_by: str = "newest",
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of a product's reviews.
+
+    Args:
+        product_id: Product to list
+        sort_by: One of REVIEW_SORTS
+        limit: Page size
+        cursor: nextCursor of the previous page (None for the first page)
+
+    Returns:
+        {"reviews", "nextCursor", "hasMore"}
+
+    Raises:
+        ValueError: Malformed cursor
+    """
+    sort = REVIEW_SORTS[sort_by]
+    query: Dict[str, Any] = {"productId": product_id}
+    if cursor:
+        query.update(keyset_filter(sort, decode_cursor(cursor, sort)))
+
+    reviews_collection = await get_collection("reviews")
+    # One extra document tells whether another page exists
+    reviews = await reviews_collection.find(query, REVIEW_LIST_PROJECTION).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    page = page_of(reviews, limit, sort)
+    return {
+        "reviews": page["items"],
+        "nextCursor": page["nextCursor"],
+        "hasMore": page["hasMore"]
+    }
+
+
+async def rebuild_rating_stats(product_id: Optional[ObjectId] = None) -> int:
+    """
+    Recompute aggregates from the `reviews` collection.
+
+    Args:
+        product_id: Only rebuild this product (default: every product)
+
+    Returns:
+        Number of products whose stats were written
+    """
+    reviews_collection = await get_collection("reviews")
+    stats_collection = await get_collection(STATS_COLLECTION_NAME)
+
+    match = {"productId": product_id} if product_id is not None else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"productId": "$productId", "rating": "$rating"}, "count": {"$sum": 1}}}
+    ]
+
+    rebuilt: Dict[ObjectId, Dict[str, Any]] = {}
+    async for row in reviews_collection.aggregate(pipeline):
+        pid, rating = row["_id"]["productId"], row["_id"]["rating"]
+        if rating not in RATING_VALUES:
+            logger.warning(f"Skipping review rating {rating!r} of product {pid}")
+            continue
+        stats = rebuilt.setdefault(pid, {"ratingCount": 0, "ratingSum": 0, "ratingHistogram": empty_histogram()})
+        stats["ratingCount"] += row["count"]
+        stats["ratingSum"] += rating * row["count"]
+        stats["ratingHistogram"][str(rating)] += row["count"]
+
+    now = datetime.utcnow()
+    operations = [ReplaceOne({"_id": pid}, {**stats, "updatedAt": now}, upsert=True) for pid, stats in rebuilt.items()]
+    for start in range(0, len(operations), REBUILD_BATCH_SIZE):
+        await stats_collection.bulk_write(operations[start:start + REBUILD_BATCH_SIZE], ordered=False)
+
+    # Products whose reviews are all gone
+    stale = {"_id": {"$nin": list(rebuilt)}}
+    if product_id is not None:
+        stale = {"_id": product_id} if product_id not in rebuilt else None
+    if stale is not None:
+        result = await stats_collection.delete_many(stale)
+        if result.deleted_count:
+            logger.info(f"Removed {result.deleted_count} stale product_stats documents")
+
+    logger.info(f"Rebuilt rating stats for {len(rebuilt)} products")
+    return len(rebuilt)
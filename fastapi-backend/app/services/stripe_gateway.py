@@ -0,0 +1,276 @@
+"""
+Stripe Payment Gateway Adapter
+The Stripe SDK is synchronous: every call is a blocking HTTPS round-trip. Calling it
+inside an async handler stalls the whole uvicorn worker, so all Stripe API calls go
+through this adapter:
+
+- Calls run in a dedicated, bounded thread pool (STRIPE_MAX_WORKERS); the event loop
+  only awaits the result
+- One StripeClient with a requests-based HTTP client: connections are kept alive and
+  reused, every request has STRIPE_TIMEOUT_SECONDS and STRIPE_MAX_NETWORK_RETRIES
+- A circuit breaker opens after STRIPE_CIRCUIT_FAILURES consecutive connection / API
+  errors and rejects calls for STRIPE_CIRCUIT_RESET_SECONDS, then lets one trial
+  call through (half-open). Client errors (invalid request, card declined) do not count
+- Per-operation call / error / rejection counts and p50/p95/max latency
+
+STRIPE_GATEWAY=fake swaps in FakeStripeGateway: same interface, no network, a fixed
+simulated latency in the same thread pool. Used by load tests and benchmarks.
+"""
+
+from typing import Any, Callable, Deque, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+import stripe
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per operation
+METRICS_WINDOW = 1000
+
+# Errors that mean Stripe (or the network to it) is unhealthy
+UNHEALTHY_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError, asyncio.TimeoutError)
+
+
+class GatewayUnavailable(Exception):
+    """Stripe cannot be reached right now (circuit open, timeout, connection error)"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed -> open -> half-open -> closed"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (one trial call at a time when half-open)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_running = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning(f"Stripe circuit opened after {self._failures} consecutive failures")
+            self._opened_at = time.monotonic()
+
+
+class GatewayMetrics:
+    """Call counts and latency percentiles per operation"""
+
+    def __init__(self):
+        self._operations: Dict[str, Dict[str, Any]] = {}
+
+    def _operation(self, name: str) -> Dict[str, Any]:
+        return self._operations.setdefault(name, {
+            "calls": 0,
+            "errors": 0,
+            "rejected": 0,
+            "latencies": deque(maxlen=METRICS_WINDOW)
+        })
+
+    def record(self, name: str, latency_ms: float, error: bool = False) -> None:
+        operation = self._operation(name)
+        operation["calls"] += 1
+        operation["errors"] += int(error)
+        operation["latencies"].append(latency_ms)
+
+    def record_rejected(self, name: str) -> None:
+        self._operation(name)["rejected"] += 1
+
+    @staticmethod
+    def _percentile(ordered: list, p: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for name, operation in self._operations.items():
+            latencies: Deque[float] = operation["latencies"]
+            ordered = sorted(latencies)
+            result[name] = {
+                "calls": operation["calls"],
+                "errors": operation["errors"],
+                "rejected": operation["rejected"],
+                "p50_ms": round(self._percentile(ordered, 50), 2),
+                "p95_ms": round(self._percentile(ordered, 95), 2),
+                "max_ms": round(ordered[-1], 2) if ordered else 0.0
+            }
+        return result
+
+
+class StripeGateway:
+    """Stripe Checkout calls off the event loop, with timeouts, circuit breaker and metrics"""
+
+    name = "stripe"
+
+    def __init__(self, max_workers: int, timeout_seconds: float, breaker: CircuitBreaker):
+        self.timeout_seconds = timeout_seconds
+        self.breaker = breaker
+        self.metrics = GatewayMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stripe")
+        self._client = self._create_client()
+
+    def _create_client(self) -> Optional[stripe.StripeClient]:
+        return stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            http_client=stripe.RequestsClient(timeout=self.timeout_seconds),
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES
+        )
+
+    def _create_checkout_session(self, params: Dict[str, Any]) -> Any:
+        return self._client.checkout.sessions.create(params=params)
+
+    def _retrieve_checkout_session(self, session_id: str) -> Any:
+        return self._client.checkout.sessions.retrieve(session_id)
+
+    async def _call(self, operation: str, fn: Callable[..., Any], *args: Any) -> Any:
+        if not self.breaker.allow():
+            self.metrics.record_rejected(operation)
+            raise GatewayUnavailable(f"Stripe circuit is {self.breaker.state}")
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Upper bound including time queued for a pool thread and SDK retries
+        deadline = self.timeout_seconds * (settings.STRIPE_MAX_NETWORK_RETRIES + 1) + 5
+        try:
+            result = await asyncio.wait_for(loop.run_in_executor(self._executor, fn, *args), timeout=deadline)
+        except UNHEALTHY_ERRORS as e:
+            self.breaker.record_failure()
+            self.metrics.record(operation, (time.perf_counter() - started) * 1000, error=True)
+            raise GatewayUnavailable(f"Stripe {operation} failed: {e}") from e
+        except Exception:
+            # Client errors (bad request, declined card) say nothing about Stripe's health
+            self.breaker.record_success()
+            self.metrics.record(operation, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        self.breaker.record_success()
+        self.metrics.record(operation, (time.perf_counter() - started) * 1000)
+        return result
+
+    async def create_checkout_session(self, **params: Any) -> Any:
+        """
+        Create a Checkout Session.
+
+        Args:
+            **params: Session parameters (line_items, mode, success_url, ...)
+
+        Returns:
+            Session with at least id and url
+
+        Raises:
+            GatewayUnavailable: Circuit open, timeout or Stripe unreachable
+        """
+        return await self._call("checkout.sessions.create", self._create_checkout_session, params)
+
+    async def retrieve_checkout_session(self, session_id: str) -> Any:
+        """Retrieve a Checkout Session (id, url, payment_status)"""
+        return await self._call("checkout.sessions.retrieve", self._retrieve_checkout_session, session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "gateway": self.name,
+            "circuit": self.breaker.state,
+            "operations": self.metrics.snapshot()
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FakeStripeGateway(StripeGateway):
+    """In-memory Stripe Checkout for load tests: no network, simulated latency"""
+
+    name = "fake"
+
+    def __init__(self, max_workers: int, timeout_seconds: float, breaker: CircuitBreaker, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self._sessions: Dict[str, SimpleNamespace] = {}
+        self._lock = threading.Lock()
+        super().__init__(max_workers, timeout_seconds, breaker)
+
+    def _create_client(self) -> Optional[stripe.StripeClient]:
+        return None
+
+    def _create_checkout_session(self, params: Dict[str, Any]) -> Any:
+        time.sleep(self.latency_ms / 1000)
+        session_id = f"cs_fake_{uuid.uuid4().hex}"
+        session = SimpleNamespace(
+            id=session_id,
+            url=f"{settings.FRONTEND_URL}/fake-checkout/{session_id}",
+            payment_status="unpaid",
+            metadata=params.get("metadata", {})
+        )
+        with self._lock:
+            self._sessions[session_id] = session
+        return session
+
+    def _retrieve_checkout_session(self, session_id: str) -> Any:
+        time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise stripe.InvalidRequestError(f"No such checkout.session: '{session_id}'", "id")
+        return session
+
+    def mark_paid(self, session_id: str) -> None:
+        """Simulate the customer completing the payment"""
+        with self._lock:
+            self._sessions[session_id].payment_status = "paid"
+
+
+_gateway: Optional[StripeGateway] = None
+
+
+def get_gateway() -> StripeGateway:
+    """Shared gateway selected by STRIPE_GATEWAY ("stripe" or "fake")"""
+    global _gateway
+    if _gateway is None:
+        breaker = CircuitBreaker(settings.STRIPE_CIRCUIT_FAILURES, settings.STRIPE_CIRCUIT_RESET_SECONDS)
+        if settings.STRIPE_GATEWAY == "fake":
+            _gateway = FakeStripeGateway(
+                settings.STRIPE_MAX_WORKERS, settings.STRIPE_TIMEOUT_SECONDS, breaker, settings.STRIPE_FAKE_LATENCY_MS
+            )
+        else:
+            _gateway = StripeGateway(settings.STRIPE_MAX_WORKERS, settings.STRIPE_TIMEOUT_SECONDS, breaker)
+    return _gateway
+
+
+def shutdown_gateway() -> None:
+    """Stop the gateway thread pool (called on application shutdown)"""
+    global _gateway
+    if _gateway is not None:
+        _gateway.shutdown()
+        _gateway = None
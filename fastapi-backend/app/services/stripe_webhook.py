@@ -0,0 +1,194 @@
+"""
+Stripe Webhook Inbox
+Stripe events are verified (signature only, no network call), stored in the
+`stripe_events` inbox and acknowledged immediately. A background task started in
+the app lifespan processes them:
+
+    {_id: event id, type, object: data.object, status: pending | processing | done | failed,
+     attempts, availableAt, receivedAt, processedAt, outcome, error}
+
+- Dedupe: the event id is the _id, so a redelivered event is not stored twice
+- Claim: find_one_and_update of the oldest available event sets status "processing"
+  and pushes availableAt forward by STRIPE_EVENT_LOCK_SECONDS; an event whose
+  worker died becomes available again after that, so several workers never handle
+  the same event at once
+- Failures are retried with exponential backoff up to STRIPE_EVENT_MAX_ATTEMPTS
+- Done events expire after PAYMENT_EVENT_TTL_DAYS (TTL index on processedAt)
+
+Payments go through payment_service.confirm_payment with the same idempotency key
+as /verify-stripe ("stripe:<sessionId>"), so both paths confirm an order once.
+"""
+
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config.database import get_collection
+from app.config.settings import settings
+from app.services.cart_service import CartOwner, clear_cart
+from app.services.payment_service import CONFIRMED, cancel_unpaid_order, confirm_payment
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "stripe_events"
+
+PAID_EVENTS = {"checkout.session.completed", "checkout.session.async_payment_succeeded"}
+FAILED_EVENTS = {"checkout.session.expired", "checkout.session.async_payment_failed"}
+
+_task: Optional[asyncio.Task] = None
+_wakeup = asyncio.Event()
+
+
+async def enqueue_event(event: Dict[str, Any]) -> bool:
+    """
+    Store a verified Stripe event in the inbox.
+
+    Args:
+        event: Parsed webhook payload
+
+    Returns:
+        False if the event had already been received
+    """
+    events_collection = await get_collection(COLLECTION_NAME)
+    now = datetime.utcnow()
+    try:
+        await events_collection.insert_one({
+            "_id": event["id"],
+            "type": event.get("type"),
+            "object": event.get("data", {}).get("object", {}),
+            "status": "pending",
+            "attempts": 0,
+            "availableAt": now,
+            "receivedAt": now
+        })
+    except DuplicateKeyError:
+        return False
+    _wakeup.set()
+    return True
+
+
+def _order_filter(session: Dict[str, Any]) -> Dict[str, Any]:
+    order_id = (session.get("metadata") or {}).get("orderId")
+    if order_id and ObjectId.is_valid(order_id):
+        return {"_id": ObjectId(order_id)}
+    return {"stripeSessionId": session.get("id")}
+
+
+async def handle_event(event: Dict[str, Any]) -> str:
+    """
+    Apply one inbox event to its order.
+
+    Returns:
+        Outcome stored on the event
+    """
+    session = event.get("object", {})
+    if event.get("type") in PAID_EVENTS:
+        # checkout.session.completed with a delayed payment method is not paid yet
+        if session.get("payment_status") != "paid":
+            return "awaiting_payment"
+        payment_fields = {"stripeSessionId": session["id"]}
+        if session.get("payment_intent"):
+            payment_fields["stripePaymentIntent"] = session["payment_intent"]
+        result = await confirm_payment(
+            _order_filter(session),
+            provider="Stripe",
+            idempotency_key=f"stripe:{session['id']}",
+            payment_fields=payment_fields
+        )
+        if result["outcome"] == CONFIRMED and not result["replayed"] and result["userId"]:
+            await clear_cart(CartOwner(user_id=result["userId"]))
+        return result["outcome"]
+
+    if event.get("type") in FAILED_EVENTS:
+        cancelled = await cancel_unpaid_order(_order_filter(session))
+        return "cancelled" if cancelled else "not_pending"
+
+    return "ignored"
+
+
+async def _claim_event() -> Optional[Dict[str, Any]]:
+    events_collection = await get_collection(COLLECTION_NAME)
+    now = datetime.utcnow()
+    return await events_collection.find_one_and_update(
+        {"status": {"$in": ["pending", "processing"]}, "availableAt": {"$lte": now}},
+        {
+            "$set": {"status": "processing", "availableAt": now + timedelta(seconds=settings.STRIPE_EVENT_LOCK_SECONDS)},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("availableAt", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def process_pending_events(limit: int = 100) -> int:
+    """
+    Process up to `limit` available inbox events.
+
+    Returns:
+        Number of events handled (done, failed or rescheduled)
+    """
+    events_collection = await get_collection(COLLECTION_NAME)
+    handled = 0
+    while handled < limit:
+        event = await _claim_event()
+        if not event:
+            break
+        handled += 1
+        try:
+            outcome = await handle_event(event)
+            await events_collection.update_one(
+                {"_id": event["_id"]},
+                {"$set": {"status": "done", "outcome": outcome, "processedAt": datetime.utcnow()}, "$unset": {"error": ""}}
+            )
+        except Exception as e:
+            failed = event["attempts"] >= settings.STRIPE_EVENT_MAX_ATTEMPTS
+            retry_at = datetime.utcnow() + timedelta(seconds=2 ** event["attempts"])
+            await events_collection.update_one(
+                {"_id": event["_id"]},
+                {"$set": {"status": "failed" if failed else "pending", "availableAt": retry_at, "error": str(e)}}
+            )
+            logger.error(f"Stripe event {event['_id']} ({event.get('type')}) attempt {event['attempts']} failed: {e}")
+    return handled
+
+
+async def _run_forever(poll_seconds: float) -> None:
+    while True:
+        try:
+            await process_pending_events()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stripe inbox run failed: {e}")
+        # New events wake the worker; the poll picks up retries and other workers' events
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def start_stripe_worker() -> Optional[asyncio.Task]:
+    """Start the background inbox worker (no-op if already running)"""
+    global _task
+    if _task and not _task.done():
+        return _task
+    _task = asyncio.create_task(_run_forever(settings.STRIPE_EVENT_POLL_SECONDS))
+    logger.info("Stripe webhook worker started")
+    return _task
+
+
+async def stop_stripe_worker() -> None:
+    """Cancel the background inbox worker and wait for it to stop"""
+    global _task
+    if _task and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
@@ -0,0 +1,139 @@
+"""
+VNPay Gateway Adapter
+Builds signed payment URLs and verifies VNPay callbacks (browser return and IPN).
+
+VNPay signs the query string of all vnp_* params sorted by name, values encoded with
+quote_plus, using HMAC-SHA512 with the merchant hash secret:
+- The HMAC key schedule is computed once per gateway; each signature copies the
+  keyed HMAC object instead of re-deriving it from the secret
+- Params are sorted and encoded in a single pass, and the same encoded string is
+  both hashed and used as the URL query (urlencode uses quote_plus too), so
+  nothing is encoded twice. Constant params (version, merchant code, return URL)
+  are encoded once at construction
+- Signatures are compared in constant time, case-insensitively (VNPay may send
+  upper-case hex)
+
+Nothing here logs the hash secret or the signed data.
+"""
+
+from typing import Dict, Mapping, Optional
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus
+import hashlib
+import hmac
+
+from app.config.settings import settings
+
+HASH_PARAMS = ("vnp_SecureHash", "vnp_SecureHashType")
+
+
+class VNPayGateway:
+    """Signing and verification for one merchant (tmn code + hash secret)"""
+
+    def __init__(self, tmn_code: str, hash_secret: str, payment_url: str, return_url: str):
+        self.tmn_code = tmn_code
+        self.payment_url = payment_url
+        self._mac = hmac.new(hash_secret.encode("utf-8"), digestmod=hashlib.sha512)
+        # Encoded once: the same for every payment URL of this merchant
+        self._static_params = {
+            "vnp_Version": "2.1.0",
+            "vnp_Command": "pay",
+            "vnp_TmnCode": tmn_code,
+            "vnp_CurrCode": "VND",
+            "vnp_OrderType": "other",
+            "vnp_Locale": "vn",
+            "vnp_ReturnUrl": return_url,
+        }
+        self._static_encoded = {key: quote_plus(value) for key, value in self._static_params.items()}
+
+    @staticmethod
+    def encode(params: Mapping[str, object], encoded: Optional[Mapping[str, str]] = None) -> str:
+        """
+        Canonical query string: vnp_* params sorted by name, values quote_plus-encoded.
+
+        Args:
+            params: Params to encode (vnp_SecureHash / vnp_SecureHashType and non-vnp_ keys are skipped)
+            encoded: Already encoded values for some of the keys
+        """
+        encoded = encoded or {}
+        return "&".join(
+            f"{key}={encoded[key] if key in encoded else quote_plus(str(params[key]))}"
+            for key in sorted(params)
+            if key.startswith("vnp_") and key not in HASH_PARAMS
+        )
+
+    def sign_encoded(self, query: str) -> str:
+        """HMAC-SHA512 hex digest of an encoded query string"""
+        mac = self._mac.copy()
+        mac.update(query.encode("utf-8"))
+        return mac.hexdigest()
+
+    def sign(self, params: Mapping[str, object]) -> str:
+        """vnp_SecureHash of these params"""
+        return self.sign_encoded(self.encode(params))
+
+    def verify(self, params: Mapping[str, str]) -> bool:
+        """Whether vnp_SecureHash of a VNPay callback matches its other vnp_* params"""
+        received = params.get("vnp_SecureHash")
+        if not received:
+            return False
+        return hmac.compare_digest(self.sign(params), received.lower())
+
+    def build_payment_url(
+        self,
+        order_id: str,
+        amount: float,
+        order_info: str,
+        ip_addr: str,
+        created_at: Optional[datetime] = None,
+        expire_minutes: Optional[int] = None
+    ) -> str:
+        """
+        Signed VNPay payment URL.
+
+        Args:
+            order_id: Order _id, sent as vnp_TxnRef
+            amount: Amount in VND (VNPay receives amount * 100)
+            order_info: Order description
+            ip_addr: Customer IP
+            created_at: Payment creation time (VNPay local time, defaults to now)
+            expire_minutes: Payment page lifetime (defaults to PENDING_ORDER_TTL_MINUTES,
+                so it expires together with the pending order, see order_reaper)
+
+        Returns:
+            Full payment URL
+        """
+        created_at = created_at or datetime.now()
+        expire_minutes = expire_minutes or settings.PENDING_ORDER_TTL_MINUTES
+        params = {
+            **self._static_params,
+            "vnp_Amount": str(int(amount * 100)),
+            "vnp_TxnRef": order_id,
+            "vnp_OrderInfo": order_info,
+            "vnp_IpAddr": ip_addr,
+            "vnp_CreateDate": created_at.strftime("%Y%m%d%H%M%S"),
+            "vnp_ExpireDate": (created_at + timedelta(minutes=expire_minutes)).strftime("%Y%m%d%H%M%S"),
+        }
+        query = self.encode(params, self._static_encoded)
+        return f"{self.payment_url}?{query}&vnp_SecureHash={self.sign_encoded(query)}"
+
+
+_gateway: Optional[VNPayGateway] = None
+
+
+def get_gateway() -> VNPayGateway:
+    """Shared gateway for the configured merchant"""
+    global _gateway
+    if _gateway is None:
+        _gateway = VNPayGateway(
+            settings.VNPAY_TMN_CODE,
+            settings.VNPAY_HASH_SECRET,
+            settings.VNPAY_URL,
+            settings.VNPAY_RETURN_URL
+        )
+    return _gateway
+
+
+def is_successful_payment(params: Dict[str, str]) -> bool:
+    """VNPay reports success with vnp_ResponseCode 00 (and vnp_TransactionStatus 00 when present)"""
+    return params.get("vnp_ResponseCode") == "00" and params.get("vnp_TransactionStatus", "00") == "00"
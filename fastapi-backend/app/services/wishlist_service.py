@@ -0,0 +1,207 @@
+"""
+Wishlist Service
+Wishlists are stored as one document per (user, product) in `wishlist_items`:
+    {userId: str, productId: str, addedAt: datetime}
+- Unique index on (userId, productId): adding twice is rejected by the index, no array scan
+- Index on (userId, addedAt) serves the newest-first list and counts
+- Membership checks use each user's set of wishlisted product ids, loaded with one
+  index-covered query and cached in memory (LRU + TTL); add/remove/clear invalidate it
+
+The cache is per process. A write invalidates the entry only in the worker that
+handled it; with several uvicorn workers the others keep serving their cached set
+for up to WISHLIST_CACHE_TTL_SECONDS. Only membership flags on product grids read
+it: the wishlist page itself (list_items) always queries the collection.
+
+The old layout (one `wishlists` document per user with a `products` array) is
+moved into `wishlist_items` the first time a user's wishlist is touched.
+"""
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import time
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.config.database import get_collection
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "wishlist_items"
+LEGACY_COLLECTION_NAME = "wishlists"
+
+# Users whose legacy wishlist document has already been migrated (per process, LRU).
+# Forgetting a user only costs one more find_one on the legacy collection.
+_migrated_users: "OrderedDict[str, None]" = OrderedDict()
+
+
+def _remember_migrated(user_id: str) -> None:
+    _migrated_users[user_id] = None
+    _migrated_users.move_to_end(user_id)
+    while len(_migrated_users) > settings.WISHLIST_CACHE_SIZE:
+        _migrated_users.popitem(last=False)
+
+
+async def migrate_legacy_wishlist(user_id: str) -> int:
+    """
+    Move a user's legacy `wishlists.products` array into `wishlist_items` (once per process).
+
+    Returns:
+        Number of items moved
+    """
+    if user_id in _migrated_users:
+        _migrated_users.move_to_end(user_id)
+        return 0
+
+    legacy_collection = await get_collection(LEGACY_COLLECTION_NAME)
+    legacy = await legacy_collection.find_one({"userId": user_id})
+    moved = 0
+    if legacy and legacy.get("products"):
+        items_collection = await get_collection(COLLECTION_NAME)
+        docs = [
+            {"userId": user_id, "productId": item["productId"], "addedAt": item.get("addedAt") or datetime.utcnow()}
+            for item in legacy["products"]
+        ]
+        try:
+            result = await items_collection.insert_many(docs, ordered=False)
+            moved = len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Duplicates were already migrated by a concurrent request
+            moved = e.details.get("nInserted", 0)
+        logger.info(f"Moved {moved} legacy wishlist items of user {user_id}")
+    if legacy:
+        await legacy_collection.delete_one({"_id": legacy["_id"]})
+
+    _remember_migrated(user_id)
+    return moved
+
+
+class WishlistSetCache:
+    """
+    LRU of user id -> frozenset of wishlisted product ids, each entry valid for ttl_seconds.
+
+    A loader takes a generation() before querying and passes it to put(); if the
+    user's entry was invalidated in between (a concurrent add/remove), the stale
+    set it read is returned to the caller but not cached.
+    """
+
+    def __init__(self, capacity: int = settings.WISHLIST_CACHE_SIZE, ttl_seconds: float = settings.WISHLIST_CACHE_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # user id -> (expires_at, product ids)
+        self._clock = 0
+        # user id -> generation of its last invalidation (LRU, same capacity)
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        # Highest generation dropped from _invalidated; loads older than it are not cached
+        self._forgotten = 0
+
+    def generation(self) -> int:
+        return self._clock
+
+    def get(self, user_id: str) -> Optional[FrozenSet[str]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user_id: str, product_ids: Iterable[str], generation: Optional[int] = None) -> FrozenSet[str]:
+        ids = frozenset(product_ids)
+        if generation is not None and (
+            generation < self._forgotten or self._invalidated.get(user_id, -1) > generation
+        ):
+            return ids
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, ids)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return ids
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+        self._clock += 1
+        self._invalidated[user_id] = self._clock
+        self._invalidated.move_to_end(user_id)
+        while len(self._invalidated) > self.capacity:
+            _, forgotten = self._invalidated.popitem(last=False)
+            self._forgotten = max(self._forgotten, forgotten)
+
+
+# Shared cache, invalidated by every write below
+wishlist_sets = WishlistSetCache()
+
+
+async def get_wishlist_set(user_id: str) -> FrozenSet[str]:
+    """All product ids in a user's wishlist, from the cache or one index-covered query"""
+    cached = wishlist_sets.get(user_id)
+    if cached is not None:
+        return cached
+    generation = wishlist_sets.generation()
+    await migrate_legacy_wishlist(user_id)
+    items_collection = await get_collection(COLLECTION_NAME)
+    # Filter and projection only use (userId, productId): answered from the unique index
+    cursor = items_collection.find({"userId": user_id}, {"_id": 0, "productId": 1})
+    return wishlist_sets.put(user_id, [doc["productId"] async for doc in cursor], generation)
+
+
+async def add_item(user_id: str, product_id: str) -> bool:
+    """Add a product; returns False if it was already in the wishlist"""
+    await migrate_legacy_wishlist(user_id)
+    items_collection = await get_collection(COLLECTION_NAME)
+    try:
+        await items_collection.insert_one({"userId": user_id, "productId": product_id, "addedAt": datetime.utcnow()})
+        return True
+    except DuplicateKeyError:
+        return False
+    finally:
+        wishlist_sets.invalidate(user_id)
+
+
+async def remove_item(user_id: str, product_id: str) -> bool:
+    """Remove a product; returns False if it was not in the wishlist"""
+    await migrate_legacy_wishlist(user_id)
+    items_collection = await get_collection(COLLECTION_NAME)
+    result = await items_collection.delete_one({"userId": user_id, "productId": product_id})
+    wishlist_sets.invalidate(user_id)
+    return result.deleted_count > 0
+
+
+async def clear_items(user_id: str) -> int:
+    """Remove every product from a user's wishlist"""
+    await migrate_legacy_wishlist(user_id)
+    items_collection = await get_collection(COLLECTION_NAME)
+    result = await items_collection.delete_many({"userId": user_id})
+    wishlist_sets.invalidate(user_id)
+    return result.deleted_count
+
+
+async def count_items(user_id: str) -> int:
+    return len(await get_wishlist_set(user_id))
+
+
+async def contains_many(user_id: str, product_ids: Iterable[str]) -> Set[str]:
+    """
+    Which of these products are in the user's wishlist.
+    A whole product page is answered from the cached set (at most one query on a miss).
+
+    Returns:
+        Set of wishlisted product ids
+    """
+    wishlisted = await get_wishlist_set(user_id)
+    return {product_id for product_id in product_ids if product_id in wishlisted}
+
+
+async def list_items(user_id: str) -> List[Dict[str, Any]]:
+    """Wishlist entries, newest first: [{productId, addedAt}]"""
+    await migrate_legacy_wishlist(user_id)
+    items_collection = await get_collection(COLLECTION_NAME)
+    cursor = items_collection.find(
+        {"userId": user_id},
+        {"_id": 0, "productId": 1, "addedAt": 1}
+    ).sort("addedAt", -1)
+    return await cursor.to_list(length=None)
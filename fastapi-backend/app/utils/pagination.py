@@ -0,0 +1,83 @@
+"""
+Keyset (cursor) Pagination Utilities
+- A sort is a list of (field, direction) pairs ending with _id, so the order is total
+- encode_cursor() stores the sort key of the last document of a page in an opaque,
+  URL-safe string; datetimes and ObjectIds are tagged so they decode to the same type
+- keyset_filter() selects the documents strictly after that key, which a compound
+  index on the same fields answers without skipping
+"""
+
+from typing import Any, Dict, List, Tuple
+from datetime import datetime
+import base64
+import binascii
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+Sort = List[Tuple[str, int]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"d": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"o": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "d" in value:
+            return datetime.fromisoformat(value["d"])
+        if "o" in value:
+            return ObjectId(value["o"])
+        raise ValueError("unknown cursor value")
+    return value
+
+
+def encode_cursor(doc: Dict[str, Any], sort: Sort) -> str:
+    """Opaque cursor holding the sort key of `doc` (the last document of a page)"""
+    values = [_encode_value(doc.get(field)) for field, _ in sort]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: Sort) -> List[Any]:
+    """Inverse of encode_cursor (raises ValueError for a malformed cursor)"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise ValueError("cursor does not match sort")
+        return [_decode_value(value) for value in values]
+    except (binascii.Error, UnicodeDecodeError, TypeError, InvalidId, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def keyset_filter(sort: Sort, values: List[Any]) -> Dict[str, Any]:
+    """
+    Filter for documents strictly after `values` in `sort` order:
+    (a > va) OR (a = va AND b > vb) OR ... with $lt for descending keys.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def page_of(docs: List[Dict[str, Any]], limit: int, sort: Sort) -> Dict[str, Any]:
+    """
+    Split a result fetched with limit + 1 into a page.
+
+    Returns:
+        {"items", "nextCursor", "hasMore"}
+    """
+    has_more = len(docs) > limit
+    items = docs[:limit]
+    return {
+        "items": items,
+        "nextCursor": encode_cursor(items[-1], sort) if has_more else None,
+        "hasMore": has_more
+    }
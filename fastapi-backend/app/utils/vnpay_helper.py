@@ -1,13 +1,12 @@
 """
 VNPay Payment Helper Functions
 Xử lý tạo URL thanh toán và verify signature từ VNPay
+(ký / xác minh nằm trong app.services.vnpay_gateway.VNPayGateway)
 """
 import hashlib
 import hmac
-import urllib.parse
-from datetime import datetime
 from typing import Dict
-from app.config.settings import settings
+from app.services.vnpay_gateway import VNPayGateway, get_gateway
 
 
 def sort_params(params: Dict) -> Dict:
@@ -28,33 +27,8 @@ def create_secure_hash(params: Dict, secret_key: str) -> str:
     Returns:
         Hex string của HMAC SHA512 hash
     """
-    # Sort params theo alphabet
-    sorted_params = sort_params(params)
-    
-    # Tạo query string - VNPay yêu cầu URL encode các giá trị
-    hash_data_parts = []
-    for key, value in sorted_params.items():
-        # URL encode value theo chuẩn VNPay
-        encoded_value = urllib.parse.quote_plus(str(value))
-        hash_data_parts.append(f"{key}={encoded_value}")
-    
-    hash_data = "&".join(hash_data_parts)
-    
-    # Debug logging
-    print(f"🔐 Creating secure hash:")
-    print(f"   Hash data: {hash_data}")
-    print(f"   Secret key: {secret_key}")
-    
-    # HMAC SHA512
-    secure_hash = hmac.new(
-        secret_key.encode('utf-8'),
-        hash_data.encode('utf-8'),
-        hashlib.sha512
-    ).hexdigest()
-    
-    print(f"   Generated hash: {secure_hash}")
-    
-    return secure_hash
+    hash_data = VNPayGateway.encode(params)
+    return hmac.new(secret_key.encode('utf-8'), hash_data.encode('utf-8'), hashlib.sha512).hexdigest()
 
 
 def create_payment_url(
@@ -75,38 +49,7 @@ def create_payment_url(
     Returns:
         VNPay payment URL đầy đủ
     """
-    # Chuẩn bị params theo VNPay specification
-    params = {
-        'vnp_Version': '2.1.0',
-        'vnp_Command': 'pay',
-        'vnp_TmnCode': settings.VNPAY_TMN_CODE,
-        'vnp_Amount': str(int(amount * 100)),  # VNPay yêu cầu amount * 100
-        'vnp_CurrCode': 'VND',
-        'vnp_TxnRef': order_id,  # Mã đơn hàng để tracking
-        'vnp_OrderInfo': order_info,  # Sẽ được URL encode trong create_secure_hash
-        'vnp_OrderType': 'other',
-        'vnp_Locale': 'vn',
-        'vnp_ReturnUrl': settings.VNPAY_RETURN_URL,
-        'vnp_IpAddr': ip_addr,
-        'vnp_CreateDate': datetime.now().strftime('%Y%m%d%H%M%S')
-    }
-    
-    print(f"🔍 VNPay Payment URL Creation:")
-    print(f"   Order ID: {order_id}")
-    print(f"   Amount: {amount} VND")
-    print(f"   Amount for VNPay (x100): {int(amount * 100)}")
-    print(f"   TMN Code: {settings.VNPAY_TMN_CODE}")
-    print(f"   Return URL: {settings.VNPAY_RETURN_URL}")
-    
-    # Tạo secure hash
-    secure_hash = create_secure_hash(params, settings.VNPAY_HASH_SECRET)
-    params['vnp_SecureHash'] = secure_hash
-    
-    # Build URL với query string
-    query_string = urllib.parse.urlencode(params)
-    payment_url = f"{settings.VNPAY_URL}?{query_string}"
-    
-    return payment_url
+    return get_gateway().build_payment_url(order_id, amount, order_info, ip_addr)
 
 
 def verify_payment_signature(params: Dict) -> bool:
@@ -119,27 +62,7 @@ def verify_payment_signature(params: Dict) -> bool:
     Returns:
         True nếu signature hợp lệ, False nếu không
     """
-    # Lấy signature từ params
-    vnp_secure_hash = params.get('vnp_SecureHash')
-    if not vnp_secure_hash:
-        print("❌ No vnp_SecureHash in params")
-        return False
-    
-    # Loại bỏ vnp_SecureHash và vnp_SecureHashType khỏi params
-    verify_params = {k: v for k, v in params.items() 
-                     if k not in ['vnp_SecureHash', 'vnp_SecureHashType']}
-    
-    # Tạo hash từ params còn lại
-    calculated_hash = create_secure_hash(verify_params, settings.VNPAY_HASH_SECRET)
-    
-    # Debug logging
-    print(f"🔍 VNPay Signature Verification:")
-    print(f"   Received hash: {vnp_secure_hash}")
-    print(f"   Calculated hash: {calculated_hash}")
-    print(f"   Match: {calculated_hash == vnp_secure_hash}")
-    
-    # So sánh hash
-    return calculated_hash == vnp_secure_hash
+    return get_gateway().verify(params)
 
 
 def get_client_ip(request) -> str:
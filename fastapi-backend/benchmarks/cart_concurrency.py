@@ -0,0 +1,139 @@
+"""
+Cart concurrency benchmark
+Fires concurrent "add to cart" requests for one user against a real MongoDB and
+compares the old read-modify-write of the whole cartData map with the atomic
+per-line $inc used by cart_service. Reports lost updates, latency and write size.
+
+Needs a reachable MongoDB (MONGODB_URL). Runs in a scratch database
+<DATABASE_NAME>_benchmark which is dropped afterwards.
+
+Usage (from fastapi-backend/):
+    python -m benchmarks.cart_concurrency
+    python -m benchmarks.cart_concurrency --requests 500 --concurrency 50 --lines 40
+"""
+
+from typing import List, Dict, Any, Callable, Awaitable
+import argparse
+import asyncio
+import time
+
+import bson
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.settings import settings
+from benchmarks.rag_benchmark import percentile
+
+SIZES = ["S", "M", "L", "XL"]
+
+AddFn = Callable[[Any, ObjectId, str, str], Awaitable[int]]
+
+
+async def legacy_add(collection, user_id: ObjectId, item_id: str, size: str) -> int:
+    """Previous behaviour: read cartData, mutate in Python, $set the whole map back"""
+    user = await collection.find_one({"_id": user_id})
+    cart_data = user.get("cartData", {})
+    cart_data.setdefault(item_id, {})
+    cart_data[item_id][size] = cart_data[item_id].get(size, 0) + 1
+    update = {"$set": {"cartData": cart_data}}
+    await collection.update_one({"_id": user_id}, update)
+    return len(bson.encode(update))
+
+
+async def atomic_add(collection, user_id: ObjectId, item_id: str, size: str) -> int:
+    """Current behaviour: $inc on cartData.<itemId>.<size> only"""
+    update = {"$inc": {f"cartData.{item_id}.{size}": 1}}
+    await collection.update_one({"_id": user_id}, update)
+    return len(bson.encode(update))
+
+
+STRATEGIES: Dict[str, AddFn] = {
+    "read-modify-write": legacy_add,
+    "atomic-inc": atomic_add,
+}
+
+
+async def run_strategy(
+    collection,
+    name: str,
+    add: AddFn,
+    lines: List[tuple],
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """
+    Run `requests` adds spread round-robin over `lines` with at most `concurrency` in flight.
+
+    Returns:
+        {"strategy", "expected", "stored", "lost", "p50_ms", "p95_ms", "avg_write_bytes"}
+    """
+    user_id = (await collection.insert_one({"cartData": {}})).inserted_id
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies_ms: List[float] = []
+    write_bytes: List[int] = []
+
+    async def one(i: int):
+        item_id, size = lines[i % len(lines)]
+        async with semaphore:
+            started = time.perf_counter()
+            write_bytes.append(await add(collection, user_id, item_id, size))
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    total_s = time.perf_counter() - started
+
+    cart = (await collection.find_one({"_id": user_id}))["cartData"]
+    stored = sum(qty for sizes in cart.values() for qty in sizes.values())
+
+    return {
+        "strategy": name,
+        "expected": requests,
+        "stored": stored,
+        "lost": requests - stored,
+        "throughput": requests / total_s if total_s else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "avg_write_bytes": sum(write_bytes) / len(write_bytes) if write_bytes else 0
+    }
+
+
+async def run_benchmark(requests: int = 200, concurrency: int = 20, line_count: int = 10) -> List[Dict[str, Any]]:
+    client = AsyncIOMotorClient(settings.MONGODB_URL, tlsAllowInvalidCertificates=True)
+    db_name = f"{settings.DATABASE_NAME}_benchmark"
+    collection = client[db_name]["users"]
+    lines = [(str(ObjectId()), SIZES[i % len(SIZES)]) for i in range(max(1, line_count))]
+
+    try:
+        return [
+            await run_strategy(collection, name, add, lines, requests, concurrency)
+            for name, add in STRATEGIES.items()
+        ]
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    lines = [f"{'strategy':<18} {'expected':>8} {'stored':>7} {'lost':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'write B':>8}"]
+    for r in reports:
+        lines.append(
+            f"{r['strategy']:<18} {r['expected']:>8} {r['stored']:>7} {r['lost']:>5} {r['throughput']:>8.0f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['avg_write_bytes']:>8.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent cart update benchmark (needs MongoDB)")
+    parser.add_argument("--requests", type=int, default=200, help="Total add-to-cart requests per strategy")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at once")
+    parser.add_argument("--lines", type=int, default=10, help="Distinct (product, size) lines in the cart")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run_benchmark(args.requests, args.concurrency, args.lines))
+    print(format_report(reports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Bulk discount benchmark
+Applies and removes a category-wide discount on a large category against a real
+MongoDB and compares the previous handlers (load all products, one update_one per
+product) with discount_service (one bulk_write / one pipeline update_many).
+
+After each apply every product must have offerPrice == calculate_offer_price(price,
+percent), after each remove offerPrice == price; mismatches are reported.
+
+Needs a reachable MongoDB (MONGODB_URL). Runs in a scratch database
+<DATABASE_NAME>_benchmark which is dropped afterwards.
+
+Usage (from fastapi-backend/):
+    python -m benchmarks.discount_bulk
+    python -m benchmarks.discount_bulk --products 10000 --percent 15
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from datetime import datetime
+import argparse
+import asyncio
+import random
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config import database
+from app.config.settings import settings
+from app.services import discount_service
+from app.services.discount_service import calculate_offer_price
+
+CATEGORY = "Benchmark"
+
+ApplyFn = Callable[[Dict[str, Any], float], Awaitable[Any]]
+RemoveFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+async def legacy_apply(query: Dict[str, Any], percent: float) -> None:
+    """Previous behaviour: to_list, then one update_one per product"""
+    products_collection = await database.get_collection("products")
+    products = await products_collection.find(query).to_list(length=None)
+    for product in products:
+        await products_collection.update_one(
+            {"_id": product["_id"]},
+            {"$set": {
+                "hasDiscount": True,
+                "discountPercent": round(percent, 2),
+                "offerPrice": calculate_offer_price(product["price"], percent),
+                "updatedAt": datetime.utcnow()
+            }}
+        )
+
+
+async def legacy_remove(query: Dict[str, Any]) -> None:
+    products_collection = await database.get_collection("products")
+    products = await products_collection.find(query).to_list(length=None)
+    for product in products:
+        await products_collection.update_one(
+            {"_id": product["_id"]},
+            {"$set": {
+                "hasDiscount": False,
+                "discountPercent": 0.0,
+                "offerPrice": product["price"],
+                "updatedAt": datetime.utcnow()
+            }, "$unset": {"discountStartDate": "", "discountEndDate": ""}}
+        )
+
+
+async def bulk_apply(query: Dict[str, Any], percent: float) -> None:
+    await discount_service.apply_discount(query, percent)
+
+
+async def bulk_remove(query: Dict[str, Any]) -> None:
+    await discount_service.remove_discount(query)
+
+
+STRATEGIES: Dict[str, Tuple[ApplyFn, RemoveFn]] = {
+    "per-product": (legacy_apply, legacy_remove),
+    "bulk": (bulk_apply, bulk_remove),
+}
+
+
+async def seed(product_count: int) -> None:
+    """One category of product_count products with VND prices (not multiples of 1000)"""
+    products_collection = await database.get_collection("products")
+    await products_collection.delete_many({})
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    docs = []
+    for i in range(product_count):
+        price = rng.randrange(99_000, 2_500_000, 500)
+        docs.append({
+            "name": f"Benchmark product {i}",
+            "category": CATEGORY,
+            "price": price,
+            "offerPrice": price,
+            "hasDiscount": False,
+            "discountPercent": 0.0,
+            "inStock": True,
+            "createdAt": now
+        })
+    await products_collection.insert_many(docs)
+
+
+async def count_mismatches(percent: float) -> int:
+    """Products whose offerPrice is not the expected one for this percent (0 = removed)"""
+    products_collection = await database.get_collection("products")
+    return sum([
+        1
+        async for p in products_collection.find({"category": CATEGORY}, {"price": 1, "offerPrice": 1})
+        if p["offerPrice"] != (calculate_offer_price(p["price"], percent) if percent else p["price"])
+    ])
+
+
+async def run_strategy(name: str, apply: ApplyFn, remove: RemoveFn, product_count: int, percent: float) -> Dict[str, Any]:
+    """
+    Apply then remove a discount on the whole category.
+
+    Returns:
+        {"strategy", "products", "apply_ms", "remove_ms", "mismatches"}
+    """
+    await seed(product_count)
+
+    started = time.perf_counter()
+    await apply({"category": CATEGORY, "inStock": True}, percent)
+    apply_ms = (time.perf_counter() - started) * 1000
+    mismatches = await count_mismatches(percent)
+
+    started = time.perf_counter()
+    await remove({"category": CATEGORY, "hasDiscount": True})
+    remove_ms = (time.perf_counter() - started) * 1000
+    mismatches += await count_mismatches(0)
+
+    return {
+        "strategy": name,
+        "products": product_count,
+        "apply_ms": apply_ms,
+        "remove_ms": remove_ms,
+        "mismatches": mismatches,
+    }
+
+
+async def run_benchmark(product_count: int = 10000, percent: float = 15.0) -> List[Dict[str, Any]]:
+    db_name = f"{settings.DATABASE_NAME}_benchmark"
+    settings.DATABASE_NAME = db_name
+    database.db.client = AsyncIOMotorClient(settings.MONGODB_URL, tlsAllowInvalidCertificates=True)
+
+    try:
+        return [
+            await run_strategy(name, apply, remove, product_count, percent)
+            for name, (apply, remove) in STRATEGIES.items()
+        ]
+    finally:
+        await database.db.client.drop_database(db_name)
+        database.db.client.close()
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    lines = [f"{'strategy':<12} {'products':>8} {'apply ms':>10} {'remove ms':>10} {'mismatches':>10}"]
+    for r in reports:
+        lines.append(
+            f"{r['strategy']:<12} {r['products']:>8} {r['apply_ms']:>10.0f} {r['remove_ms']:>10.0f} {r['mismatches']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Category-wide discount benchmark (needs MongoDB)")
+    parser.add_argument("--products", type=int, default=10000, help="Products in the discounted category")
+    parser.add_argument("--percent", type=float, default=15.0, help="Discount percentage")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run_benchmark(args.products, args.percent))
+    print(format_report(reports))
+    if reports[-1]["mismatches"]:
+        raise SystemExit("bulk discount produced offer prices different from calculate_offer_price")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Payment confirmation concurrency benchmark
+Fires many concurrent confirmations (duplicate provider callbacks, client retries)
+for the same pending orders against a real MongoDB and checks that each order is
+paid once and its stock is taken once. Compares the previous check-then-write
+handler with payment_service.confirm_payment.
+
+Every strategy must end with stock == initial - quantity of the orders; any extra
+decrement is reported as "oversold".
+
+Needs a reachable MongoDB (MONGODB_URL). Runs in a scratch database
+<DATABASE_NAME>_benchmark which is dropped afterwards.
+
+Usage (from fastapi-backend/):
+    python -m benchmarks.payment_concurrency
+    python -m benchmarks.payment_concurrency --orders 50 --callbacks 20 --concurrency 100
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List
+from datetime import datetime
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config import database
+from app.config.settings import settings
+from app.services.payment_service import confirm_payment
+from benchmarks.rag_benchmark import percentile
+
+INITIAL_STOCK = 1_000_000
+ITEMS_PER_ORDER = 3
+
+ConfirmFn = Callable[[ObjectId, int], Awaitable[Any]]
+
+
+async def legacy_confirm(order_id: ObjectId, attempt: int) -> None:
+    """Previous behaviour: read isPaid, then take stock item by item and $set paid"""
+    orders_collection = await database.get_collection("orders")
+    products_collection = await database.get_collection("products")
+    order = await orders_collection.find_one({"_id": order_id})
+    if order.get("isPaid"):
+        return
+    for item in order["items"]:
+        await products_collection.update_one(
+            {"_id": ObjectId(item["product"]["_id"])},
+            {"$inc": {"quantity": -item["quantity"]}}
+        )
+    await orders_collection.update_one(
+        {"_id": order_id},
+        {"$set": {"isPaid": True, "status": "Order Placed", "paidAt": datetime.utcnow()}}
+    )
+
+
+async def engine_confirm(order_id: ObjectId, attempt: int) -> None:
+    """Current behaviour: atomic unpaid -> paid transition plus idempotency key"""
+    await confirm_payment(
+        {"_id": order_id},
+        provider="VNPay",
+        # Half of the callbacks repeat the same key (provider retries), half are new (client verifications)
+        idempotency_key=f"bench:{order_id}:{attempt % 2}"
+    )
+
+
+STRATEGIES: Dict[str, ConfirmFn] = {
+    "check-then-write": legacy_confirm,
+    "atomic-transition": engine_confirm,
+}
+
+
+async def seed(order_count: int) -> Dict[str, Any]:
+    """Products with INITIAL_STOCK and pending orders over them; returns expected stock"""
+    products_collection = await database.get_collection("products")
+    orders_collection = await database.get_collection("orders")
+    await products_collection.delete_many({})
+    await orders_collection.delete_many({})
+    await (await database.get_collection("payment_events")).delete_many({})
+
+    product_ids = [ObjectId() for _ in range(ITEMS_PER_ORDER * 2)]
+    await products_collection.insert_many([{"_id": pid, "quantity": INITIAL_STOCK} for pid in product_ids])
+
+    expected = {str(pid): INITIAL_STOCK for pid in product_ids}
+    orders = []
+    for i in range(order_count):
+        items = []
+        for j in range(ITEMS_PER_ORDER):
+            pid = product_ids[(i + j) % len(product_ids)]
+            items.append({"product": {"_id": str(pid)}, "quantity": 1 + j})
+            expected[str(pid)] -= 1 + j
+        orders.append({"status": "Pending Payment", "isPaid": False, "items": items, "createdAt": datetime.utcnow()})
+    result = await orders_collection.insert_many(orders)
+    return {"orderIds": result.inserted_ids, "expected": expected}
+
+
+async def run_strategy(name: str, confirm: ConfirmFn, order_count: int, callbacks: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Confirm every order `callbacks` times with at most `concurrency` confirmations in flight.
+
+    Returns:
+        {"strategy", "confirmations", "oversold", "unpaid", "throughput", "p50_ms", "p95_ms"}
+    """
+    seeded = await seed(order_count)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies_ms: List[float] = []
+
+    async def one(order_id: ObjectId, attempt: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await confirm(order_id, attempt)
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    jobs = [one(order_id, attempt) for attempt in range(callbacks) for order_id in seeded["orderIds"]]
+    started = time.perf_counter()
+    await asyncio.gather(*jobs)
+    total_s = time.perf_counter() - started
+
+    products_collection = await database.get_collection("products")
+    orders_collection = await database.get_collection("orders")
+    stock = {str(p["_id"]): p["quantity"] async for p in products_collection.find({})}
+    oversold = sum(seeded["expected"][pid] - quantity for pid, quantity in stock.items())
+
+    return {
+        "strategy": name,
+        "confirmations": len(jobs),
+        "oversold": oversold,
+        "unpaid": await orders_collection.count_documents({"isPaid": {"$ne": True}}),
+        "throughput": len(jobs) / total_s if total_s else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+    }
+
+
+async def run_benchmark(order_count: int = 20, callbacks: int = 10, concurrency: int = 50) -> List[Dict[str, Any]]:
+    db_name = f"{settings.DATABASE_NAME}_benchmark"
+    settings.DATABASE_NAME = db_name
+    database.db.client = AsyncIOMotorClient(settings.MONGODB_URL, tlsAllowInvalidCertificates=True)
+
+    try:
+        return [
+            await run_strategy(name, confirm, order_count, callbacks, concurrency)
+            for name, confirm in STRATEGIES.items()
+        ]
+    finally:
+        await database.db.client.drop_database(db_name)
+        database.db.client.close()
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    lines = [f"{'strategy':<18} {'confirms':>8} {'oversold':>8} {'unpaid':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}"]
+    for r in reports:
+        lines.append(
+            f"{r['strategy']:<18} {r['confirmations']:>8} {r['oversold']:>8} {r['unpaid']:>6} {r['throughput']:>8.0f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent payment confirmation benchmark (needs MongoDB)")
+    parser.add_argument("--orders", type=int, default=20, help="Pending orders to confirm")
+    parser.add_argument("--callbacks", type=int, default=10, help="Confirmations per order")
+    parser.add_argument("--concurrency", type=int, default=50, help="Confirmations in flight at once")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run_benchmark(args.orders, args.callbacks, args.concurrency))
+    print(format_report(reports))
+    if reports[-1]["oversold"] or reports[-1]["unpaid"]:
+        raise SystemExit("atomic-transition oversold stock or left orders unpaid")
+
+
+if __name__ == "__main__":
+    main()
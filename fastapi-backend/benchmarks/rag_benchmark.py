@@ -0,0 +1,169 @@
+"""
+Offline RAG evaluation and latency benchmark
+Runs the labelled query set against the keyword, vector and hybrid paths of
+rag_service.vector_search and reports recall@k, MRR and p50/p95 latency.
+
+Usage (from fastapi-backend/):
+    python -m benchmarks.rag_benchmark
+    python -m benchmarks.rag_benchmark --k 3 --repeat 20 --json results.json
+"""
+
+from typing import List, Dict, Any, Optional
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+
+from app.services.rag_service import vector_search, SEARCH_MODES
+from benchmarks.rag_fixtures import FakeEmbedder, build_corpus, COLLECTIONS_DIR
+
+QUERIES_FILE = Path(__file__).resolve().parent / "data" / "rag_queries.json"
+
+
+def load_queries(path: Path = QUERIES_FILE) -> List[Dict[str, Any]]:
+    """Load the labelled query set: [{query, collection, relevant: [ids]}]"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def recall_at_k(ranked_ids: List[str], relevant: List[str], k: int) -> float:
+    """Fraction of relevant documents found in the top k results"""
+    if not relevant:
+        return 0.0
+    return len(set(ranked_ids[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(ranked_ids: List[str], relevant: List[str]) -> float:
+    """1 / rank of the first relevant result, 0 if none is returned"""
+    for rank, doc_id in enumerate(ranked_ids, 1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+async def evaluate_mode(
+    mode: str,
+    queries: List[Dict[str, Any]],
+    corpus: Dict[str, Any],
+    embedder: FakeEmbedder,
+    k: int = 5,
+    repeat: int = 10
+) -> Dict[str, Any]:
+    """
+    Evaluate one search mode over the whole query set.
+
+    Args:
+        mode: 'keyword', 'vector' or 'hybrid'
+        queries: Labelled queries
+        corpus: Collections built by build_corpus()
+        embedder: Fake embedder used to build the corpus
+        k: Cut-off for recall and number of results requested
+        repeat: Timed runs per query (latency samples)
+
+    Returns:
+        Aggregate metrics plus per-query results
+    """
+    per_query = []
+    latencies_ms = []
+
+    for item in queries:
+        collection = corpus[item["collection"]]
+        results = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            results = await vector_search(
+                query=item["query"],
+                collection_name=item["collection"],
+                top_k=k,
+                mode=mode,
+                collection=collection,
+                embed_fn=embedder
+            )
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        ranked_ids = [str(doc["_id"]) for doc in results]
+        per_query.append({
+            "query": item["query"],
+            "collection": item["collection"],
+            "returned": ranked_ids,
+            "recall": recall_at_k(ranked_ids, item["relevant"], k),
+            "rr": reciprocal_rank(ranked_ids, item["relevant"])
+        })
+
+    count = len(per_query) or 1
+    return {
+        "mode": mode,
+        "k": k,
+        "queries": len(per_query),
+        "recall_at_k": sum(q["recall"] for q in per_query) / count,
+        "mrr": sum(q["rr"] for q in per_query) / count,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "per_query": per_query
+    }
+
+
+async def run_benchmark(
+    k: int = 5,
+    repeat: int = 10,
+    modes: Optional[List[str]] = None,
+    queries_file: Path = QUERIES_FILE,
+    collections_dir: Path = COLLECTIONS_DIR
+) -> List[Dict[str, Any]]:
+    """Build the fixture corpus once and evaluate every requested mode"""
+    embedder = FakeEmbedder()
+    corpus = build_corpus(embedder, collections_dir)
+    queries = load_queries(queries_file)
+
+    reports = []
+    for mode in modes or list(SEARCH_MODES):
+        reports.append(await evaluate_mode(mode, queries, corpus, embedder, k, repeat))
+    return reports
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    """Render reports as a plain-text table"""
+    lines = [f"{'mode':<8} {'queries':>7} {'recall@k':>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}"]
+    for r in reports:
+        lines.append(
+            f"{r['mode']:<8} {r['queries']:>7} {r['recall_at_k']:>9.3f} {r['mrr']:>6.3f} "
+            f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG retrieval benchmark")
+    parser.add_argument("--k", type=int, default=5, help="Results per query / recall cut-off")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per query")
+    parser.add_argument("--mode", choices=SEARCH_MODES, action="append", help="Mode(s) to run (default: all)")
+    parser.add_argument("--queries", type=Path, default=QUERIES_FILE, help="Labelled query set (JSON)")
+    parser.add_argument("--json", type=Path, help="Also write full results (incl. per-query) to this file")
+    args = parser.parse_args()
+
+    # vector_search logs every query at INFO; keep the report readable
+    logging.basicConfig(level=logging.WARNING)
+
+    reports = asyncio.run(run_benchmark(args.k, args.repeat, args.mode, args.queries))
+    print(format_report(reports))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
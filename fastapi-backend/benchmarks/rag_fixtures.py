@@ -0,0 +1,204 @@
+"""
+Offline fixtures for RAG evaluation
+In-memory collections built from mongodb_collections/*.json and a deterministic fake embedder,
+so vector_search can run without MongoDB Atlas or the Gemini API
+"""
+
+from typing import List, Dict, Any, Optional
+from pathlib import Path
+import copy
+import hashlib
+import math
+import re
+
+from bson import json_util
+
+from app.services.embeddings import (
+    EMBEDDING_DIMENSION,
+    prepare_product_text,
+    prepare_blog_text,
+    prepare_category_text,
+)
+
+# Seed data shipped with the repo
+COLLECTIONS_DIR = Path(__file__).resolve().parent.parent / "mongodb_collections"
+
+# Text builders used to embed each collection (same as the real indexing job)
+TEXT_BUILDERS = {
+    "products": prepare_product_text,
+    "blogs": prepare_blog_text,
+    "categories": prepare_category_text,
+}
+
+
+class FakeEmbedder:
+    """
+    Deterministic feature-hashing embedder.
+
+    Tokens and character trigrams are hashed (blake2b, not the salted built-in hash)
+    into a fixed number of buckets and L2-normalized, so cosine similarity reflects
+    lexical overlap and results are identical between runs and machines.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.calls = 0
+
+    def _bucket(self, feature: str) -> int:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.dimension
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        tokens = re.findall(r"\w+", (text or "").lower())
+        for token in tokens:
+            vector[self._bucket(f"w:{token}")] += 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                vector[self._bucket(f"c:{padded[i:i + 3]}")] += 0.5
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            return vector
+        return [v / norm for v in vector]
+
+    async def __call__(self, text: str, task_type: str = "retrieval_document") -> List[float]:
+        """Same call signature as embeddings.generate_embedding"""
+        self.calls += 1
+        return self.embed(text)
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    # Vectors from FakeEmbedder are already unit length
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _match_value(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$regex":
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                if not isinstance(value, str) or not re.search(arg, value, flags):
+                    return False
+            elif op == "$options":
+                continue
+            elif op == "$in":
+                if value not in arg:
+                    return False
+            elif op == "$ne":
+                if value == arg:
+                    return False
+            else:
+                raise NotImplementedError(f"Operator {op} is not supported by InMemoryCollection")
+        return True
+    return value == condition
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluate the subset of MongoDB query syntax used by rag_service"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif not _match_value(doc.get(key), condition):
+            return False
+    return True
+
+
+class _Cursor:
+    """Async cursor over a list of documents, supporting limit()"""
+
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+        self._limit: Optional[int] = None
+
+    def limit(self, n: int) -> "_Cursor":
+        self._limit = n
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [doc async for doc in self][:length]
+
+    async def __aiter__(self):
+        docs = self._docs if not self._limit else self._docs[:self._limit]
+        for doc in docs:
+            yield copy.deepcopy(doc)
+
+
+class InMemoryCollection:
+    """
+    Minimal stand-in for a Motor collection.
+
+    Supports find() with the $or/$regex filters built by keyword_search and aggregate()
+    with the $vectorSearch/$match/$project pipeline built by semantic_search.
+    $vectorSearch is evaluated by brute-force cosine similarity.
+    """
+
+    def __init__(self, name: str, docs: List[Dict[str, Any]]):
+        self.name = name
+        self.docs = docs
+
+    def find(self, query: Optional[Dict[str, Any]] = None) -> _Cursor:
+        return _Cursor([doc for doc in self.docs if matches(doc, query or {})])
+
+    async def aggregate(self, pipeline: List[Dict[str, Any]]):
+        docs = self.docs
+        for stage in pipeline:
+            if "$vectorSearch" in stage:
+                spec = stage["$vectorSearch"]
+                scored = []
+                for doc in docs:
+                    embedding = doc.get(spec["path"])
+                    if embedding:
+                        scored.append({**doc, "_score": _cosine(spec["queryVector"], embedding)})
+                scored.sort(key=lambda d: d["_score"], reverse=True)
+                docs = scored[:spec["limit"]]
+            elif "$match" in stage:
+                docs = [doc for doc in docs if matches(doc, stage["$match"])]
+            elif "$project" in stage:
+                projected = []
+                for doc in docs:
+                    out = {}
+                    for field, spec in stage["$project"].items():
+                        if spec == {"$meta": "vectorSearchScore"}:
+                            out[field] = doc.get("_score", 0.0)
+                        elif spec and field in doc:
+                            out[field] = doc[field]
+                    projected.append(out)
+                docs = projected
+            else:
+                raise NotImplementedError(f"Stage {list(stage)[0]} is not supported by InMemoryCollection")
+        for doc in docs:
+            yield copy.deepcopy(doc)
+
+
+def load_seed_documents(collection_name: str, collections_dir: Path = COLLECTIONS_DIR) -> List[Dict[str, Any]]:
+    """Load a seed collection (MongoDB extended JSON) from mongodb_collections/"""
+    with open(collections_dir / f"{collection_name}.json", encoding="utf-8") as f:
+        return json_util.loads(f.read())
+
+
+def build_corpus(
+    embedder: FakeEmbedder,
+    collections_dir: Path = COLLECTIONS_DIR
+) -> Dict[str, InMemoryCollection]:
+    """
+    Build the fixture corpus: one in-memory collection per searchable collection,
+    each document carrying an 'embedding' computed by the fake embedder.
+
+    Args:
+        embedder: Embedder used for both documents and queries
+        collections_dir: Directory containing products.json, blogs.json, categories.json
+
+    Returns:
+        Dictionary of collection name -> InMemoryCollection
+    """
+    corpus = {}
+    for name, build_text in TEXT_BUILDERS.items():
+        docs = load_seed_documents(name, collections_dir)
+        for doc in docs:
+            doc["embedding"] = embedder.embed(build_text(doc))
+        corpus[name] = InMemoryCollection(name, docs)
+    return corpus
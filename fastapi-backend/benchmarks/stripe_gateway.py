@@ -0,0 +1,119 @@
+"""
+Stripe gateway benchmark
+Creates many checkout sessions concurrently through FakeStripeGateway (simulated
+Stripe latency, no network) and compares calling the blocking SDK function directly
+inside the coroutine (previous handlers) with the gateway's bounded thread pool.
+
+Reports throughput, call latency and event-loop lag: how late a 10 ms ticker task
+wakes up while the calls are running. Lag is what every other request on the same
+uvicorn worker waits.
+
+Runs offline, only needs the .env file.
+
+Usage (from fastapi-backend/):
+    python -m benchmarks.stripe_gateway
+    python -m benchmarks.stripe_gateway --requests 200 --latency-ms 150 --workers 16
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import time
+
+from app.services.stripe_gateway import CircuitBreaker, FakeStripeGateway
+from benchmarks.rag_benchmark import percentile
+
+TICK_SECONDS = 0.01
+
+CreateFn = Callable[[FakeStripeGateway, Dict[str, Any]], Awaitable[Any]]
+
+
+async def direct_create(gateway: FakeStripeGateway, params: Dict[str, Any]) -> Any:
+    """Previous behaviour: blocking SDK call inside the async handler"""
+    return gateway._create_checkout_session(params)
+
+
+async def gateway_create(gateway: FakeStripeGateway, params: Dict[str, Any]) -> Any:
+    """Current behaviour: call runs in the gateway thread pool"""
+    return await gateway.create_checkout_session(**params)
+
+
+STRATEGIES: Dict[str, CreateFn] = {
+    "blocking-on-loop": direct_create,
+    "gateway-executor": gateway_create,
+}
+
+
+async def run_strategy(name: str, create: CreateFn, requests: int, latency_ms: float, workers: int) -> Dict[str, Any]:
+    """
+    Fire `requests` concurrent session creations while a ticker measures loop lag.
+
+    Returns:
+        {"strategy", "requests", "throughput", "p50_ms", "p95_ms", "lag_p95_ms", "lag_max_ms"}
+    """
+    gateway = FakeStripeGateway(workers, 10.0, CircuitBreaker(5, 30.0), latency_ms)
+    latencies_ms: List[float] = []
+    lags_ms: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags_ms.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    async def one(i: int):
+        started = time.perf_counter()
+        await create(gateway, {"mode": "payment", "metadata": {"orderId": str(i)}})
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    total_s = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    gateway.shutdown()
+
+    return {
+        "strategy": name,
+        "requests": requests,
+        "throughput": requests / total_s if total_s else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "lag_p95_ms": percentile(lags_ms, 95),
+        "lag_max_ms": max(lags_ms) if lags_ms else 0.0,
+    }
+
+
+async def run_benchmark(requests: int = 100, latency_ms: float = 50.0, workers: int = 8) -> List[Dict[str, Any]]:
+    return [
+        await run_strategy(name, create, requests, latency_ms, workers)
+        for name, create in STRATEGIES.items()
+    ]
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    lines = [f"{'strategy':<18} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'lag p95':>8} {'lag max':>8}"]
+    for r in reports:
+        lines.append(
+            f"{r['strategy']:<18} {r['requests']:>8} {r['throughput']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['lag_p95_ms']:>8.1f} {r['lag_max_ms']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stripe gateway event-loop benchmark (offline, fake gateway)")
+    parser.add_argument("--requests", type=int, default=100, help="Concurrent checkout session creations")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated Stripe latency per call")
+    parser.add_argument("--workers", type=int, default=8, help="Gateway thread pool size")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run_benchmark(args.requests, args.latency_ms, args.workers))
+    print(format_report(reports))
+
+
+if __name__ == "__main__":
+    main()
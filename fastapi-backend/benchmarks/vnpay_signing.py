@@ -0,0 +1,128 @@
+"""
+VNPay signing benchmark
+1. Checks VNPayGateway against the test vectors in benchmarks/data/vnpay_vectors.json
+   (hash data and vnp_SecureHash computed with the reference algorithm: vnp_* params
+   sorted by name, quote_plus values, HMAC-SHA512), and that a generated payment URL
+   verifies after a parse round-trip, also with an upper-case hash and a tampered amount
+2. Measures sign and verify throughput of the previous helper (sort, encode, derive the
+   HMAC key from the secret on every call) against the gateway (keyed HMAC copied,
+   single-pass encoding, constant params encoded once)
+
+Runs offline, only needs the .env file. Exits non-zero if a vector fails.
+
+Usage (from fastapi-backend/):
+    python -m benchmarks.vnpay_signing
+    python -m benchmarks.vnpay_signing --iterations 50000
+"""
+
+from typing import Any, Callable, Dict, List
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, quote_plus, urlencode, urlsplit
+import argparse
+import hashlib
+import hmac
+import json
+import time
+
+from app.services.vnpay_gateway import VNPayGateway
+
+VECTORS_PATH = Path(__file__).parent / "data" / "vnpay_vectors.json"
+
+RETURN_URL = "http://localhost:8000/api/order/vnpay-return"
+
+
+def legacy_sign(params: Dict[str, Any], secret: str) -> str:
+    """Previous helper: sort, quote_plus and a fresh HMAC key on every call"""
+    hash_data = "&".join(f"{key}={quote_plus(str(value))}" for key, value in dict(sorted(params.items())).items())
+    return hmac.new(secret.encode("utf-8"), hash_data.encode("utf-8"), hashlib.sha512).hexdigest()
+
+
+def legacy_url(gateway_url: str, params: Dict[str, Any], secret: str) -> str:
+    params = {**params, "vnp_SecureHash": legacy_sign(params, secret)}
+    return f"{gateway_url}?{urlencode(params)}"
+
+
+def check_vectors() -> List[str]:
+    """Failures (empty if every vector passes)"""
+    failures = []
+    for vector in json.loads(VECTORS_PATH.read_text(encoding="utf-8")):
+        gateway = VNPayGateway("VELOURA1", vector["secret"], "https://sandbox.vnpayment.vn/paymentv2/vpcpay.html", RETURN_URL)
+        params = vector["params"]
+        if gateway.encode(params) != vector["hashData"]:
+            failures.append(f"{vector['name']}: hash data mismatch")
+        if gateway.sign(params) != vector["secureHash"]:
+            failures.append(f"{vector['name']}: signature mismatch")
+        if not gateway.verify({**params, "vnp_SecureHash": vector["secureHash"].upper(), "vnp_SecureHashType": "HmacSHA512"}):
+            failures.append(f"{vector['name']}: valid callback rejected")
+        if gateway.verify({**params, "vnp_Amount": "1", "vnp_SecureHash": vector["secureHash"]}):
+            failures.append(f"{vector['name']}: tampered callback accepted")
+
+    # Generated URL must verify after the browser / VNPay round-trip
+    gateway = VNPayGateway("VELOURA1", "SECRETKEY123456", "https://sandbox.vnpayment.vn/paymentv2/vpcpay.html", RETURN_URL)
+    url = gateway.build_payment_url("65a1b2c3d4e5f60718293a4b", 123456, "Thanh toán đơn hàng #1 & quà", "127.0.0.1", datetime(2026, 1, 1, 12))
+    if not gateway.verify(dict(parse_qsl(urlsplit(url).query))):
+        failures.append("payment url: signature does not verify after parsing")
+    return failures
+
+
+def measure(fn: Callable[[], Any], iterations: int) -> float:
+    """Operations per second"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    return iterations / elapsed if elapsed else 0.0
+
+
+def run_benchmark(iterations: int = 20000) -> List[Dict[str, Any]]:
+    vector = json.loads(VECTORS_PATH.read_text(encoding="utf-8"))[2]
+    secret, callback = vector["secret"], {**vector["params"], "vnp_SecureHash": vector["secureHash"]}
+    gateway = VNPayGateway("VELOURA1", secret, "https://sandbox.vnpayment.vn/paymentv2/vpcpay.html", RETURN_URL)
+    created_at = datetime(2026, 1, 1, 12)
+    url_params = {
+        "vnp_Version": "2.1.0", "vnp_Command": "pay", "vnp_TmnCode": "VELOURA1", "vnp_Amount": "12345600",
+        "vnp_CurrCode": "VND", "vnp_TxnRef": "65a1b2c3d4e5f60718293a4b", "vnp_OrderInfo": "Thanh toan don hang",
+        "vnp_OrderType": "other", "vnp_Locale": "vn", "vnp_ReturnUrl": RETURN_URL, "vnp_IpAddr": "127.0.0.1",
+        "vnp_CreateDate": "20260101120000", "vnp_ExpireDate": "20260101130000",
+    }
+
+    def legacy_verify():
+        params = {k: v for k, v in callback.items() if k not in ("vnp_SecureHash", "vnp_SecureHashType")}
+        return legacy_sign(params, secret) == callback["vnp_SecureHash"]
+
+    cases = [
+        ("payment url", lambda: legacy_url(gateway.payment_url, url_params, secret),
+         lambda: gateway.build_payment_url("65a1b2c3d4e5f60718293a4b", 123456, "Thanh toan don hang", "127.0.0.1", created_at)),
+        ("verify callback", legacy_verify, lambda: gateway.verify(callback)),
+    ]
+    return [
+        {"operation": name, "legacy_ops": measure(legacy, iterations), "gateway_ops": measure(current, iterations)}
+        for name, legacy, current in cases
+    ]
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    lines = [f"{'operation':<16} {'legacy ops/s':>13} {'gateway ops/s':>14} {'speedup':>8}"]
+    for r in reports:
+        speedup = r["gateway_ops"] / r["legacy_ops"] if r["legacy_ops"] else 0.0
+        lines.append(f"{r['operation']:<16} {r['legacy_ops']:>13.0f} {r['gateway_ops']:>14.0f} {speedup:>7.2f}x")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VNPay sign/verify test vectors and throughput (offline)")
+    parser.add_argument("--iterations", type=int, default=20000, help="Calls per operation and implementation")
+    args = parser.parse_args()
+
+    failures = check_vectors()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        raise SystemExit(1)
+    print("All VNPay test vectors passed")
+    print(format_report(run_benchmark(args.iterations)))
+
+
+if __name__ == "__main__":
+    main()
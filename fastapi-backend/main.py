@@ -4,14 +4,27 @@ from contextlib import asynccontextmanager
 import uvicorn
 
 from app.config.database import connect_to_mongo, close_mongo_connection
-from app.routes import user_routes, product_routes, cart_routes, order_routes, admin_routes, category_routes, blog_routes, testimonial_routes, report_routes, contact_routes, review_routes, wishlist_routes, settings_routes, chat_routes
+from app.services.image_pipeline import shutdown_image_pool
+from app.services.order_reaper import start_order_reaper, stop_order_reaper
+from app.services.stripe_webhook import start_stripe_worker, stop_stripe_worker
+from app.services.promotion_scheduler import start_promotion_scheduler, stop_promotion_scheduler
+from app.services.stripe_gateway import shutdown_gateway
+from app.routes import user_routes, product_routes, cart_routes, order_routes, admin_routes, category_routes, blog_routes, testimonial_routes, report_routes, contact_routes, review_routes, wishlist_routes, settings_routes, chat_routes, media_routes
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    start_order_reaper()
+    start_stripe_worker()
+    start_promotion_scheduler()
     yield
     # Shutdown
+    await stop_promotion_scheduler()
+    await stop_stripe_worker()
+    await stop_order_reaper()
+    shutdown_image_pool()
+    shutdown_gateway()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -34,6 +47,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cart-Token"],  # Token giỏ hàng khách (chưa đăng nhập)
 )
 
 # Include routers
@@ -51,6 +65,7 @@ app.include_router(report_routes.router, prefix="/api/report", tags=["Reports"])
 app.include_router(review_routes.router, prefix="/api/review", tags=["Reviews"])
 app.include_router(wishlist_routes.router, prefix="/api", tags=["Wishlist"])
 app.include_router(chat_routes.router, prefix="/api", tags=["Chat"])
+app.include_router(media_routes.router, prefix="/media", tags=["Media"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,54 @@
+"""
+Seed per-size inventory
+Creates `inventory` documents for every product that has none yet, splitting
+products.quantity evenly over products.sizes (the first sizes get the remainder).
+Products are also seeded lazily the first time their stock is touched, so this is
+only needed to see per-size stock / low stock for the whole catalogue at once.
+Products that already have per-size stock keep their counts; sizes added to a
+product before size edits were synced get a zero-stock row, rows of sizes the
+product no longer has are dropped (inventory_service.sync_sizes).
+
+Usage (from fastapi-backend/):
+    python -m scripts.migrate_inventory
+"""
+
+import asyncio
+
+from app.config.database import connect_to_mongo, close_mongo_connection, get_collection
+from app.services.inventory_service import ensure_inventory, sync_sizes
+
+BATCH_SIZE = 500
+
+
+async def run() -> int:
+    await connect_to_mongo()
+    try:
+        products_collection = await get_collection("products")
+        created = 0
+        batch = []
+
+        async def flush() -> int:
+            count = await ensure_inventory([str(product["_id"]) for product in batch])
+            for product in batch:
+                count += (await sync_sizes(str(product["_id"]), product.get("sizes", [])))["added"]
+            return count
+
+        async for product in products_collection.find({}, {"_id": 1, "sizes": 1}):
+            batch.append(product)
+            if len(batch) >= BATCH_SIZE:
+                created += await flush()
+                batch = []
+        if batch:
+            created += await flush()
+        return created
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    created = asyncio.run(run())
+    print(f"✅ Created {created} per-size inventory documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Rebuild the purchases projection
+Recreates `purchases` (one document per delivered (user, product, order)) from all
+orders with status Delivered. Users are also backfilled lazily on first use, so this
+is only needed after importing orders directly into MongoDB or to reconcile drift.
+
+Usage (from fastapi-backend/):
+    python -m scripts.rebuild_purchases
+"""
+
+import asyncio
+
+from app.config.database import connect_to_mongo, close_mongo_connection
+from app.services.purchase_service import rebuild_purchases
+
+
+async def run() -> int:
+    await connect_to_mongo()
+    try:
+        return await rebuild_purchases()
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    written = asyncio.run(run())
+    print(f"✅ Rebuilt {written} purchases from delivered orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Rebuild denormalized review stats
+Recomputes product_stats (ratingCount, ratingSum, ratingHistogram) from the
+`reviews` collection. Run after importing reviews directly into MongoDB or if the
+counters are suspected to have drifted.
+
+Usage (from fastapi-backend/):
+    python -m scripts.rebuild_review_stats
+    python -m scripts.rebuild_review_stats --product-id 690cd1522ef08cb266263c2d
+"""
+
+import argparse
+import asyncio
+
+from bson import ObjectId
+
+from app.config.database import connect_to_mongo, close_mongo_connection
+from app.services.review_service import rebuild_rating_stats
+
+
+async def run(product_id: str = None) -> int:
+    await connect_to_mongo()
+    try:
+        return await rebuild_rating_stats(ObjectId(product_id) if product_id else None)
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild product review stats from the reviews collection")
+    parser.add_argument("--product-id", help="Only rebuild this product")
+    args = parser.parse_args()
+
+    if args.product_id and not ObjectId.is_valid(args.product_id):
+        parser.error(f"Invalid product id: {args.product_id}")
+
+    rebuilt = asyncio.run(run(args.product_id))
+    print(f"✅ Rebuilt review stats for {rebuilt} products")
+
+
+if __name__ == "__main__":
+    main()